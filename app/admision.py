@@ -0,0 +1,191 @@
+# app/admision.py
+"""
+Control de admisión: límites de concurrencia y descarte de carga.
+
+Middleware ASGI puro que decide, antes de que la solicitud use un hilo o una
+conexión, si se atiende:
+
+  - Por usuario: cada usuario puede tener a lo sumo ADMISION_POR_USUARIO
+    solicitudes en curso; el exceso recibe 429. Así un cliente que consulta
+    /mis en bucle no acapara las conexiones, aunque pida varios tokens. El
+    usuario es el `sub` del JWT, verificado con la misma clave que
+    `app.auth` (y guardado en caché por token hasta que vence); sin token, o
+    con uno inválido o vencido, cuenta la IP del cliente.
+  - Por ruta: ADMISION_RUTAS="GET /mis=20,GET /soporte/export/{entidad}=2"
+    limita las solicitudes en curso de cada plantilla de ruta; el exceso
+    recibe 503.
+  - Descarte de carga: si la espera reciente por una conexión del pool
+    (`PoolMedido`) supera ADMISION_UMBRAL_POOL_MS, se rechazan con 503 los
+    reportes, y al doble del umbral también el resto. Los movimientos de
+    dinero (clase "dinero" de `app.hilos`: /transacciones, /prestamos/pagar,
+    aprobaciones) nunca se descartan por esta causa.
+
+Como corre antes del enrutamiento, la plantilla se obtiene comparando el path
+con las plantillas que tienen clase o límite; el resto cuenta como "general".
+Todos los rechazos llevan `Retry-After`. El middleware corre en el loop de
+eventos, así que los contadores no necesitan locks.
+"""
+import os
+import time
+from collections import OrderedDict
+
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+
+from app.auth import ALGORITHM, SECRET_KEY
+from app.database import PoolMedido
+from app.hilos import RUTAS_DINERO, RUTAS_REPORTES, clase_de
+from app.limite_login import ip_cliente
+from app.metricas import RUTA_DESCONOCIDA, Contador, Medidor, registro
+
+POR_USUARIO = int(os.getenv("ADMISION_POR_USUARIO", "8"))
+UMBRAL_POOL = float(os.getenv("ADMISION_UMBRAL_POOL_MS", "500")) / 1000
+REINTENTO_SEGUNDOS = int(os.getenv("ADMISION_REINTENTO_SEGUNDOS", "2"))
+RUTAS = os.getenv("ADMISION_RUTAS", "")
+
+# Multiplicador del umbral a partir del cual se descarta cada clase (None = nunca)
+DESCARTE_POR_CLASE = {"reportes": 1, "general": 2, "dinero": None}
+MAX_RUTAS_EN_CACHE = 10000
+MAX_TOKENS_EN_CACHE = 10000
+
+# token -> (sub, vencimiento); sólo tokens válidos, en orden de uso
+_sujetos = OrderedDict()
+
+# clase de ruta -> solicitudes en curso
+en_curso_clase = {clase: 0 for clase in DESCARTE_POR_CLASE}
+
+rechazos = registro.agregar(Contador(
+    "http_requests_shed_total", "Solicitudes rechazadas por el control de admisión", ("reason", "route")))
+registro.agregar(Medidor(
+    "http_requests_in_flight", "Solicitudes en curso por clase de ruta",
+    lambda: {(clase,): n for clase, n in en_curso_clase.items()}, ("class",)))
+registro.agregar(Medidor(
+    "db_pool_wait_seconds", "Espera reciente por una conexión del pool (media móvil)",
+    lambda: {(): round(PoolMedido.espera_reciente(), 6)}))
+
+
+def leer_limites_rutas(valor: str) -> dict:
+    """'GET /mis=20,GET /cuentas/all=10' -> {('GET', '/mis'): 20, ('GET', '/cuentas/all'): 10}"""
+    limites = {}
+    for parte in valor.split(","):
+        ruta, _, limite = parte.strip().rpartition("=")
+        metodo, _, plantilla = ruta.strip().partition(" ")
+        if metodo and plantilla and limite:
+            limites[(metodo.upper(), plantilla.strip())] = int(limite)
+    return limites
+
+
+def _sujeto(token: str):
+    """`sub` de un JWT válido, o None si no se puede verificar o ya venció."""
+    ahora = time.time()
+    guardado = _sujetos.get(token)
+    if guardado is not None:
+        sujeto, vence = guardado
+        if vence is None or vence > ahora:
+            _sujetos.move_to_end(token)
+            return sujeto
+        del _sujetos[token]
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        # Los inválidos no se guardan: tokens inventados no desplazan a los buenos
+        return None
+    sujeto = payload.get("sub")
+    if not sujeto:
+        return None
+    _sujetos[token] = (sujeto, payload.get("exp"))
+    if len(_sujetos) > MAX_TOKENS_EN_CACHE:
+        _sujetos.popitem(last=False)
+    return sujeto
+
+
+def _clave_usuario(scope) -> str:
+    for nombre, valor in scope["headers"]:
+        if nombre == b"authorization":
+            esquema, _, token = valor.decode("latin-1").partition(" ")
+            if esquema.lower() == "bearer" and token:
+                sujeto = _sujeto(token.strip())
+                if sujeto is not None:
+                    return f"usuario:{sujeto}"
+            break
+    return f"ip:{ip_cliente(scope)}"
+
+
+class AdmisionMiddleware:
+    def __init__(self, app, por_usuario: int = POR_USUARIO, umbral_pool: float = UMBRAL_POOL,
+                 limites_rutas: dict = None):
+        self.app = app
+        self.por_usuario = por_usuario
+        self.umbral_pool = umbral_pool
+        self.limites_rutas = leer_limites_rutas(RUTAS) if limites_rutas is None else limites_rutas
+        self.en_curso_usuario = {}
+        self.en_curso_ruta = {}
+        # La ruta aún no se resolvió: sólo interesan las plantillas con clase o con límite
+        plantillas = RUTAS_DINERO | RUTAS_REPORTES | set(self.limites_rutas)
+        self._patrones = [(metodo, plantilla, compile_path(plantilla)[0]) for metodo, plantilla in sorted(plantillas)]
+        # (método, path) -> plantilla de la ruta
+        self._plantillas = OrderedDict()
+
+    def _plantilla(self, scope) -> str:
+        llave = (scope["method"], scope["path"])
+        plantilla = self._plantillas.get(llave)
+        if plantilla is None:
+            plantilla = RUTA_DESCONOCIDA
+            for metodo, candidata, patron in self._patrones:
+                if metodo == scope["method"] and patron.match(scope["path"]):
+                    plantilla = candidata
+                    break
+            self._plantillas[llave] = plantilla
+            if len(self._plantillas) > MAX_RUTAS_EN_CACHE:
+                self._plantillas.popitem(last=False)
+        return plantilla
+
+    def _motivo_rechazo(self, usuario: str, llave_ruta: tuple, clase: str):
+        if self.en_curso_usuario.get(usuario, 0) >= self.por_usuario:
+            return "usuario", 429
+        limite = self.limites_rutas.get(llave_ruta)
+        if limite is not None and self.en_curso_ruta.get(llave_ruta, 0) >= limite:
+            return "ruta", 503
+        multiplicador = DESCARTE_POR_CLASE[clase]
+        if multiplicador is not None and self.umbral_pool and \
+                PoolMedido.espera_reciente() > self.umbral_pool * multiplicador:
+            return "pool", 503
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        plantilla = self._plantilla(scope)
+        llave_ruta = (scope["method"], plantilla)
+        clase = clase_de(*llave_ruta)
+        usuario = _clave_usuario(scope)
+
+        motivo = self._motivo_rechazo(usuario, llave_ruta, clase)
+        if motivo is not None:
+            causa, codigo = motivo
+            rechazos.incrementar(causa, plantilla)
+            detalle = "Demasiadas solicitudes en curso" if codigo == 429 else "Servicio saturado; intente más tarde"
+            respuesta = JSONResponse(
+                {"detail": detalle}, status_code=codigo,
+                headers={"Retry-After": str(REINTENTO_SEGUNDOS)},
+            )
+            await respuesta(scope, receive, send)
+            return
+
+        self.en_curso_usuario[usuario] = self.en_curso_usuario.get(usuario, 0) + 1
+        self.en_curso_ruta[llave_ruta] = self.en_curso_ruta.get(llave_ruta, 0) + 1
+        en_curso_clase[clase] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            en_curso_clase[clase] -= 1
+            for contadores, llave in ((self.en_curso_usuario, usuario), (self.en_curso_ruta, llave_ruta)):
+                restantes = contadores[llave] - 1
+                if restantes:
+                    contadores[llave] = restantes
+                else:
+                    del contadores[llave]
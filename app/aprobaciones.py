@@ -0,0 +1,156 @@
+# app/aprobaciones.py
+"""
+Aprobación y rechazo de solicitudes de préstamo.
+
+Lo usan tanto el endpoint de aprobación individual como el trabajo en segundo
+plano que procesa aprobaciones por lote.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session, lazyload
+
+from app import models
+from app.cartera import actualizar_cartera
+from app.email_utils import send_email
+from app.utils import generar_numero_documento
+
+logger = logging.getLogger("banco_mr.aprobaciones")
+
+TIPO_TRANSACCION_PRESTAMO = 4
+
+
+@dataclass
+class ResultadoAprobacion:
+    prestamo: models.PrestamoEncabezado
+    cuenta: models.Cuenta
+    aprobado: bool
+    fecha: date
+    documento: Optional[str] = None
+
+
+def procesar_aprobacion(db: Session, numero_prestamo: str, aprobar: bool) -> ResultadoAprobacion:
+    """
+    Aprueba (acreditando el monto) o rechaza un préstamo. No hace commit.
+
+    Bloquea la cuenta destino y luego el préstamo, en el mismo orden que
+    `app.pagos.aplicar_pago`, y vuelve a revisar el estado con el bloqueo: el
+    endpoint y los trabajadores de la cola no pueden aprobar dos veces el mismo
+    préstamo ni perder un abono que se aplica a la vez sobre la cuenta.
+    """
+    # Sin cargas "joined": sólo se leen (y luego se bloquean) las filas necesarias
+    id_cuenta = (
+        db.query(models.PrestamoEncabezado.idCuentaDestino)
+        .filter_by(numeroPrestamo=numero_prestamo)
+        .scalar()
+    )
+    if id_cuenta is None:
+        raise HTTPException(404, "Préstamo no encontrado")
+
+    cuenta = (
+        db.query(models.Cuenta)
+        .options(lazyload("*"))
+        .filter_by(idCuenta=id_cuenta)
+        .with_for_update()
+        .first()
+    )
+    prestamo = (
+        db.query(models.PrestamoEncabezado)
+        .options(lazyload("*"))
+        .filter_by(numeroPrestamo=numero_prestamo)
+        .populate_existing()
+        .with_for_update()
+        .first()
+    )
+    if not prestamo:
+        raise HTTPException(404, "Préstamo no encontrado")
+    if prestamo.fechaAutorizacion is not None:
+        raise HTTPException(400, "Este préstamo ya fue procesado")
+    if not cuenta or cuenta.idCuenta != prestamo.idCuentaDestino or cuenta.idCliente != prestamo.idCliente:
+        raise HTTPException(404, "Cuenta destino no válida o no pertenece al cliente")
+
+    fecha_actual = date.today()
+    prestamo.fechaAutorizacion = fecha_actual
+    prestamo.aprobado = aprobar
+    resultado = ResultadoAprobacion(prestamo=prestamo, cuenta=cuenta, aprobado=aprobar, fecha=fecha_actual)
+    if aprobar:
+        cuenta.saldo += prestamo.montoPrestamo
+        num_doc = generar_numero_documento(db)
+        trans = models.Transaccion(
+            numeroDocumento=num_doc,
+            idCuentaOrigen=None,
+            idCuentaDestino=cuenta.idCuenta,
+            idTipoTransaccion=TIPO_TRANSACCION_PRESTAMO,
+            monto=prestamo.montoPrestamo,
+            descripcion=f"Acreditación préstamo {prestamo.numeroPrestamo}",
+        )
+        db.add(trans); db.flush()
+        db.add(
+            models.Historial(
+                idCuenta=cuenta.idCuenta,
+                idTransaccion=trans.idTransaccion,
+                numeroDocumento=num_doc,
+                monto=prestamo.montoPrestamo,
+                saldo=cuenta.saldo,
+            )
+        )
+        actualizar_cartera(db, prestamo)
+        resultado.documento = num_doc
+    return resultado
+
+
+def notificar_aprobacion(db: Session, resultado: ResultadoAprobacion):
+    """Envía al cliente el correo de préstamo aprobado; los errores de envío se ignoran."""
+    prestamo, cuenta = resultado.prestamo, resultado.cuenta
+    cliente = db.query(models.Cliente).filter_by(idCliente=prestamo.idCliente).first()
+    if not (cliente and cliente.correo and resultado.aprobado):
+        return
+
+    # Hora actual formateada
+    ahora = datetime.now().strftime("%d/%m/%Y %H:%M")
+    subject = f"Banco M&R – Préstamo {prestamo.numeroPrestamo} Aprobado"
+    html_body = f"""
+        <html>
+          <body style="font-family:Arial,sans-serif; color:#333;">
+            <p>Estimado/a <strong>{cliente.primerNombre} {cliente.primerApellido}</strong>,</p>
+
+            <p>
+              Nos complace informarle que su solicitud de préstamo
+              <strong>{prestamo.numeroPrestamo}</strong> ha sido <strong>APROBADA</strong>
+              el {resultado.fecha.strftime('%d/%m/%Y')} a las {ahora.split()[1]}.
+            </p>
+
+            <p>Detalle de la operación:</p>
+            <ul>
+              <li><strong>Monto aprobado:</strong> Q{float(prestamo.montoPrestamo):,.2f}</li>
+              <li><strong>Cuenta acreditada:</strong> {cuenta.numeroCuenta}</li>
+              <li><strong>Documento:</strong> {resultado.documento}</li>
+            </ul>
+
+            <p>
+              El monto ya se encuentra disponible en su cuenta.
+              Para cualquier consulta, puede responder a este correo o contactarnos
+              a través de nuestros canales de atención.
+            </p>
+
+            <br>
+            <p>Saludos cordiales,<br>Equipo Banco M&amp;R</p>
+            <hr style="border:none; border-top:1px solid #eee; margin:40px 0;" />
+            <div style="text-align:center;">
+              <img src="cid:logo_cid" alt="Logo Banco M&R" style="width:120px;"/>
+            </div>
+          </body>
+        </html>
+        """
+    # Ruta al logo (ajusta si es necesario)
+    logo_path = os.path.join(os.path.dirname(__file__), "Logo.png")
+
+    try:
+        send_email(subject, cliente.correo, html_body, logo_path=logo_path)
+    except Exception:
+        # No interrumpimos si falla el envío de correo
+        logger.warning(f"No se pudo notificar la aprobación del préstamo {prestamo.numeroPrestamo}")
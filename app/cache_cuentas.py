@@ -0,0 +1,162 @@
+# app/cache_cuentas.py
+"""
+Caché por cliente de las cuentas que listan GET /cuentas y GET /cuentas/all.
+
+El tablero del frontend vuelve a pedir las cuentas en cada refresco. Las filas
+de cada idCliente se guardan en memoria (LRU de hasta CUENTAS_CACHE_MAX_CLIENTES
+clientes, cada uno válido por CUENTAS_CACHE_TTL segundos) y los listados se
+filtran sobre ellas.
+
+Escritura directa: los caminos que mueven saldos o cambian estados
+(`_crear_transaccion`, aprobación y pago de préstamos, cambios de estado de
+soporte, alta de cuenta) llaman a `escribir` después del commit, que vuelve a
+leer las cuentas de los clientes afectados que estén en la caché. En este
+trabajador la lectura siguiente ya ve el cambio.
+
+Entre trabajadores: cada fila de `bcoma_cuenta` tiene un sello `version` que
+aumenta en cada UPDATE, incluidos los masivos (lotes, intereses, trabajos).
+Una entrada con más de CUENTAS_CACHE_REVALIDAR segundos se revalida con una
+consulta de agregados (cantidad, suma de versiones y último idCuenta) y sólo
+se recarga si el sello cambió. Con CUENTAS_CACHE_REVALIDAR=0 se revalida en
+cada lectura.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, time as hora
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.metricas import Contador, registro
+
+TTL_SEGUNDOS = int(os.getenv("CUENTAS_CACHE_TTL", "300"))
+REVALIDAR_SEGUNDOS = float(os.getenv("CUENTAS_CACHE_REVALIDAR", "5"))
+MAX_CLIENTES = int(os.getenv("CUENTAS_CACHE_MAX_CLIENTES", "10000"))
+
+# Columnas de schemas.Cuenta: los listados arman sus filas sin cargar entidades
+COLUMNAS_CUENTA = tuple(getattr(models.Cuenta, campo) for campo in schemas.Cuenta.model_fields)
+
+consultas = registro.agregar(Contador(
+    "cuentas_cache_total", "Lecturas de la caché de cuentas por resultado", ("result",)))
+
+
+@dataclass
+class _Entrada:
+    filas: list
+    sello: tuple
+    cargada: float
+    verificada: float
+    fechas: dict  # idCuenta -> fechaCreacion, para los filtros por fecha
+
+
+# idCliente -> _Entrada, en orden de uso
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _sello(db: Session, id_cliente: int) -> tuple:
+    cantidad, versiones, ultima = (
+        db.query(
+            func.count(models.Cuenta.idCuenta),
+            func.coalesce(func.sum(models.Cuenta.version), 0),
+            func.max(models.Cuenta.idCuenta),
+        )
+        .filter(models.Cuenta.idCliente == id_cliente)
+        .one()
+    )
+    return int(cantidad), int(versiones), ultima
+
+
+def _cargar(db: Session, id_cliente: int) -> _Entrada:
+    filas, fechas, versiones = [], {}, 0
+    consulta = (
+        db.query(*COLUMNAS_CUENTA, models.Cuenta.fechaCreacion, models.Cuenta.version)
+        .filter(models.Cuenta.idCliente == id_cliente)
+        .order_by(models.Cuenta.idCuenta)
+    )
+    for fila in consulta:
+        datos = fila._asdict()
+        fechas[datos["idCuenta"]] = datos.pop("fechaCreacion")
+        versiones += datos.pop("version") or 0
+        filas.append(datos)
+    sello = (len(filas), versiones, filas[-1]["idCuenta"] if filas else None)
+    ahora = time.monotonic()
+    return _Entrada(filas, sello, ahora, ahora, fechas)
+
+
+def _guardar(id_cliente: int, entrada: _Entrada):
+    with _lock:
+        _cache[id_cliente] = entrada
+        _cache.move_to_end(id_cliente)
+        while len(_cache) > MAX_CLIENTES:
+            _cache.popitem(last=False)
+
+
+def _entrada(db: Session, id_cliente: int) -> _Entrada:
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _cache.get(id_cliente)
+        if entrada is not None:
+            _cache.move_to_end(id_cliente)
+
+    if entrada is not None and ahora - entrada.cargada < TTL_SEGUNDOS:
+        if ahora - entrada.verificada < REVALIDAR_SEGUNDOS:
+            consultas.incrementar("hit")
+            return entrada
+        if _sello(db, id_cliente) == entrada.sello:
+            entrada.verificada = ahora
+            consultas.incrementar("revalidated")
+            return entrada
+        consultas.incrementar("stale")
+    else:
+        consultas.incrementar("miss")
+
+    entrada = _cargar(db, id_cliente)
+    _guardar(id_cliente, entrada)
+    return entrada
+
+
+def cuentas_de(
+    db: Session,
+    id_cliente: int,
+    idTipoCuenta: Optional[int] = None,
+    idMoneda: Optional[int] = None,
+    idEstadoCuenta: Optional[int] = None,
+    fechaInicio: Optional[date] = None,
+    fechaFin: Optional[date] = None,
+) -> list:
+    """Cuentas del cliente como dicts de schemas.Cuenta, con los filtros de GET /cuentas."""
+    entrada = _entrada(db, id_cliente)
+    filas = entrada.filas
+    if idTipoCuenta is not None:
+        filas = [f for f in filas if f["idTipoCuenta"] == idTipoCuenta]
+    if idMoneda is not None:
+        filas = [f for f in filas if f["idMoneda"] == idMoneda]
+    if idEstadoCuenta is not None:
+        filas = [f for f in filas if f["idEstadoCuenta"] == idEstadoCuenta]
+    if fechaInicio is not None or fechaFin is not None:
+        # Igual que la comparación en SQL de un TIMESTAMP con una fecha (medianoche)
+        desde = datetime.combine(fechaInicio, hora.min) if fechaInicio else None
+        hasta = datetime.combine(fechaFin, hora.min) if fechaFin else None
+        filas = [
+            f for f in filas
+            if (fecha := entrada.fechas.get(f["idCuenta"])) is not None
+            and (desde is None or fecha >= desde)
+            and (hasta is None or fecha <= hasta)
+        ]
+    return filas
+
+
+def escribir(db: Session, *id_clientes: int):
+    """Después de un commit: recarga las cuentas de los clientes afectados que estén en la caché."""
+    for id_cliente in set(id_clientes):
+        with _lock:
+            presente = id_cliente in _cache
+        if presente:
+            _guardar(id_cliente, _cargar(db, id_cliente))
+
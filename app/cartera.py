@@ -0,0 +1,176 @@
+# app/cartera.py
+"""
+Reporte de antigüedad de cartera de préstamos.
+
+`pre_carteraresumen` guarda una fila por préstamo con su saldo pendiente y la
+fecha de la cuota vigente más antigua. Se actualiza de forma incremental cada
+vez que un pago o una aprobación modifica el préstamo, así el reporte agrupa
+esa tabla en lugar de recorrer `pre_prestamodetalle`.
+
+Sólo entran los préstamos aprobados (`aprobado`): los rechazados también tienen
+fechaAutorizacion y saldo, pero nunca se desembolsaron.
+
+La reconstrucción completa actualiza las filas por bloques y al final borra las
+que sobran, así el reporte sigue mostrando la cartera completa mientras corre.
+
+Carga inicial o reconstrucción completa:
+    python -m app.cartera
+"""
+import logging
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, case, func, not_, select
+from sqlalchemy.orm import Session, lazyload
+
+from app import models
+from app.database import SessionLocal, engine
+
+logger = logging.getLogger("banco_mr.cartera")
+
+# Tramos de días de atraso: (nombre, días máximos); el último no tiene límite
+TRAMOS = [("alDia", 0), ("de1a30", 30), ("de31a60", 60), ("de61a90", 90), ("mas90", None)]
+
+
+def actualizar_cartera(db: Session, prestamo: models.PrestamoEncabezado):
+    """
+    Recalcula la fila de resumen de un préstamo. No hace commit, para quedar en
+    la misma transacción que el pago o la aprobación que lo modificó.
+    """
+    fecha_vencida = (
+        db.query(func.min(models.PrestamoDetalle.fechaPago))
+          .filter(
+              models.PrestamoDetalle.idPrestamoEnc == prestamo.idPrestamoEnc,
+              models.PrestamoDetalle.estado == "VIGENTE",
+          )
+          .scalar()
+    )
+    resumen = db.get(models.CarteraResumen, prestamo.idPrestamoEnc)
+
+    # Préstamo pendiente, rechazado o ya cancelado: sale de la cartera
+    if not prestamo.aprobado or fecha_vencida is None or prestamo.saldoPrestamo <= 0:
+        if resumen:
+            db.delete(resumen)
+        return
+
+    if not resumen:
+        resumen = models.CarteraResumen(idPrestamoEnc=prestamo.idPrestamoEnc)
+        db.add(resumen)
+    resumen.idInstitucion = prestamo.idInstitucion
+    resumen.idTipoPrestamo = prestamo.idTipoPrestamo
+    resumen.idMoneda = prestamo.idMoneda
+    resumen.saldoPendiente = prestamo.saldoPrestamo
+    resumen.fechaCuotaVencida = fecha_vencida
+
+
+def reporte_cartera(db: Session, fecha_corte: date) -> list:
+    """
+    Saldo pendiente por institución, tipo de préstamo y moneda, repartido en
+    tramos de días de atraso a `fecha_corte`.
+    """
+    fecha = models.CarteraResumen.fechaCuotaVencida
+    condiciones = [(fecha >= fecha_corte, TRAMOS[0][0])]
+    for nombre, dias in TRAMOS[1:-1]:
+        condiciones.append((fecha >= fecha_corte - timedelta(days=dias), nombre))
+    tramo = case(*condiciones, else_=TRAMOS[-1][0]).label("tramo")
+
+    filas = (
+        db.query(
+            models.CarteraResumen.idInstitucion,
+            models.CarteraResumen.idTipoPrestamo,
+            models.CarteraResumen.idMoneda,
+            tramo,
+            func.count().label("prestamos"),
+            func.sum(models.CarteraResumen.saldoPendiente).label("saldo"),
+        )
+        .group_by(
+            models.CarteraResumen.idInstitucion,
+            models.CarteraResumen.idTipoPrestamo,
+            models.CarteraResumen.idMoneda,
+            tramo,
+        )
+        .all()
+    )
+
+    instituciones = dict(db.query(models.Institucion.idInstitucion, models.Institucion.descripcion).all())
+    tipos = dict(db.query(models.TipoPrestamo.idTipoPrestamo, models.TipoPrestamo.descripcion).all())
+    monedas = dict(db.query(models.Moneda.idMoneda, models.Moneda.nombre).all())
+
+    # Pivotear los tramos como columnas de cada grupo
+    grupos = {}
+    for id_inst, id_tipo, id_moneda, nombre_tramo, prestamos, saldo in filas:
+        clave = (id_inst, id_tipo, id_moneda)
+        if clave not in grupos:
+            grupos[clave] = {
+                "idInstitucion": id_inst,
+                "institucion": instituciones.get(id_inst),
+                "idTipoPrestamo": id_tipo,
+                "tipoPrestamo": tipos.get(id_tipo),
+                "idMoneda": id_moneda,
+                "moneda": monedas.get(id_moneda),
+                "prestamos": 0,
+                "saldoTotal": 0.0,
+                **{nombre: 0.0 for nombre, _ in TRAMOS},
+            }
+        grupo = grupos[clave]
+        grupo["prestamos"] += prestamos
+        grupo["saldoTotal"] += float(saldo)
+        grupo[nombre_tramo] += float(saldo)
+
+    return [grupos[clave] for clave in sorted(grupos)]
+
+
+def _en_cartera():
+    return and_(
+        models.PrestamoEncabezado.aprobado.is_(True),
+        models.PrestamoEncabezado.saldoPrestamo > Decimal("0"),
+    )
+
+
+def reconstruir(db: Session, lote: int = 1000) -> int:
+    """
+    Recalcula el resumen de todos los préstamos aprobados con saldo, por bloques,
+    y luego elimina las filas de los que ya no están en cartera.
+    """
+    procesados, ultimo_id = 0, 0
+    while True:
+        prestamos = (
+            db.query(models.PrestamoEncabezado)
+              .options(lazyload("*"))
+              .filter(_en_cartera(), models.PrestamoEncabezado.idPrestamoEnc > ultimo_id)
+              .order_by(models.PrestamoEncabezado.idPrestamoEnc)
+              .limit(lote)
+              .all()
+        )
+        if not prestamos:
+            break
+        for prestamo in prestamos:
+            actualizar_cartera(db, prestamo)
+        ultimo_id = prestamos[-1].idPrestamoEnc
+        db.commit()
+        db.expunge_all()
+        procesados += len(prestamos)
+        logger.info(f"Cartera: {procesados} préstamos procesados")
+
+    # Rechazados, cancelados o borrados desde la última reconstrucción
+    vigentes = select(models.PrestamoEncabezado.idPrestamoEnc).where(_en_cartera())
+    sobrantes = (
+        db.query(models.CarteraResumen)
+          .filter(not_(models.CarteraResumen.idPrestamoEnc.in_(vigentes)))
+          .delete(synchronize_session=False)
+    )
+    db.commit()
+    if sobrantes:
+        logger.info(f"Cartera: {sobrantes} préstamos fuera de cartera eliminados")
+    return procesados
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    engine.echo = False
+    sesion = SessionLocal()
+    try:
+        total = reconstruir(sesion)
+    finally:
+        sesion.close()
+    print(f"Resumen de cartera reconstruido: {total} préstamos")
@@ -0,0 +1,162 @@
+# app/catalogos.py
+"""
+Caché en memoria de los catálogos (instituciones, tipos de préstamo, plazos y
+monedas), de los tipos de cambio y de los códigos que usa `app.utils`.
+
+Los catálogos cambian muy pocas veces al año: se cargan al iniciar la app y sólo
+se vuelven a leer cuando cambia el número de versión en `bcoma_catalogoversion`.
+Después de modificar un catálogo en la base de datos hay que incrementar la
+versión:
+    python -m app.catalogos --incrementar
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.tipocambio import MatrizTipoCambio, cargar_matriz
+
+logger = logging.getLogger("banco_mr.catalogos")
+
+# Cada cuánto se consulta la versión de los catálogos en la base de datos
+SEGUNDOS_REVISION = int(os.getenv("CATALOGOS_REVISION_SEGUNDOS", "60"))
+CACHE_CONTROL = "public, max-age=300"
+
+# Códigos usados para armar números de cuenta y de documento
+CODIGOS_TIPO_CUENTA = {1: "MT", 2: "AH"}
+CODIGOS_MONEDA = {1: "Q", 2: "D", 3: "E"}
+CODIGOS_TIPO_TRANSACCION = {1: "DEP", 2: "RET", 3: "TRA"}
+
+
+def _serializar(datos) -> tuple:
+    cuerpo = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha256(cuerpo).hexdigest()[:32] + '"'
+    return cuerpo, etag
+
+
+class CacheCatalogos:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revisado = 0.0
+        self.version = None
+        self.respuestas = {}
+        self.monedas = {}
+        self.codigos_tipo_cuenta = dict(CODIGOS_TIPO_CUENTA)
+        self.codigos_moneda = dict(CODIGOS_MONEDA)
+        self.codigos_tipo_transaccion = dict(CODIGOS_TIPO_TRANSACCION)
+        self.tipos_cambio = MatrizTipoCambio()
+
+    def cargar(self, db: Session):
+        """Lee todos los catálogos y precalcula el cuerpo JSON y el ETag de cada uno."""
+        version = self._version_actual(db)
+        datos = {
+            "instituciones": [
+                {"idInstitucion": i.idInstitucion, "nombre": i.descripcion}
+                for i in db.query(models.Institucion).order_by(models.Institucion.idInstitucion)
+            ],
+            "tipos-prestamo": [
+                {"idTipoPrestamo": t.idTipoPrestamo, "nombre": t.descripcion}
+                for t in db.query(models.TipoPrestamo).order_by(models.TipoPrestamo.idTipoPrestamo)
+            ],
+            "plazos": [
+                {
+                    "idPlazo": p.idPlazo,
+                    "cantidadCuotas": p.cantidadCuotas,
+                    "porcentajeAnualIntereses": float(p.porcentajeAnualIntereses),
+                    "descripcion": p.descripcion,
+                }
+                for p in db.query(models.Plazo).order_by(models.Plazo.idPlazo)
+            ],
+            "monedas": [
+                {"idMoneda": m.idMoneda, "nombre": m.nombre, "simbolo": m.codigo}
+                for m in db.query(models.Moneda).order_by(models.Moneda.idMoneda)
+            ],
+        }
+        respuestas = {nombre: _serializar(lista) for nombre, lista in datos.items()}
+        tipos_cambio = cargar_matriz(db)
+
+        with self._lock:
+            self.version = version
+            self.respuestas = respuestas
+            self.monedas = {m["idMoneda"]: m for m in datos["monedas"]}
+            self.tipos_cambio = tipos_cambio
+            self._revisado = time.monotonic()
+        logger.info(f"Catálogos cargados (versión {version})")
+
+    def vigente(self, db: Session) -> "CacheCatalogos":
+        """Devuelve la caché, recargándola si la versión en la base de datos cambió."""
+        if self.version is not None and time.monotonic() - self._revisado < SEGUNDOS_REVISION:
+            return self
+        if self.version is None or self._version_actual(db) != self.version:
+            self.cargar(db)
+        else:
+            self._revisado = time.monotonic()
+        return self
+
+    @staticmethod
+    def _version_actual(db: Session) -> int:
+        fila = db.query(models.CatalogoVersion.version).first()
+        return fila.version if fila else 0
+
+
+cache = CacheCatalogos()
+
+
+def cargar_al_iniciar():
+    db = SessionLocal()
+    try:
+        cache.cargar(db)
+    except Exception as e:
+        # La caché se cargará en la primera petición que la necesite
+        logger.warning(f"No se pudieron cargar los catálogos al iniciar: {e}")
+    finally:
+        db.close()
+
+
+def incrementar_version(db: Session) -> int:
+    fila = db.query(models.CatalogoVersion).first()
+    if not fila:
+        fila = models.CatalogoVersion(version=0)
+        db.add(fila)
+    fila.version += 1
+    db.commit()
+    return fila.version
+
+
+def respuesta_catalogo(request: Request, db: Session, nombre: str) -> Response:
+    """Respuesta JSON del catálogo con ETag fuerte; 304 si el cliente ya la tiene."""
+    cuerpo, etag = cache.vigente(db).respuestas[nombre]
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etiquetas = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+        if etag in etiquetas or "*" in etiquetas:
+            return Response(status_code=304, headers=headers)
+
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Administración de la caché de catálogos")
+    parser.add_argument("--incrementar", action="store_true",
+                        help="Incrementa la versión para que todos los procesos recarguen los catálogos")
+    args = parser.parse_args()
+
+    sesion = SessionLocal()
+    try:
+        if args.incrementar:
+            print(f"Versión de catálogos: {incrementar_version(sesion)}")
+        else:
+            print(f"Versión de catálogos: {CacheCatalogos._version_actual(sesion)}")
+    finally:
+        sesion.close()
@@ -0,0 +1,217 @@
+# app/compresion.py
+"""
+Compresión gzip/brotli de las respuestas según `Accept-Encoding`.
+
+Middleware ASGI puro. Se comprimen sólo los tipos de contenido configurados,
+cada uno con su propio nivel:
+
+    COMPRESION_NIVELES_GZIP="application/json=6,text/csv=6,text/*=6"
+    COMPRESION_NIVELES_BR="application/json=5,text/*=5"
+
+Las respuestas completas de menos de COMPRESION_MIN_BYTES se envían sin
+comprimir. Las respuestas en streaming se comprimen bloque a bloque; si el
+compresor retiene más de COMPRESION_VACIADO_BYTES sin emitir nada se vacía,
+para que el cliente siga recibiendo datos a medida que se generan. No se
+comprimen si declaran un Content-Length menor al mínimo.
+Las que ya traen Content-Encoding (p. ej. la exportación gzip de soporte) no
+se tocan.
+
+brotli viene en requirements.txt; si aun así falta el paquete sólo se ofrece gzip. La
+razón comprimido/original de cada respuesta queda en /metrics.
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+from app.metricas import RUTA_DESCONOCIDA, Contador, Histograma, registro
+
+try:
+    import brotli
+except ImportError:  # instalación sin brotli: sólo gzip
+    brotli = None
+
+MIN_BYTES = int(os.getenv("COMPRESION_MIN_BYTES", "1024"))
+# En streaming, bytes sin comprimir que se acumulan como máximo antes de vaciar el compresor
+VACIADO_BYTES = int(os.getenv("COMPRESION_VACIADO_BYTES", "16384"))
+NIVELES_GZIP = os.getenv(
+    "COMPRESION_NIVELES_GZIP", "application/json=6,application/x-ndjson=6,text/csv=6,text/*=6")
+NIVELES_BR = os.getenv(
+    "COMPRESION_NIVELES_BR", "application/json=5,application/x-ndjson=5,text/csv=5,text/*=5")
+
+BUCKETS_RAZON = (0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.7, 1.0)
+
+razon_compresion = registro.agregar(Histograma(
+    "http_response_compression_ratio", "Tamaño comprimido / tamaño original de las respuestas comprimidas",
+    BUCKETS_RAZON, ("route", "encoding")))
+bytes_compresion = registro.agregar(Contador(
+    "http_response_compression_bytes_total", "Bytes de las respuestas comprimidas, antes y después de comprimir",
+    ("encoding", "stage")))
+
+
+def leer_niveles(valor: str) -> dict:
+    """'application/json=6,text/*=5' -> {'application/json': 6, 'text/*': 5}"""
+    niveles = {}
+    for parte in valor.split(","):
+        tipo, _, nivel = parte.strip().partition("=")
+        if tipo and nivel:
+            niveles[tipo.strip().lower()] = int(nivel)
+    return niveles
+
+
+class _Gzip:
+    def __init__(self, nivel: int):
+        self._compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31 = formato gzip
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return self._compresor.compress(datos)
+
+    def vaciar(self) -> bytes:
+        return self._compresor.flush(zlib.Z_SYNC_FLUSH)
+
+    def terminar(self) -> bytes:
+        return self._compresor.flush()
+
+
+class _Brotli:
+    def __init__(self, nivel: int):
+        self._compresor = brotli.Compressor(quality=nivel)
+
+    def comprimir(self, datos: bytes) -> bytes:
+        return self._compresor.process(datos)
+
+    def vaciar(self) -> bytes:
+        return self._compresor.flush()
+
+    def terminar(self) -> bytes:
+        return self._compresor.finish()
+
+
+# codificación -> (clase del compresor, niveles por tipo de contenido), en orden de preferencia
+CODIFICACIONES = {}
+if brotli is not None:
+    CODIFICACIONES["br"] = (_Brotli, leer_niveles(NIVELES_BR))
+CODIFICACIONES["gzip"] = (_Gzip, leer_niveles(NIVELES_GZIP))
+
+
+def elegir_codificacion(scope) -> Optional[str]:
+    aceptadas = {}
+    for nombre, valor in scope["headers"]:
+        if nombre != b"accept-encoding":
+            continue
+        for parte in valor.decode("latin-1").split(","):
+            codificacion, _, parametros = parte.partition(";")
+            peso = 1.0
+            parametros = parametros.strip()
+            if parametros.startswith("q="):
+                try:
+                    peso = float(parametros[2:])
+                except ValueError:
+                    peso = 0.0
+            aceptadas[codificacion.strip().lower()] = peso
+    for codificacion in CODIFICACIONES:
+        if aceptadas.get(codificacion, aceptadas.get("*", 0)) > 0:
+            return codificacion
+    return None
+
+
+def nivel_para(codificacion: str, tipo_contenido: str) -> Optional[int]:
+    niveles = CODIFICACIONES[codificacion][1]
+    tipo = tipo_contenido.split(";")[0].strip().lower()
+    if tipo in niveles:
+        return niveles[tipo]
+    return niveles.get(tipo.split("/")[0] + "/*")
+
+
+class CompresionMiddleware:
+    def __init__(self, app, min_bytes: int = MIN_BYTES):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacion = elegir_codificacion(scope)
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = None
+        compresor = None
+        original = comprimido = pendiente = 0
+
+        def registrar():
+            ruta = getattr(scope.get("route"), "path", RUTA_DESCONOCIDA)
+            razon_compresion.observar(comprimido / original if original else 1.0, ruta, codificacion)
+            bytes_compresion.incrementar(codificacion, "original", cantidad=original)
+            bytes_compresion.incrementar(codificacion, "comprimido", cantidad=comprimido)
+
+        async def send_comprimido(mensaje):
+            nonlocal inicio, compresor, original, comprimido, pendiente
+            if mensaje["type"] == "http.response.start":
+                # Se retiene hasta ver el primer bloque del cuerpo
+                inicio = mensaje
+                return
+            if mensaje["type"] != "http.response.body":
+                await send(mensaje)
+                return
+
+            cuerpo = mensaje.get("body", b"")
+            mas = mensaje.get("more_body", False)
+
+            if inicio is not None:
+                encabezados = MutableHeaders(scope=inicio)
+                nivel = None
+                if "content-encoding" not in encabezados and inicio["status"] not in (204, 304):
+                    nivel = nivel_para(codificacion, encabezados.get("content-type", ""))
+                if nivel is not None:
+                    encabezados.add_vary_header("Accept-Encoding")
+                declarado = encabezados.get("content-length")
+                pequena = (not mas and len(cuerpo) < self.min_bytes) or \
+                    (declarado is not None and declarado.isdigit() and int(declarado) < self.min_bytes)
+                if nivel is None or pequena:
+                    await send(inicio)
+                    inicio = None
+                    await send(mensaje)
+                    return
+
+                compresor = CODIFICACIONES[codificacion][0](nivel)
+                encabezados["content-encoding"] = codificacion
+                del encabezados["content-length"]
+                if not mas:
+                    # Respuesta completa: se comprime de una vez y se declara su tamaño
+                    datos = compresor.comprimir(cuerpo) + compresor.terminar()
+                    encabezados["content-length"] = str(len(datos))
+                    original, comprimido = len(cuerpo), len(datos)
+                    await send(inicio)
+                    inicio = None
+                    await send({"type": "http.response.body", "body": datos})
+                    registrar()
+                    return
+                await send(inicio)
+                inicio = None
+
+            if compresor is None:
+                await send(mensaje)
+                return
+
+            original += len(cuerpo)
+            pendiente += len(cuerpo)
+            datos = compresor.comprimir(cuerpo)
+            if not mas:
+                datos += compresor.terminar()
+            elif datos:
+                pendiente = 0
+            elif pendiente >= VACIADO_BYTES:
+                # Nada salió aún del compresor: se vacía para no retener el streaming
+                datos = compresor.vaciar()
+                pendiente = 0
+            if datos or not mas:
+                comprimido += len(datos)
+                await send({"type": "http.response.body", "body": datos, "more_body": mas})
+            if not mas:
+                registrar()
+
+        await self.app(scope, receive, send_comprimido)
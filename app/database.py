@@ -1,8 +1,11 @@
 # app/database.py
 import os
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 root = Path(__file__).resolve().parents[1]
@@ -15,10 +18,75 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL no definida")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, echo=True)
+# Conexiones que la base admite para toda la aplicación; se reparten entre los
+# procesos trabajadores (WEB_CONCURRENCY, lo fija `app.servidor`). Sin valor se
+# usa el pool por defecto de SQLAlchemy en cada proceso.
+CONEXIONES_TOTALES = int(os.getenv("DB_CONEXIONES_TOTALES", "0"))
+TRABAJADORES = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+ECHO = os.getenv("DB_ECHO", "1").lower() in ("1", "true", "si", "sí")
+
+
+# Vida media, en segundos, del promedio de espera por conexiones de PoolMedido
+VIDA_MEDIA_ESPERA = 5.0
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que lleva un promedio reciente de la espera por una conexión (ver `app.admision`)."""
+
+    _lock = threading.Lock()
+    _espera = 0.0
+    _instante = time.monotonic()
+
+    def _do_get(self):
+        inicio = time.monotonic()
+        try:
+            return super()._do_get()
+        finally:
+            fin = time.monotonic()
+            with PoolMedido._lock:
+                anterior = PoolMedido.espera_reciente(fin)
+                PoolMedido._espera = anterior + (fin - inicio - anterior) * 0.2
+                PoolMedido._instante = fin
+
+    @staticmethod
+    def espera_reciente(ahora: float = None) -> float:
+        """Media móvil de la espera; decae con el tiempo si no se piden conexiones."""
+        ahora = time.monotonic() if ahora is None else ahora
+        return PoolMedido._espera * 0.5 ** ((ahora - PoolMedido._instante) / VIDA_MEDIA_ESPERA)
+
+
+def opciones_pool() -> dict:
+    if DATABASE_URL in ("sqlite://", "sqlite:///:memory:"):
+        return {}
+    opciones = {"poolclass": PoolMedido}
+    if DATABASE_URL.startswith("sqlite") or not CONEXIONES_TOTALES:
+        return opciones
+    por_trabajador = max(1, CONEXIONES_TOTALES // TRABAJADORES)
+    # Sin desborde: la suma de los pools nunca supera el presupuesto de la base
+    return {
+        **opciones,
+        "pool_size": por_trabajador,
+        "max_overflow": 0,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+    }
+
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, echo=ECHO, **opciones_pool())
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
+
+def _despues_de_fork():
+    # Un proceso hijo no debe reutilizar los sockets del padre: se descartan
+    # sus conexiones sin cerrarlas (close=False) y el hijo abre las propias.
+    engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_despues_de_fork)
+
 def get_db():
     db = SessionLocal()
     try:
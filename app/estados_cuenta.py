@@ -0,0 +1,155 @@
+# app/estados_cuenta.py
+"""
+Estados de cuenta a partir de `bcoma_historial`.
+
+Cada registro del historial guarda el saldo resultante, así que el saldo inicial
+es el del último registro anterior al período y los movimientos salen de un
+recorrido por el índice (idCuenta, fecha). Los estados de meses ya cerrados no
+cambian y se guardan en una caché en memoria.
+"""
+import csv
+import io
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Iterator
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.catalogos import cache as catalogos
+from app.pdf_utils import generar_pdf
+
+MAX_ESTADOS_EN_CACHE = 512
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _saldo_inicial(db: Session, cuenta: models.Cuenta, desde: date) -> Decimal:
+    anterior = (
+        db.query(models.Historial.saldo)
+          .filter(
+              models.Historial.idCuenta == cuenta.idCuenta,
+              models.Historial.fecha < datetime.combine(desde, time.min),
+          )
+          .order_by(models.Historial.fecha.desc(), models.Historial.idCorrelativo.desc())
+          .first()
+    )
+    if anterior:
+        return anterior.saldo
+    return cuenta.saldoInicial or Decimal("0.00")
+
+
+def _consultar_estado(db: Session, cuenta: models.Cuenta, desde: date, hasta: date) -> dict:
+    saldo_inicial = _saldo_inicial(db, cuenta, desde)
+
+    filas = (
+        db.query(
+            models.Historial.fecha,
+            models.Historial.numeroDocumento,
+            models.Historial.monto,
+            models.Historial.saldo,
+            models.TipoTransaccion.nombre,
+            models.Transaccion.descripcion,
+        )
+        .join(models.Transaccion, models.Transaccion.idTransaccion == models.Historial.idTransaccion)
+        .join(models.TipoTransaccion,
+              models.TipoTransaccion.idTipoTransaccion == models.Transaccion.idTipoTransaccion)
+        .filter(
+            models.Historial.idCuenta == cuenta.idCuenta,
+            models.Historial.fecha >= datetime.combine(desde, time.min),
+            models.Historial.fecha < datetime.combine(hasta + timedelta(days=1), time.min),
+        )
+        .order_by(models.Historial.fecha, models.Historial.idCorrelativo)
+        .all()
+    )
+
+    movimientos = []
+    saldo_anterior = saldo_inicial
+    for fecha, documento, monto, saldo, tipo, descripcion in filas:
+        # El historial guarda el monto sin signo: el sentido sale de la variación del saldo
+        es_credito = saldo >= saldo_anterior
+        movimientos.append({
+            "fecha": fecha,
+            "numeroDocumento": documento,
+            "tipoTransaccion": tipo,
+            "descripcion": descripcion,
+            "credito": float(monto) if es_credito else 0.0,
+            "debito": 0.0 if es_credito else float(monto),
+            "saldo": float(saldo),
+        })
+        saldo_anterior = saldo
+
+    return {
+        "numeroCuenta": cuenta.numeroCuenta,
+        "moneda": catalogos.vigente(db).monedas.get(cuenta.idMoneda, {}).get("simbolo"),
+        "desde": desde,
+        "hasta": hasta,
+        "saldoInicial": float(saldo_inicial),
+        "movimientos": movimientos,
+        "saldoFinal": float(saldo_anterior),
+    }
+
+
+def estado_cuenta(db: Session, cuenta: models.Cuenta, desde: date, hasta: date) -> dict:
+    """Estado de cuenta del período; los de meses cerrados se sirven desde la caché."""
+    cerrado = hasta < date.today().replace(day=1)
+    clave = (cuenta.idCuenta, desde, hasta)
+    if cerrado:
+        with _cache_lock:
+            if clave in _cache:
+                _cache.move_to_end(clave)
+                return _cache[clave]
+
+    estado = _consultar_estado(db, cuenta, desde, hasta)
+
+    if cerrado:
+        with _cache_lock:
+            _cache[clave] = estado
+            if len(_cache) > MAX_ESTADOS_EN_CACHE:
+                _cache.popitem(last=False)
+    return estado
+
+
+def generar_csv(estado: dict) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(["fecha", "numeroDocumento", "tipoTransaccion", "descripcion", "credito", "debito", "saldo"])
+    escritor.writerow([estado["desde"].isoformat(), "", "", "Saldo inicial", "", "", estado["saldoInicial"]])
+    for i, m in enumerate(estado["movimientos"], 1):
+        escritor.writerow([
+            m["fecha"].isoformat() if m["fecha"] else "",
+            m["numeroDocumento"], m["tipoTransaccion"], m["descripcion"] or "",
+            m["credito"], m["debito"], m["saldo"],
+        ])
+        if i % 1000 == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    escritor.writerow([estado["hasta"].isoformat(), "", "", "Saldo final", "", "", estado["saldoFinal"]])
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _lineas_pdf(estado: dict) -> Iterator[str]:
+    moneda = estado["moneda"] or ""
+    yield "Banco M&R - Estado de cuenta"
+    yield f"Cuenta: {estado['numeroCuenta']}   Moneda: {moneda}"
+    yield f"Período: {estado['desde'].strftime('%d/%m/%Y')} al {estado['hasta'].strftime('%d/%m/%Y')}"
+    yield ""
+    yield f"Saldo inicial: {estado['saldoInicial']:,.2f}"
+    yield ""
+    yield f"{'Fecha':<17}{'Documento':<14}{'Tipo':<15}{'Crédito':>14}{'Débito':>14}{'Saldo':>16}"
+    for m in estado["movimientos"]:
+        fecha = m["fecha"].strftime("%d/%m/%Y %H:%M") if m["fecha"] else ""
+        yield (
+            f"{fecha:<17}{(m['numeroDocumento'] or '')[:13]:<14}{(m['tipoTransaccion'] or '')[:14]:<15}"
+            f"{m['credito']:>14,.2f}{m['debito']:>14,.2f}{m['saldo']:>16,.2f}"
+        )
+    yield ""
+    yield f"Saldo final: {estado['saldoFinal']:,.2f}"
+
+
+def generar_pdf_estado(estado: dict) -> Iterator[bytes]:
+    return generar_pdf(_lineas_pdf(estado))
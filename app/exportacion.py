@@ -0,0 +1,152 @@
+# app/exportacion.py
+"""
+Exportación completa de cuentas, usuarios y transacciones en NDJSON o CSV.
+
+Las filas se leen con un cursor del lado del servidor (`stream_results` +
+`yield_per`) y se escriben por bloques a medida que llegan, de modo que la
+memoria usada no depende del tamaño de la tabla. Opcionalmente la salida se
+comprime con gzip sobre la marcha.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Callable, Iterator, Optional
+
+from app import models
+from app.database import SessionLocal
+
+FILAS_POR_BLOQUE = 1000
+
+# entidad -> (columnas exportadas, columna usada por `updated_since`)
+ENTIDADES = {
+    "cuentas": (
+        [
+            models.Cuenta.idCuenta,
+            models.Cuenta.numeroCuenta,
+            models.Cuenta.idCliente,
+            models.Cuenta.idTipoCuenta,
+            models.Cuenta.saldoInicial,
+            models.Cuenta.saldo,
+            models.Cuenta.idMoneda,
+            models.Cuenta.idEstadoCuenta,
+            models.Cuenta.fechaCreacion,
+            models.Cuenta.fechaActualizacion,
+        ],
+        models.Cuenta.fechaActualizacion,
+    ),
+    "usuarios": (
+        [
+            models.Usuario.idUsuario,
+            models.Usuario.username,
+            models.Usuario.rol,
+            models.Usuario.estado,
+            models.Usuario.idCliente,
+            models.Usuario.fechaRegistro,
+            models.Usuario.fechaActualizacion,
+        ],
+        models.Usuario.fechaActualizacion,
+    ),
+    "transacciones": (
+        [
+            models.Transaccion.idTransaccion,
+            models.Transaccion.numeroDocumento,
+            models.Transaccion.fecha,
+            models.Transaccion.idCuentaOrigen,
+            models.Transaccion.idCuentaDestino,
+            models.Transaccion.idTipoTransaccion,
+            models.Transaccion.monto,
+            models.Transaccion.descripcion,
+        ],
+        models.Transaccion.fecha,
+    ),
+}
+
+TIPOS_CONTENIDO = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _valor(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def _filas(entidad: str, desde: Optional[datetime]) -> Iterator[list]:
+    """Bloques de filas leídos con un cursor del servidor; abre su propia sesión."""
+    columnas, columna_fecha = ENTIDADES[entidad]
+    db = SessionLocal()
+    try:
+        q = db.query(*columnas)
+        if desde is not None:
+            q = q.filter(columna_fecha >= desde)
+        resultado = (
+            q.order_by(columnas[0])
+             .execution_options(stream_results=True, yield_per=FILAS_POR_BLOQUE)
+        )
+        bloque = []
+        for fila in resultado:
+            bloque.append(fila)
+            if len(bloque) >= FILAS_POR_BLOQUE:
+                yield bloque
+                bloque = []
+        if bloque:
+            yield bloque
+    finally:
+        db.close()
+
+
+def _con_avance(bloques: Iterator[list], avance: Callable[[int], None]) -> Iterator[list]:
+    filas = 0
+    for bloque in bloques:
+        yield bloque
+        filas += len(bloque)
+        avance(filas)
+
+
+def generar_exportacion(entidad: str, formato: str, desde: Optional[datetime] = None,
+                        avance: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Genera el contenido de la exportación en bloques de bytes. `avance`, si se
+    indica, recibe la cantidad de filas exportadas después de cada bloque.
+    """
+    columnas, _ = ENTIDADES[entidad]
+    nombres = [c.key for c in columnas]
+    bloques = _filas(entidad, desde)
+    if avance is not None:
+        bloques = _con_avance(bloques, avance)
+
+    if formato == "csv":
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(nombres)
+        for bloque in bloques:
+            escritor.writerows([_valor(v) for v in fila] for fila in bloque)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+        return
+
+    for bloque in bloques:
+        yield "".join(
+            json.dumps(dict(zip(nombres, map(_valor, fila))), ensure_ascii=False) + "\n"
+            for fila in bloque
+        ).encode("utf-8")
+
+
+def comprimir_gzip(partes: Iterator[bytes], nivel: int = 6) -> Iterator[bytes]:
+    """Comprime un flujo de bytes con gzip a medida que se genera."""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31 = formato gzip
+    for parte in partes:
+        salida = compresor.compress(parte)
+        if salida:
+            yield salida
+    yield compresor.flush()
@@ -0,0 +1,128 @@
+# app/hilos.py
+"""
+Capacidad del threadpool para los endpoints síncronos, separada por clase de
+ruta.
+
+Todos los endpoints son `def`, así que FastAPI los ejecuta (junto con
+`get_db` y `get_current_user`) en el threadpool de AnyIO. Con un solo
+threadpool, una ráfaga de reportes lentos o de transferencias esperando al
+SMTP deja en cola a todo lo demás. Aquí cada solicitud reserva primero un
+cupo de su clase, en una dependencia asíncrona de la app, y recién entonces
+usa un hilo:
+
+  - dinero: transacciones, pagos y aprobación de préstamos (HILOS_DINERO,
+    por defecto un cuarto de HILOS_POR_TRABAJADOR)
+  - reportes: listados, estados de cuenta y exportaciones (HILOS_REPORTES,
+    también un cuarto por defecto)
+  - general: el resto (lo que sobra de HILOS_POR_TRABAJADOR); el trabajador no
+    arranca si quedan menos de HILOS_GENERAL_MINIMO, porque login, consultas
+    de cuentas y el resto de la API harían cola en esos pocos hilos
+
+El threadpool se dimensiona con la suma de los cupos, así que una clase
+saturada nunca toma hilos de otra: los movimientos de dinero conservan sus
+hilos aunque los reportes hagan cola.
+
+En /metrics quedan los cupos de cada clase (total, en uso, en espera) y el
+tiempo que cada solicitud esperó su cupo.
+"""
+import inspect
+import os
+import time
+
+from anyio import CapacityLimiter, to_thread
+from fastapi import Request
+
+from app.metricas import RUTA_DESCONOCIDA, Histograma, Medidor, registro
+
+HILOS_POR_TRABAJADOR = int(os.getenv("HILOS_POR_TRABAJADOR", "40"))
+HILOS_DINERO = int(os.getenv("HILOS_DINERO") or max(1, HILOS_POR_TRABAJADOR // 4))
+HILOS_REPORTES = int(os.getenv("HILOS_REPORTES") or max(1, HILOS_POR_TRABAJADOR // 4))
+HILOS_GENERAL = HILOS_POR_TRABAJADOR - HILOS_DINERO - HILOS_REPORTES
+HILOS_GENERAL_MINIMO = int(os.getenv("HILOS_GENERAL_MINIMO", "4"))
+
+# (método, plantilla de la ruta) de cada clase; lo no listado es "general"
+RUTAS_DINERO = {
+    ("POST", "/transacciones"),
+    ("POST", "/transacciones/lote"),
+    ("POST", "/prestamos/pagar"),
+    ("POST", "/prestamos/aprobar"),
+    ("POST", "/prestamos/aprobar/lote"),
+}
+RUTAS_REPORTES = {
+    ("GET", "/mis"),
+    ("GET", "/transacciones"),
+    ("GET", "/cuentas/all"),
+    ("GET", "/cuentas/{numero}/estado-cuenta"),
+    ("GET", "/prestamos/todos"),
+    ("GET", "/prestamos/reportes/cartera"),
+    ("GET", "/prestamos/mis-pagos"),
+    ("GET", "/prestamos/mis-pagos-filtrados"),
+    ("GET", "/soporte/usuarios"),
+    ("GET", "/soporte/cuentas"),
+    ("GET", "/soporte/export/{entidad}"),
+    ("GET", "/jobs/{id_trabajo}/archivo"),
+}
+
+BUCKETS_ESPERA = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+limitadores = {
+    "dinero": CapacityLimiter(HILOS_DINERO),
+    "reportes": CapacityLimiter(HILOS_REPORTES),
+    "general": CapacityLimiter(max(1, HILOS_GENERAL)),
+}
+# Limitador del threadpool de AnyIO; se guarda al configurar (sólo existe dentro del loop)
+_threadpool = {}
+
+
+def configurar():
+    """Dimensiona el threadpool del trabajador; se llama en el lifespan."""
+    if HILOS_GENERAL < HILOS_GENERAL_MINIMO:
+        raise RuntimeError(
+            f"HILOS_POR_TRABAJADOR={HILOS_POR_TRABAJADOR} con HILOS_DINERO={HILOS_DINERO} y "
+            f"HILOS_REPORTES={HILOS_REPORTES} deja {HILOS_GENERAL} hilos para el resto de las rutas "
+            f"(mínimo {HILOS_GENERAL_MINIMO})"
+        )
+    limitador = to_thread.current_default_thread_limiter()
+    limitador.total_tokens = sum(l.total_tokens for l in limitadores.values())
+    _threadpool["anyio"] = limitador
+
+
+def clase_de(metodo: str, ruta: str) -> str:
+    if (metodo, ruta) in RUTAS_DINERO:
+        return "dinero"
+    if (metodo, ruta) in RUTAS_REPORTES:
+        return "reportes"
+    return "general"
+
+
+def _estado_limitadores() -> dict:
+    valores = {}
+    for nombre, limitador in {**limitadores, **_threadpool}.items():
+        estadisticas = limitador.statistics()
+        valores[(nombre, "total")] = limitador.total_tokens
+        valores[(nombre, "borrowed")] = estadisticas.borrowed_tokens
+        valores[(nombre, "waiting")] = estadisticas.tasks_waiting
+    return valores
+
+
+registro.agregar(Medidor(
+    "threadpool_limiter_tokens", "Cupos del threadpool por clase de ruta (total, en uso, en espera)",
+    _estado_limitadores, ("limiter", "state")))
+espera_cupo = registro.agregar(Histograma(
+    "threadpool_queue_seconds", "Tiempo de espera de un cupo del threadpool", BUCKETS_ESPERA, ("limiter", "route")))
+
+
+async def reservar_hilo(request: Request):
+    """Dependencia de la app: ocupa un cupo de la clase de la ruta mientras dura la solicitud."""
+    endpoint = getattr(request.scope.get("route"), "endpoint", None)
+    if inspect.iscoroutinefunction(endpoint):
+        # Los endpoints asíncronos (p. ej. el chequeo de salud) no usan el threadpool
+        yield
+        return
+    ruta = getattr(request.scope.get("route"), "path", RUTA_DESCONOCIDA)
+    clase = clase_de(request.method, ruta)
+    limitador = limitadores[clase]
+    inicio = time.perf_counter()
+    async with limitador:
+        espera_cupo.observar(time.perf_counter() - inicio, clase, ruta)
+        yield
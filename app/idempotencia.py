@@ -0,0 +1,270 @@
+# app/idempotencia.py
+"""
+Soporte del encabezado `Idempotency-Key` para operaciones que mueven dinero.
+
+La primera solicitud con una clave reserva un registro EN_PROCESO en
+`bcoma_idempotencia` (clave única por usuario) antes de ejecutar la operación.
+El registro pasa a COMPLETADO dentro de la misma transacción que escribe el
+movimiento: en el primer commit con escrituras de la sesión de la operación se
+actualiza también la clave. Así no hay un instante en que el dinero se haya
+movido y la clave siga libre, aunque después falle algo (un correo, la
+respuesta) o el proceso muera. Al terminar se guarda la respuesta completa y
+un reintento con la misma clave la devuelve sin volver a ejecutar nada. Las
+respuestas recientes se mantienen además en una caché en memoria para no
+consultar la base de datos en los reintentos.
+
+Si la operación falla antes de ese commit la clave se libera para poder
+reintentar. Una clave EN_PROCESO con más de IDEMPOTENCIA_EN_PROCESO_SEGUNDOS
+quedó abandonada (el proceso murió antes del commit): la toma el siguiente
+reintento con la misma solicitud.
+
+Depurar claves vencidas:
+    python -m app.idempotencia --purgar
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+
+HORAS_VIGENCIA = int(os.getenv("IDEMPOTENCIA_HORAS", "24"))
+SEGUNDOS_EN_PROCESO = int(os.getenv("IDEMPOTENCIA_EN_PROCESO_SEGUNDOS", "300"))
+MAX_CLAVES_EN_CACHE = 10000
+LONGITUD_MAXIMA = 100
+
+EN_PROCESO = "EN_PROCESO"
+COMPLETADO = "COMPLETADO"
+# Respuesta de un reintento si el proceso murió entre el commit y el guardado de la respuesta
+RESPUESTA_APLICADA = {"detail": "La operación ya fue aplicada"}
+
+# (username, clave) -> (huella, codigo, cuerpo)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _huella(ruta: str, datos: BaseModel) -> str:
+    return hashlib.sha256(f"{ruta}\n{datos.model_dump_json()}".encode("utf-8")).hexdigest()
+
+
+def _guardar_en_cache(llave: tuple, valor: tuple):
+    with _cache_lock:
+        _cache[llave] = valor
+        _cache.move_to_end(llave)
+        if len(_cache) > MAX_CLAVES_EN_CACHE:
+            _cache.popitem(last=False)
+
+
+def _repetir(huella: str, previa: tuple) -> JSONResponse:
+    huella_previa, codigo, cuerpo = previa
+    if huella_previa != huella:
+        raise HTTPException(
+            status_code=422,
+            detail="La Idempotency-Key ya fue usada con una solicitud diferente",
+        )
+    return JSONResponse(cuerpo, status_code=codigo, headers={"Idempotent-Replayed": "true"})
+
+
+def _buscar(db, username: str, clave: str) -> Optional[models.Idempotencia]:
+    return (
+        db.query(models.Idempotencia)
+          .filter(models.Idempotencia.username == username, models.Idempotencia.clave == clave)
+          .first()
+    )
+
+
+def con_idempotencia(
+    db_operacion: Session,
+    clave: Optional[str],
+    username: str,
+    ruta: str,
+    datos: BaseModel,
+    operacion: Callable[[], Any],
+    status_code: int = 200,
+) -> Any:
+    """
+    Ejecuta `operacion` una sola vez por (usuario, clave). `db_operacion` es la
+    sesión en la que la operación escribe. Sin clave la operación se ejecuta
+    normalmente.
+    """
+    if not clave:
+        return operacion()
+    if len(clave) > LONGITUD_MAXIMA:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key admite hasta {LONGITUD_MAXIMA} caracteres")
+
+    llave = (username, clave)
+    huella = _huella(ruta, datos)
+    with _cache_lock:
+        previa = _cache.get(llave)
+    if previa:
+        return _repetir(huella, previa)
+
+    # Reserva de la clave en una sesión propia, independiente de la operación
+    db = SessionLocal()
+    try:
+        registro = _buscar(db, username, clave)
+        if registro is None:
+            registro = models.Idempotencia(
+                username=username, clave=clave, ruta=ruta, huella=huella, estado=EN_PROCESO,
+                fechaCreacion=datetime.utcnow(),
+            )
+            db.add(registro)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Otra solicitud con la misma clave la reservó primero
+                db.rollback()
+                registro = _buscar(db, username, clave)
+            else:
+                return _ejecutar(db, db_operacion, registro.idIdempotencia, huella, llave, operacion, status_code)
+
+        if registro is not None and registro.estado == EN_PROCESO:
+            if registro.huella == huella and _tomar_abandonada(db, registro.idIdempotencia):
+                return _ejecutar(db, db_operacion, registro.idIdempotencia, huella, llave, operacion, status_code)
+        if registro is None or registro.estado == EN_PROCESO:
+            raise HTTPException(
+                status_code=409,
+                detail="Hay una solicitud con la misma Idempotency-Key en proceso",
+            )
+        previa = (registro.huella, registro.codigoEstado, json.loads(registro.respuesta))
+        if registro.respuesta != json.dumps(RESPUESTA_APLICADA, ensure_ascii=False):
+            _guardar_en_cache(llave, previa)
+        return _repetir(huella, previa)
+    finally:
+        db.close()
+
+
+def _tomar_abandonada(db, id_registro: int) -> bool:
+    """Reserva de nuevo una clave EN_PROCESO vencida; sólo un reintento la obtiene."""
+    limite = datetime.utcnow() - timedelta(seconds=SEGUNDOS_EN_PROCESO)
+    tomada = db.execute(
+        update(models.Idempotencia)
+        .where(
+            models.Idempotencia.idIdempotencia == id_registro,
+            models.Idempotencia.estado == EN_PROCESO,
+            models.Idempotencia.fechaCreacion < limite,
+        )
+        .values(fechaCreacion=datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return tomada == 1
+
+
+class _MarcaAlConfirmar:
+    """
+    Escuchas de la sesión de la operación: en el primer commit con escrituras
+    pasa la clave a COMPLETADO dentro de esa misma transacción.
+    """
+
+    def __init__(self, sesion: Session, id_registro: int, status_code: int):
+        self.sesion = sesion
+        self.id_registro = id_registro
+        self.status_code = status_code
+        self.escribio = False   # hubo un flush en la transacción actual
+        self.pendiente = False  # la clave se actualizó en la transacción actual
+        self.aplicada = False   # esa transacción se confirmó
+        self._escuchas = (
+            ("after_flush", self._despues_de_flush),
+            ("before_commit", self._antes_de_confirmar),
+            ("after_commit", self._despues_de_confirmar),
+            ("after_rollback", self._despues_de_revertir),
+        )
+        for nombre, funcion in self._escuchas:
+            event.listen(sesion, nombre, funcion)
+
+    def quitar(self):
+        for nombre, funcion in self._escuchas:
+            event.remove(self.sesion, nombre, funcion)
+
+    def _despues_de_flush(self, sesion, contexto):
+        self.escribio = True
+
+    def _antes_de_confirmar(self, sesion):
+        if self.aplicada or self.pendiente:
+            return
+        if not (self.escribio or sesion.new or sesion.dirty or sesion.deleted):
+            return
+        sesion.execute(
+            update(models.Idempotencia)
+            .where(models.Idempotencia.idIdempotencia == self.id_registro)
+            .values(
+                estado=COMPLETADO,
+                codigoEstado=self.status_code,
+                respuesta=json.dumps(RESPUESTA_APLICADA, ensure_ascii=False),
+            )
+        )
+        self.pendiente = True
+
+    def _despues_de_confirmar(self, sesion):
+        self.aplicada = self.aplicada or self.pendiente
+        self.escribio = self.pendiente = False
+
+    def _despues_de_revertir(self, sesion):
+        self.escribio = self.pendiente = False
+
+
+def _ejecutar(db, db_operacion: Session, id_registro: int, huella: str, llave: tuple,
+              operacion: Callable[[], Any], status_code: int):
+    marca = _MarcaAlConfirmar(db_operacion, id_registro, status_code)
+    try:
+        resultado = operacion()
+    except Exception:
+        if not marca.aplicada:
+            # El movimiento no se confirmó: se libera la clave para poder reintentar
+            db.query(models.Idempotencia) \
+              .filter(models.Idempotencia.idIdempotencia == id_registro,
+                      models.Idempotencia.estado == EN_PROCESO) \
+              .delete(synchronize_session=False)
+            db.commit()
+        raise
+    finally:
+        marca.quitar()
+
+    cuerpo = jsonable_encoder(resultado)
+    db.execute(
+        update(models.Idempotencia)
+        .where(models.Idempotencia.idIdempotencia == id_registro)
+        .values(estado=COMPLETADO, codigoEstado=status_code, respuesta=json.dumps(cuerpo, ensure_ascii=False))
+    )
+    db.commit()
+    _guardar_en_cache(llave, (huella, status_code, cuerpo))
+    return resultado
+
+
+def purgar(db, horas: int = HORAS_VIGENCIA) -> int:
+    """Elimina las claves más antiguas que la vigencia; devuelve cuántas borró."""
+    borradas = (
+        db.query(models.Idempotencia)
+          .filter(models.Idempotencia.fechaCreacion < datetime.utcnow() - timedelta(hours=horas))
+          .delete(synchronize_session=False)
+    )
+    db.commit()
+    return borradas
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mantenimiento de claves de idempotencia")
+    parser.add_argument("--purgar", action="store_true", help="Elimina las claves vencidas")
+    parser.add_argument("--horas", type=int, default=HORAS_VIGENCIA, help="Vigencia de las claves en horas")
+    args = parser.parse_args()
+
+    if args.purgar:
+        sesion = SessionLocal()
+        try:
+            print(f"Claves eliminadas: {purgar(sesion, args.horas)}")
+        finally:
+            sesion.close()
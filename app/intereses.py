@@ -0,0 +1,325 @@
+# app/intereses.py
+"""
+Abono mensual de intereses a las cuentas de ahorro (idTipoCuenta = 2).
+
+El interés se calcula sobre el saldo diario del período: el saldo de apertura
+sale del último registro de `bcoma_historial` anterior al mes y cada movimiento
+del mes cambia el saldo desde su día. Una cuenta sin registros antes ni durante
+el mes abre con el saldo previo a su primer movimiento posterior, o con su
+saldo inicial si nunca tuvo movimientos (el saldo actual de un período pasado
+incluiría los movimientos de los meses siguientes).
+
+Las cuentas se procesan por bloques; por bloque se hacen unas pocas consultas
+y las escrituras (transacciones, historial, saldos) se insertan en lote con
+números de documento generados de antemano.
+
+`bcoma_interesahorro` registra el abono de cada cuenta y período, así que el
+proceso puede correr todas las noches: las cuentas ya abonadas se omiten.
+
+Si otra ejecución abona al mismo tiempo alguna cuenta de un bloque, la
+restricción única de `bcoma_interesahorro` hace fallar ese bloque: se revierte
+sólo ese bloque, se vuelve a leer una vez (omitiendo las cuentas que la otra
+ejecución ya abonó) y el proceso sigue con los demás.
+
+Uso (por defecto el mes anterior):
+    python -m app.intereses --periodo 2025-04
+"""
+import argparse
+import logging
+import os
+import time as reloj
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.catalogos import cache as catalogos
+from app.database import SessionLocal, engine
+from app.saldos_cierre import ultimos_registros
+
+logger = logging.getLogger("banco_mr.intereses")
+
+LOTE_POR_DEFECTO = 2000
+TIPO_CUENTA_AHORRO = 2
+TIPO_TRANSACCION_DEPOSITO = 1
+TASA_ANUAL = Decimal(os.getenv("TASA_INTERES_AHORRO", "2.50"))
+DIAS_ANIO = Decimal("365")
+CENTAVOS = Decimal("0.01")
+
+
+def calcular_intereses_lote(cuentas, aperturas: dict, movimientos: dict,
+                            inicio: date, fin: date, tasa_anual: Decimal) -> list:
+    """
+    Interés del período para un bloque de cuentas.
+    `aperturas` es idCuenta -> saldo al iniciar el período y `movimientos`
+    idCuenta -> [(fecha, saldo resultante)] en orden.
+    """
+    dias_periodo = (fin - inicio).days + 1
+    factor = tasa_anual / 100 / DIAS_ANIO
+    resultados = []
+    for cuenta in cuentas:
+        saldo = aperturas[cuenta.idCuenta]
+        dia, acumulado = inicio, Decimal("0")
+        for fecha, saldo_nuevo in movimientos.get(cuenta.idCuenta, ()):
+            acumulado += saldo * (fecha.date() - dia).days
+            saldo, dia = saldo_nuevo, fecha.date()
+        acumulado += saldo * ((fin - dia).days + 1)
+
+        monto = (acumulado * factor).quantize(CENTAVOS)
+        if monto > 0:
+            resultados.append({
+                "idCuenta": cuenta.idCuenta,
+                "saldoPromedio": (acumulado / dias_periodo).quantize(CENTAVOS),
+                "monto": monto,
+            })
+    return resultados
+
+
+def _movimientos(db: Session, ids_cuentas: list, desde: datetime, hasta: datetime) -> dict:
+    filas = (
+        db.query(models.Historial.idCuenta, models.Historial.fecha, models.Historial.saldo)
+          .filter(
+              models.Historial.idCuenta.in_(ids_cuentas),
+              models.Historial.fecha >= desde,
+              models.Historial.fecha < hasta,
+          )
+          .order_by(models.Historial.idCuenta, models.Historial.fecha, models.Historial.idCorrelativo)
+          .all()
+    )
+    return {
+        id_cuenta: [(fecha, saldo) for _, fecha, saldo in grupo]
+        for id_cuenta, grupo in groupby(filas, key=lambda f: f.idCuenta)
+    }
+
+
+def _saldos_previos(db: Session, ids_cuentas: list, desde: datetime) -> dict:
+    """
+    idCuenta -> saldo antes del primer movimiento del historial a partir de
+    `desde`. El historial guarda el monto sin signo: el movimiento es un crédito
+    si la cuenta es el destino de la transacción o si es un depósito.
+    """
+    if not ids_cuentas:
+        return {}
+    primeros = (
+        db.query(func.min(models.Historial.idCorrelativo))
+          .filter(models.Historial.idCuenta.in_(ids_cuentas), models.Historial.fecha >= desde)
+          .group_by(models.Historial.idCuenta)
+    )
+    filas = (
+        db.query(
+            models.Historial.idCuenta,
+            models.Historial.monto,
+            models.Historial.saldo,
+            models.Transaccion.idCuentaDestino,
+            models.Transaccion.idTipoTransaccion,
+        )
+        .join(models.Transaccion, models.Transaccion.idTransaccion == models.Historial.idTransaccion)
+        .filter(models.Historial.idCorrelativo.in_(primeros))
+        .all()
+    )
+    saldos = {}
+    for id_cuenta, monto, saldo, id_destino, tipo in filas:
+        credito = id_destino == id_cuenta or tipo == TIPO_TRANSACCION_DEPOSITO
+        saldos[id_cuenta] = saldo - monto if credito else saldo + monto
+    return saldos
+
+
+def _abonar(db: Session, cuentas: dict, resultados: list, periodo: str, tasa_anual: Decimal):
+    """Registra los abonos de un bloque en una sola transacción de base de datos."""
+    ids = [r["idCuenta"] for r in resultados]
+    saldos = dict(
+        db.query(models.Cuenta.idCuenta, models.Cuenta.saldo)
+          .filter(models.Cuenta.idCuenta.in_(ids))
+          .order_by(models.Cuenta.idCuenta)
+          .with_for_update()
+          .all()
+    )
+
+    # Documento por cuenta y período: único sin consultar el último correlativo
+    codigos_moneda = catalogos.vigente(db).codigos_moneda
+    documentos = {
+        r["idCuenta"]: f"INT{codigos_moneda.get(cuentas[r['idCuenta']].idMoneda, 'X')}"
+                       f"{periodo.replace('-', '')}{r['idCuenta']:08d}"
+        for r in resultados
+    }
+    descripcion = f"Intereses cuenta de ahorro {periodo}"
+
+    db.execute(insert(models.Transaccion), [
+        {
+            "numeroDocumento": documentos[r["idCuenta"]],
+            "idCuentaOrigen": r["idCuenta"],
+            "idCuentaDestino": None,
+            "idTipoTransaccion": TIPO_TRANSACCION_DEPOSITO,
+            "monto": r["monto"],
+            "descripcion": descripcion,
+        }
+        for r in resultados
+    ])
+    id_transacciones = dict(
+        db.query(models.Transaccion.numeroDocumento, models.Transaccion.idTransaccion)
+          .filter(models.Transaccion.numeroDocumento.in_(list(documentos.values())))
+          .all()
+    )
+
+    nuevos_saldos = {r["idCuenta"]: saldos[r["idCuenta"]] + r["monto"] for r in resultados}
+    db.execute(update(models.Cuenta), [
+        {"idCuenta": id_cuenta, "saldo": saldo} for id_cuenta, saldo in nuevos_saldos.items()
+    ])
+    db.execute(insert(models.Historial), [
+        {
+            "idCuenta": r["idCuenta"],
+            "idTransaccion": id_transacciones[documentos[r["idCuenta"]]],
+            "numeroDocumento": documentos[r["idCuenta"]],
+            "monto": r["monto"],
+            "saldo": nuevos_saldos[r["idCuenta"]],
+        }
+        for r in resultados
+    ])
+    # La restricción única (idCuenta, periodo) hace fallar el bloque si otra
+    # ejecución ya abonó alguna de estas cuentas (ver `ejecutar`)
+    db.execute(insert(models.InteresAhorro), [
+        {
+            "idCuenta": r["idCuenta"],
+            "periodo": periodo,
+            "saldoPromedio": r["saldoPromedio"],
+            "tasaAnual": tasa_anual,
+            "monto": r["monto"],
+            "idTransaccion": id_transacciones[documentos[r["idCuenta"]]],
+        }
+        for r in resultados
+    ])
+    db.commit()
+
+
+def ejecutar(db: Session, inicio_mes: date, lote: int = LOTE_POR_DEFECTO,
+             tasa_anual: Decimal = TASA_ANUAL) -> dict:
+    """
+    Calcula y abona los intereses del mes que inicia en `inicio_mes`.
+    Devuelve un resumen con las cuentas abonadas, el monto total y el rendimiento.
+    """
+    fin_mes = inicio_mes + relativedelta(months=1) - timedelta(days=1)
+    if fin_mes >= date.today():
+        raise ValueError("Solo se pueden abonar intereses de períodos cerrados")
+
+    inicio = reloj.perf_counter()
+    periodo = inicio_mes.strftime("%Y-%m")
+    desde = datetime.combine(inicio_mes, time.min)
+    hasta = datetime.combine(fin_mes + timedelta(days=1), time.min)
+
+    revisadas, abonadas, ultimo_id = 0, 0, 0
+    reintentado = None  # inicio del último bloque que se volvió a leer por un conflicto
+    total = Decimal("0.00")
+    while True:
+        inicio_bloque = ultimo_id
+        bloque = (
+            db.query(
+                models.Cuenta.idCuenta,
+                models.Cuenta.idMoneda,
+                models.Cuenta.saldoInicial,
+            )
+            .filter(
+                models.Cuenta.idTipoCuenta == TIPO_CUENTA_AHORRO,
+                models.Cuenta.idEstadoCuenta == 1,
+                models.Cuenta.idCuenta > ultimo_id,
+            )
+            .order_by(models.Cuenta.idCuenta)
+            .limit(lote)
+            .all()
+        )
+        if not bloque:
+            break
+        ultimo_id = bloque[-1].idCuenta
+        revisadas += len(bloque)
+
+        ids = [c.idCuenta for c in bloque]
+        ya_abonadas = {
+            id_cuenta for (id_cuenta,) in
+            db.query(models.InteresAhorro.idCuenta)
+              .filter(models.InteresAhorro.periodo == periodo, models.InteresAhorro.idCuenta.in_(ids))
+        }
+        cuentas = {c.idCuenta: c for c in bloque if c.idCuenta not in ya_abonadas}
+        if not cuentas:
+            continue
+
+        ids = list(cuentas)
+        anteriores = ultimos_registros(db, ids, desde)
+        movimientos = _movimientos(db, ids, desde, hasta)
+        # Sin registros antes ni durante el mes: el saldo previo al primer movimiento posterior
+        posteriores = _saldos_previos(
+            db, [i for i in ids if i not in anteriores and i not in movimientos], hasta)
+        aperturas = {}
+        for id_cuenta, cuenta in cuentas.items():
+            if id_cuenta in anteriores:
+                aperturas[id_cuenta] = anteriores[id_cuenta][1]
+            elif id_cuenta in posteriores:
+                aperturas[id_cuenta] = posteriores[id_cuenta]
+            else:
+                aperturas[id_cuenta] = cuenta.saldoInicial or Decimal("0.00")
+
+        resultados = calcular_intereses_lote(cuentas.values(), aperturas, movimientos,
+                                             inicio_mes, fin_mes, tasa_anual)
+        if resultados:
+            try:
+                _abonar(db, cuentas, resultados, periodo, tasa_anual)
+            except IntegrityError:
+                # Otra ejecución abonó alguna cuenta del bloque: se revierte sólo este
+                # bloque y se vuelve a leer una vez, ya sin las cuentas abonadas
+                db.rollback()
+                if reintentado != inicio_bloque:
+                    reintentado, ultimo_id = inicio_bloque, inicio_bloque
+                    revisadas -= len(bloque)
+                    continue
+                logger.warning(f"Intereses {periodo}: bloque hasta idCuenta {ultimo_id} "
+                               "en conflicto con otra ejecución; se omite")
+                resultados = []
+
+        abonadas += len(resultados)
+        total += sum((r["monto"] for r in resultados), Decimal("0.00"))
+        logger.info(f"Intereses {periodo}: {revisadas} cuentas revisadas, {abonadas} abonadas")
+
+    duracion = reloj.perf_counter() - inicio
+    return {
+        "periodo": periodo,
+        "cuentasRevisadas": revisadas,
+        "cuentasAbonadas": abonadas,
+        "interesTotal": float(total),
+        "segundos": round(duracion, 3),
+        "filasPorSegundo": round(revisadas / duracion, 1) if duracion > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Abono de intereses a cuentas de ahorro")
+    parser.add_argument("--periodo", help="Mes a abonar (YYYY-MM); por defecto el mes anterior")
+    parser.add_argument("--lote", type=int, default=LOTE_POR_DEFECTO, help="Cuentas por bloque")
+    parser.add_argument("--tasa", type=Decimal, default=TASA_ANUAL, help="Tasa anual en porcentaje")
+    args = parser.parse_args()
+
+    if args.periodo:
+        inicio_mes = date.fromisoformat(f"{args.periodo}-01")
+    else:
+        inicio_mes = date.today().replace(day=1) - relativedelta(months=1)
+
+    logging.basicConfig(level=logging.INFO)
+    engine.echo = False
+
+    db = SessionLocal()
+    try:
+        resumen = ejecutar(db, inicio_mes, args.lote, args.tasa)
+    finally:
+        db.close()
+
+    print(
+        f"Intereses {resumen['periodo']}: {resumen['cuentasAbonadas']} de {resumen['cuentasRevisadas']} "
+        f"cuentas, Q{resumen['interesTotal']:,.2f} en {resumen['segundos']}s "
+        f"({resumen['filasPorSegundo']} filas/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
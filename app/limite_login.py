@@ -0,0 +1,204 @@
+# app/limite_login.py
+"""
+Límite de intentos de `POST /login` por IP y por username (token bucket).
+
+Cada intento toma una ficha de la cubeta de su IP y otra de la de su
+username; las cubetas se recargan a un ritmo fijo hasta su capacidad. Sin
+fichas la solicitud se rechaza con 429 y `Retry-After` antes de consultar
+`bcoma_usuario`, así que un ataque de fuerza bruta o de credential stuffing no
+llega a la base de datos.
+
+Las cubetas viven en un dict en memoria dividido en fragmentos (cada uno con
+su lock, para no serializar a todos los hilos) y se descartan tras
+LOGIN_TTL_SEGUNDOS sin uso.
+
+Con varios trabajadores cada proceso tiene sus propias cubetas. Con
+LOGIN_LIMITE_COMPARTIDO=bd los intentos que pasan el límite local se cuentan
+además en `bcoma_limitelogin`, en ventanas fijas con la misma capacidad, y el
+límite se aplica al total de los trabajadores. El límite local se revisa
+primero: el tráfico abusivo se sigue rechazando sin ir a la base.
+
+La IP es la del socket (uvicorn ya la reemplaza por la del cliente cuando la
+conexión viene de FORWARDED_ALLOW_IPS). Si el proxy no tiene una dirección
+fija, como el balanceador de Render, PROXIES_CONFIABLES=n toma la dirección que
+agregó a X-Forwarded-For el n-ésimo proxy contando desde la derecha: lo que el
+cliente haya escrito a la izquierda en ese encabezado se ignora.
+
+Depurar ventanas vencidas de la tabla compartida:
+    python -m app.limite_login --purgar
+"""
+import math
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+from sqlalchemy.exc import IntegrityError
+
+from app import models
+from app.database import SessionLocal
+from app.metricas import Contador, registro
+
+CAPACIDAD_IP = int(os.getenv("LOGIN_IP_CAPACIDAD", "20"))
+POR_MINUTO_IP = float(os.getenv("LOGIN_IP_POR_MINUTO", "10"))
+CAPACIDAD_USUARIO = int(os.getenv("LOGIN_USUARIO_CAPACIDAD", "5"))
+POR_MINUTO_USUARIO = float(os.getenv("LOGIN_USUARIO_POR_MINUTO", "2"))
+TTL_SEGUNDOS = int(os.getenv("LOGIN_TTL_SEGUNDOS", "900"))
+COMPARTIDO = os.getenv("LOGIN_LIMITE_COMPARTIDO", "").lower()  # "" (sólo local) | "bd"
+PROXIES_CONFIABLES = int(os.getenv("PROXIES_CONFIABLES", "0"))
+
+FRAGMENTOS = 16
+# Cada cuántas operaciones de un fragmento se buscan cubetas vencidas
+PURGA_CADA = 256
+
+rechazos = registro.agregar(Contador(
+    "login_rate_limited_total", "Intentos de login rechazados por límite", ("scope", "backend")))
+
+
+class Cubetas:
+    """Token buckets por clave en un dict fragmentado, con expiración por inactividad."""
+
+    def __init__(self, capacidad: int, por_minuto: float, ttl: int = TTL_SEGUNDOS, fragmentos: int = FRAGMENTOS):
+        self.capacidad = capacidad
+        self.recarga = por_minuto / 60  # fichas por segundo
+        self.ttl = ttl
+        # Cada fragmento: [lock, clave -> (fichas, último uso) en orden de uso, operaciones]
+        self._fragmentos = [[threading.Lock(), OrderedDict(), 0] for _ in range(fragmentos)]
+
+    def _fragmento(self, clave: str) -> list:
+        return self._fragmentos[zlib.crc32(clave.encode("utf-8")) % len(self._fragmentos)]
+
+    def tomar(self, clave: str, ahora: float = None) -> float:
+        """Toma una ficha; devuelve 0 si había, o los segundos que faltan para la siguiente."""
+        ahora = time.monotonic() if ahora is None else ahora
+        fragmento = self._fragmento(clave)
+        with fragmento[0]:
+            cubetas = fragmento[1]
+            fichas, ultimo = cubetas.pop(clave, (self.capacidad, ahora))
+            fichas = min(self.capacidad, fichas + (ahora - ultimo) * self.recarga)
+            espera = 0.0
+            if fichas >= 1:
+                fichas -= 1
+            else:
+                espera = (1 - fichas) / self.recarga
+            cubetas[clave] = (fichas, ahora)
+
+            fragmento[2] += 1
+            if fragmento[2] >= PURGA_CADA:
+                fragmento[2] = 0
+                self._purgar(cubetas, ahora)
+        return espera
+
+    def _purgar(self, cubetas: OrderedDict, ahora: float):
+        # El dict está ordenado por último uso: las vencidas están al principio
+        while cubetas:
+            clave, (_, ultimo) = next(iter(cubetas.items()))
+            if ahora - ultimo < self.ttl:
+                break
+            del cubetas[clave]
+
+    def __len__(self):
+        return sum(len(f[1]) for f in self._fragmentos)
+
+
+class ContadorBaseDatos:
+    """Intentos por ventana fija en `bcoma_limitelogin`, compartidos entre trabajadores."""
+
+    def tomar(self, clave: str, capacidad: int, por_minuto: float) -> float:
+        segundos = capacidad / (por_minuto / 60)
+        ahora = time.time()
+        ventana = int(ahora // segundos)
+        vence = int((ventana + 1) * segundos)
+        filtro = (models.LimiteLogin.clave == clave, models.LimiteLogin.ventana == ventana)
+
+        db = SessionLocal()
+        try:
+            incremento = {models.LimiteLogin.intentos: models.LimiteLogin.intentos + 1}
+            if not db.query(models.LimiteLogin).filter(*filtro).update(incremento, synchronize_session=False):
+                db.add(models.LimiteLogin(clave=clave, ventana=ventana, intentos=1, vence=vence))
+                try:
+                    db.flush()
+                except IntegrityError:
+                    # Otro trabajador abrió la ventana primero
+                    db.rollback()
+                    db.query(models.LimiteLogin).filter(*filtro).update(incremento, synchronize_session=False)
+            intentos = db.query(models.LimiteLogin.intentos).filter(*filtro).scalar()
+            db.commit()
+        finally:
+            db.close()
+        return max(0.0, vence - ahora) if intentos > capacidad else 0.0
+
+
+por_ip = Cubetas(CAPACIDAD_IP, POR_MINUTO_IP)
+por_usuario = Cubetas(CAPACIDAD_USUARIO, POR_MINUTO_USUARIO)
+compartido = ContadorBaseDatos() if COMPARTIDO == "bd" else None
+
+
+def _rechazar(alcance: str, backend: str, espera: float):
+    rechazos.incrementar(alcance, backend)
+    raise HTTPException(
+        status_code=429,
+        detail="Demasiados intentos de inicio de sesión; intente más tarde",
+        headers={"Retry-After": str(max(1, math.ceil(espera)))},
+    )
+
+
+def ip_cliente(scope, proxies: int = PROXIES_CONFIABLES) -> str:
+    """IP del cliente de un scope ASGI, sin confiar en lo que agregue el propio cliente."""
+    if proxies:
+        reenviadas = [
+            ip.strip()
+            for nombre, valor in scope["headers"] if nombre == b"x-forwarded-for"
+            for ip in valor.decode("latin-1").split(",")
+        ]
+        if len(reenviadas) >= proxies and reenviadas[-proxies]:
+            return reenviadas[-proxies]
+    cliente = scope.get("client")
+    return cliente[0] if cliente else "desconocida"
+
+
+def verificar(request: Request, username: str):
+    """Consume un intento de la IP y del username; 429 si alguno agotó su límite."""
+    ip = ip_cliente(request.scope)
+    usuario = username.strip().lower()[:100]
+    limites = (
+        ("ip", por_ip, f"ip:{ip}", CAPACIDAD_IP, POR_MINUTO_IP),
+        ("usuario", por_usuario, f"usuario:{usuario}", CAPACIDAD_USUARIO, POR_MINUTO_USUARIO),
+    )
+    for alcance, cubetas, clave, _, _ in limites:
+        espera = cubetas.tomar(clave)
+        if espera:
+            _rechazar(alcance, "local", espera)
+    if compartido is not None:
+        for alcance, _, clave, capacidad, por_minuto in limites:
+            espera = compartido.tomar(clave, capacidad, por_minuto)
+            if espera:
+                _rechazar(alcance, "bd", espera)
+
+
+def purgar(db) -> int:
+    """Elimina las ventanas vencidas de la tabla compartida; devuelve cuántas borró."""
+    borradas = (
+        db.query(models.LimiteLogin)
+          .filter(models.LimiteLogin.vence < int(time.time()))
+          .delete(synchronize_session=False)
+    )
+    db.commit()
+    return borradas
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mantenimiento del límite de intentos de login")
+    parser.add_argument("--purgar", action="store_true", help="Elimina las ventanas vencidas")
+    args = parser.parse_args()
+
+    if args.purgar:
+        sesion = SessionLocal()
+        try:
+            print(f"Ventanas eliminadas: {purgar(sesion)}")
+        finally:
+            sesion.close()
@@ -0,0 +1,192 @@
+# app/lotes.py
+"""
+Transferencias por lote (planillas y pagos masivos) desde una sola cuenta.
+
+Las cuentas destino se validan con consultas IN (una por cada mil) y las cuentas
+involucradas se bloquean una sola vez, en orden de idCuenta para evitar
+interbloqueos con otras operaciones. Cada línea se aplica o se rechaza por
+separado (saldo insuficiente, cuenta inexistente o inactiva) y las
+transacciones, el historial y los detalles del lote se insertan en bloques.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session, lazyload
+
+from app import models, schemas
+from app.catalogos import cache as catalogos
+
+TIPO_TRANSACCION_TRANSFERENCIA = 3
+FILAS_POR_BLOQUE = 1000
+CENTAVOS = Decimal("0.01")
+
+
+@dataclass
+class ResultadoLote:
+    lote: models.LoteTransferencia
+    cuenta_origen: models.Cuenta
+    saldo_origen: Decimal
+    lineas: list
+    # idCliente de las cuentas destino con al menos una línea aplicada
+    clientes_destino: set
+
+    @property
+    def rechazadas(self) -> list:
+        return [l for l in self.lineas if l["estado"] == "RECHAZADA"]
+
+
+def _en_bloques(filas: list):
+    for i in range(0, len(filas), FILAS_POR_BLOQUE):
+        yield filas[i:i + FILAS_POR_BLOQUE]
+
+
+def procesar_lote(db: Session, datos: schemas.LoteTransferenciaCreate, usuario: models.Usuario) -> ResultadoLote:
+    """Aplica el lote sin hacer commit; el llamador confirma la transacción."""
+    origen = (
+        db.query(models.Cuenta)
+          .options(lazyload("*"))
+          .filter_by(numeroCuenta=datos.idCuentaOrigen)
+          .first()
+    )
+    if not origen:
+        raise HTTPException(status_code=404, detail="Cuenta origen no encontrada")
+    if origen.idCliente != usuario.idCliente and usuario.rol != "admin":
+        raise HTTPException(status_code=403, detail="No tiene permiso para usar esta cuenta")
+    if origen.idEstadoCuenta != 1:
+        raise HTTPException(status_code=400, detail="La cuenta origen no está activa")
+
+    # 1) Validación de todas las cuentas destino con consultas IN
+    numeros = {l.idCuentaDestino for l in datos.lineas}
+    destinos = {}
+    for bloque in _en_bloques(sorted(numeros)):
+        destinos.update({
+            c.numeroCuenta: c
+            for c in db.query(
+                models.Cuenta.idCuenta,
+                models.Cuenta.numeroCuenta,
+                models.Cuenta.idCliente,
+                models.Cuenta.idMoneda,
+                models.Cuenta.idEstadoCuenta,
+            ).filter(models.Cuenta.numeroCuenta.in_(bloque))
+        })
+
+    # 2) Bloqueo único de todas las cuentas involucradas, en orden de id
+    ids = sorted({origen.idCuenta} | {c.idCuenta for c in destinos.values() if c.idEstadoCuenta == 1})
+    saldos = {}
+    for bloque in _en_bloques(ids):
+        saldos.update(
+            db.query(models.Cuenta.idCuenta, models.Cuenta.saldo)
+              .filter(models.Cuenta.idCuenta.in_(bloque))
+              .order_by(models.Cuenta.idCuenta)
+              .with_for_update()
+              .all()
+        )
+
+    lote = models.LoteTransferencia(
+        idCuentaOrigen=origen.idCuenta,
+        username=usuario.username,
+        descripcion=datos.descripcion,
+        totalLineas=len(datos.lineas),
+    )
+    db.add(lote)
+    db.flush()
+
+    vigente = catalogos.vigente(db)
+    prefijo = (
+        f"{vigente.codigos_tipo_transaccion.get(TIPO_TRANSACCION_TRANSFERENCIA, 'OTR')}"
+        f"{vigente.codigos_moneda.get(origen.idMoneda, 'X')}L{lote.idLote:06d}"
+    )
+
+    # 3) Aplicación de cada línea en memoria
+    lineas, transacciones, historial = [], [], []
+    clientes_destino = set()
+    monto_aplicado = Decimal("0.00")
+    for numero_linea, linea in enumerate(datos.lineas, 1):
+        monto = linea.monto.quantize(CENTAVOS)
+        destino = destinos.get(linea.idCuentaDestino)
+        motivo = None
+        if not destino:
+            motivo = "Cuenta destino no encontrada"
+        elif destino.idEstadoCuenta != 1:
+            motivo = "La cuenta destino no está activa"
+        elif destino.idCuenta == origen.idCuenta:
+            motivo = "La cuenta destino es la misma cuenta origen"
+        elif saldos[origen.idCuenta] < monto:
+            motivo = "Saldo insuficiente"
+
+        resultado = {
+            "linea": numero_linea,
+            "idCuentaDestino": linea.idCuentaDestino,
+            "monto": monto,
+            "estado": "RECHAZADA" if motivo else "APLICADA",
+            "motivo": motivo,
+            "numeroDocumento": None,
+        }
+        lineas.append(resultado)
+        if motivo:
+            continue
+
+        convertido = vigente.tipos_cambio.convertir(monto, origen.idMoneda, destino.idMoneda).quantize(CENTAVOS)
+        saldos[origen.idCuenta] -= monto
+        saldos[destino.idCuenta] += convertido
+        monto_aplicado += monto
+        clientes_destino.add(destino.idCliente)
+
+        documento = f"{prefijo}{numero_linea:05d}"
+        resultado["numeroDocumento"] = documento
+        transacciones.append({
+            "numeroDocumento": documento,
+            "idCuentaOrigen": origen.idCuenta,
+            "idCuentaDestino": destino.idCuenta,
+            "idTipoTransaccion": TIPO_TRANSACCION_TRANSFERENCIA,
+            "monto": monto,
+            "descripcion": linea.descripcion or datos.descripcion,
+        })
+        historial.append({
+            "idCuenta": origen.idCuenta, "numeroDocumento": documento,
+            "monto": monto, "saldo": saldos[origen.idCuenta],
+        })
+        historial.append({
+            "idCuenta": destino.idCuenta, "numeroDocumento": documento,
+            "monto": convertido, "saldo": saldos[destino.idCuenta],
+        })
+
+    # 4) Escrituras en bloque
+    id_transacciones = {}
+    for bloque in _en_bloques(transacciones):
+        db.execute(insert(models.Transaccion), bloque)
+        id_transacciones.update(
+            db.query(models.Transaccion.numeroDocumento, models.Transaccion.idTransaccion)
+              .filter(models.Transaccion.numeroDocumento.in_([t["numeroDocumento"] for t in bloque]))
+              .all()
+        )
+    for fila in historial:
+        fila["idTransaccion"] = id_transacciones[fila["numeroDocumento"]]
+    for bloque in _en_bloques(historial):
+        db.execute(insert(models.Historial), bloque)
+
+    movidas = {f["idCuenta"] for f in historial}
+    if movidas:
+        db.execute(update(models.Cuenta), [{"idCuenta": i, "saldo": saldos[i]} for i in movidas])
+
+    for bloque in _en_bloques(lineas):
+        db.execute(insert(models.LoteTransferenciaDetalle), [
+            {
+                "idLote": lote.idLote,
+                "linea": l["linea"],
+                "numeroCuentaDestino": l["idCuentaDestino"],
+                "monto": l["monto"],
+                "estado": l["estado"],
+                "motivo": l["motivo"],
+                "numeroDocumento": l["numeroDocumento"],
+                "idTransaccion": id_transacciones.get(l["numeroDocumento"]),
+            }
+            for l in bloque
+        ])
+
+    lote.lineasAplicadas = len(transacciones)
+    lote.montoAplicado = monto_aplicado
+    return ResultadoLote(lote=lote, cuenta_origen=origen, saldo_origen=saldos[origen.idCuenta], lineas=lineas,
+                        clientes_destino=clientes_destino)
@@ -1,16 +1,37 @@
 # app/main.py
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+
+from app import admision, catalogos, compresion, hilos, metricas, perfilador, servidor
+from app.database import engine
+from app.routers import auth, cuentas, transacciones, prestamo, soporte, tarjetas, trabajos
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Threadpool de los endpoints síncronos, por trabajador
+    servidor.configurar_trabajador()
+    # Los catálogos se sirven desde memoria; se cargan una vez al iniciar
+    catalogos.cargar_al_iniciar()
+    yield
 
-from app.routers import auth, cuentas, transacciones, prestamo, soporte, tarjetas
 
 app = FastAPI(
     title="API Banco - Seguridad y Gestión de Contraseñas",
     description="Registro, cambio y recuperación de contraseña utilizando correo electrónico.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Cupo del threadpool según la clase de la ruta (dinero, reportes, general)
+    dependencies=[Depends(hilos.reservar_hilo)],
 )
 
+# Límites de concurrencia y descarte de carga (dentro de CORS: los rechazos llevan sus encabezados)
+app.add_middleware(admision.AdmisionMiddleware)
+
 # CORS (ajusta allow_origins a tu front en producción)
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +41,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Perfilado por muestreo (bajo demanda para administradores o global a baja tasa)
+app.add_middleware(perfilador.PerfiladorMiddleware)
+
+# Compresión gzip/brotli por tipo de contenido (dentro de métricas: se miden los bytes enviados)
+app.add_middleware(compresion.CompresionMiddleware)
+
+# Métricas de Prometheus (middleware más externo para medir la solicitud completa)
+metricas.instrumentar_engine(engine)
+app.add_middleware(metricas.MetricasMiddleware)
+
 # Routers
 app.include_router(auth.router)
 app.include_router(cuentas.router)
@@ -27,7 +58,14 @@ app.include_router(transacciones.router)
 app.include_router(prestamo.router)
 app.include_router(soporte.router)
 app.include_router(tarjetas.router)
+app.include_router(trabajos.router)
 
 @app.get("/")
-def read_root():
+async def read_root():
+    # Asíncrono: el chequeo de salud no pasa por el threadpool
     return {"mensaje": "Bienvenido a la API del Banco"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def exponer_metricas():
+    return PlainTextResponse(metricas.registro.exponer(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,208 @@
+# app/metricas.py
+"""
+Métricas de la API en formato de texto de Prometheus, expuestas en /metrics.
+
+No depende de `prometheus_client`: el registro es un conjunto pequeño de
+contadores e histogramas en memoria por proceso. El middleware es ASGI puro
+(sin BaseHTTPMiddleware) y sólo mide tiempos y cuenta bytes, para que el costo
+por solicitud se mantenga en unos pocos microsegundos; el benchmark
+`python -m benchmarks.metricas_overhead` lo verifica.
+
+Se registra por ruta (la plantilla, p. ej. /cuentas/{numero}/saldo):
+  - latencia, tamaño de solicitud y de respuesta (histogramas)
+  - cantidad de sentencias SQL ejecutadas por solicitud (eventos de SQLAlchemy)
+y, al consultar /metrics, el estado del pool de conexiones.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from sqlalchemy import event
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_BYTES = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BUCKETS_SENTENCIAS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+RUTA_DESCONOCIDA = "sin_ruta"
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(nombres: tuple, valores: tuple) -> str:
+    if not nombres:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)) + "}"
+
+
+class Contador:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores, cantidad: float = 1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            valores = list(self._valores.items())
+        lineas += [f"{self.nombre}{_etiquetas(self.etiquetas, v)} {n}" for v, n in valores]
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, buckets: tuple, etiquetas: tuple = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self.buckets = tuple(buckets)
+        # valores de etiquetas -> [conteo por bucket..., +Inf, suma]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *valores):
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [0] * (len(self.buckets) + 2)
+            serie[indice] += 1
+            serie[-1] += valor
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = [(v, list(s)) for v, s in self._series.items()]
+        for valores, serie in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, serie):
+                acumulado += conteo
+                etiquetas = _etiquetas(self.etiquetas + ("le",), valores + (limite,))
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            acumulado += serie[-2]
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas + ('le',), valores + ('+Inf',))} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {serie[-1]}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+class Medidor:
+    """Valor calculado al momento de exponer las métricas."""
+
+    def __init__(self, nombre: str, ayuda: str, obtener: Callable[[], dict], etiquetas: tuple = ()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self.obtener = obtener
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge"]
+        lineas += [f"{self.nombre}{_etiquetas(self.etiquetas, v)} {n}" for v, n in self.obtener().items()]
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self.metricas = []
+
+    def agregar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self.metricas:
+            lineas += metrica.exponer()
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+solicitudes = registro.agregar(Contador(
+    "http_requests_total", "Solicitudes HTTP atendidas", ("method", "route", "status")))
+latencia = registro.agregar(Histograma(
+    "http_request_duration_seconds", "Latencia de las solicitudes HTTP", BUCKETS_LATENCIA, ("method", "route")))
+bytes_solicitud = registro.agregar(Histograma(
+    "http_request_size_bytes", "Tamaño del cuerpo de la solicitud", BUCKETS_BYTES, ("method", "route")))
+bytes_respuesta = registro.agregar(Histograma(
+    "http_response_size_bytes", "Tamaño del cuerpo de la respuesta", BUCKETS_BYTES, ("method", "route")))
+sentencias = registro.agregar(Histograma(
+    "http_request_db_statements", "Sentencias SQL ejecutadas por solicitud", BUCKETS_SENTENCIAS, ("method", "route")))
+sentencias_total = registro.agregar(Contador(
+    "db_statements_total", "Sentencias SQL ejecutadas"))
+
+
+# Contador de sentencias de la solicitud en curso. Se guarda una lista mutable
+# para que los hilos del threadpool (que reciben una copia del contexto)
+# incrementen el mismo objeto que lee el middleware.
+_sentencias_solicitud: ContextVar[Optional[list]] = ContextVar("sentencias_solicitud", default=None)
+
+
+def _contar_sentencia(conn, cursor, statement, parameters, context, executemany):
+    contador = _sentencias_solicitud.get()
+    if contador is not None:
+        contador[0] += 1
+    sentencias_total.incrementar()
+
+
+def instrumentar_engine(engine):
+    """Cuenta las sentencias SQL y expone el estado del pool del engine."""
+    event.listen(engine, "before_cursor_execute", _contar_sentencia)
+
+    def estado_pool() -> dict:
+        pool = engine.pool
+        valores = {}
+        for nombre in ("size", "checkedin", "checkedout", "overflow"):
+            metodo = getattr(pool, nombre, None)
+            if metodo is not None:
+                valores[(nombre,)] = metodo()
+        return valores
+
+    registro.agregar(Medidor("db_pool_connections", "Estado del pool de conexiones", estado_pool, ("state",)))
+
+
+class MetricasMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        recibidos = 0
+        enviados = 0
+        estado = 500
+        contador = [0]
+        token = _sentencias_solicitud.set(contador)
+
+        async def receive_medido():
+            nonlocal recibidos
+            mensaje = await receive()
+            if mensaje["type"] == "http.request":
+                recibidos += len(mensaje.get("body", b""))
+            return mensaje
+
+        async def send_medido(mensaje):
+            nonlocal enviados, estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            elif mensaje["type"] == "http.response.body":
+                enviados += len(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive_medido, send_medido)
+        finally:
+            _sentencias_solicitud.reset(token)
+            ruta = scope.get("route")
+            ruta = getattr(ruta, "path", RUTA_DESCONOCIDA)
+            metodo = scope["method"]
+            solicitudes.incrementar(metodo, ruta, estado)
+            latencia.observar(time.perf_counter() - inicio, metodo, ruta)
+            bytes_solicitud.observar(recibidos, metodo, ruta)
+            bytes_respuesta.observar(enviados, metodo, ruta)
+            sentencias.observar(contador[0], metodo, ruta)
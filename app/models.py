@@ -1,6 +1,6 @@
 # app/models.py
-from sqlalchemy import Column, Date, Numeric, Integer, String, Text, DateTime, ForeignKey, DECIMAL, TIMESTAMP, CheckConstraint
-from sqlalchemy.sql import func
+from sqlalchemy import Boolean, Column, Date, Numeric, Integer, String, Text, DateTime, ForeignKey, DECIMAL, TIMESTAMP, CheckConstraint, Index, UniqueConstraint
+from sqlalchemy.sql import func, text
 from app.database import Base
 from sqlalchemy.orm import relationship
 from sqlalchemy import Enum
@@ -26,6 +26,11 @@ class Cliente(Base):
 
 class Usuario(Base):
     __tablename__ = "bcoma_usuario"
+    __table_args__ = (
+        # Filtros del listado paginado de soporte
+        Index("ix_usuario_estado", "estado"),
+        Index("ix_usuario_rol", "rol"),
+    )
 
     idUsuario   = Column(Integer, primary_key=True, index=True)
     username    = Column(String(50), unique=True, nullable=False)
@@ -36,6 +41,8 @@ class Usuario(Base):
 
     # Nuevo campo de soft-delete
     estado      = Column(Integer, default=1, nullable=False)  # 1=activo, 2=inactivo
+    # Usado por las exportaciones incrementales (updated_since)
+    fechaActualizacion = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), index=True)
 
 
 class PasswordResetToken(Base):
@@ -49,6 +56,12 @@ class PasswordResetToken(Base):
 
 class Cuenta(Base):
     __tablename__ = "bcoma_cuenta"
+    __table_args__ = (
+        # Filtros del listado paginado de soporte
+        Index("ix_cuenta_estado", "idEstadoCuenta"),
+        Index("ix_cuenta_moneda", "idMoneda"),
+        Index("ix_cuenta_tipo", "idTipoCuenta"),
+    )
 
     idCuenta = Column(Integer, primary_key=True, index=True)
     idCliente = Column(Integer, ForeignKey("bcoma_cliente.idCliente"), nullable=False)
@@ -59,6 +72,10 @@ class Cuenta(Base):
     idMoneda = Column(Integer, nullable=False)
     idEstadoCuenta = Column(Integer, nullable=False)
     fechaCreacion = Column(TIMESTAMP, server_default=func.now())
+    # Usado por las exportaciones incrementales (updated_since)
+    fechaActualizacion = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), index=True)
+    # Sello de versión: aumenta en cada UPDATE de la fila, también en los masivos (ver app.cache_cuentas)
+    version = Column(Integer, nullable=False, default=0, server_default=text("0"), onupdate=text("version + 1"))
 
     # Relación 1 cuenta → N tarjetas
     tarjetas = relationship(
@@ -69,6 +86,10 @@ class Cuenta(Base):
 
 class Historial(Base):
     __tablename__ = "bcoma_historial"
+    __table_args__ = (
+        # Estados de cuenta y saldos a una fecha: recorrido por rango dentro de la cuenta
+        Index("ix_historial_cuenta_fecha", "idCuenta", "fecha"),
+    )
 
     idCorrelativo = Column(Integer, primary_key=True, autoincrement=True)
     idCuenta = Column(Integer, ForeignKey("bcoma_cuenta.idCuenta", ondelete="CASCADE"), nullable=False)
@@ -81,6 +102,118 @@ class Historial(Base):
     def __repr__(self):
         return f"<Historial(idCorrelativo={self.idCorrelativo}, idCuenta={self.idCuenta}, monto={self.monto}, saldo={self.saldo})>"
 
+class SaldoCierre(Base):
+    __tablename__ = "bcoma_saldocierre"
+    __table_args__ = (
+        UniqueConstraint("idCuenta", "fechaCorte", name="uq_saldocierre_cuenta_fecha"),
+    )
+
+    idSaldoCierre = Column(Integer, primary_key=True, autoincrement=True)
+    idCuenta      = Column(Integer, ForeignKey("bcoma_cuenta.idCuenta", ondelete="CASCADE"), nullable=False)
+    fechaCorte    = Column(Date, nullable=False)
+    saldo         = Column(DECIMAL(12, 2), nullable=False)
+    # Último registro de bcoma_historial incluido en el saldo (NULL si no había movimientos)
+    idCorrelativo = Column(Integer, nullable=True)
+
+class InteresAhorro(Base):
+    __tablename__ = "bcoma_interesahorro"
+    __table_args__ = (
+        # Un solo abono de intereses por cuenta y período
+        UniqueConstraint("idCuenta", "periodo", name="uq_interesahorro_cuenta_periodo"),
+    )
+
+    idInteresAhorro = Column(Integer, primary_key=True, autoincrement=True)
+    idCuenta        = Column(Integer, ForeignKey("bcoma_cuenta.idCuenta", ondelete="CASCADE"), nullable=False)
+    periodo         = Column(String(7), nullable=False)  # YYYY-MM
+    saldoPromedio   = Column(DECIMAL(12, 2), nullable=False)
+    tasaAnual       = Column(DECIMAL(5, 2), nullable=False)
+    monto           = Column(DECIMAL(12, 2), nullable=False)
+    idTransaccion   = Column(Integer, ForeignKey("bcoma_transaccion.idTransaccion"), nullable=True)
+    fechaRegistro   = Column(TIMESTAMP, server_default=func.now())
+
+class Idempotencia(Base):
+    __tablename__ = "bcoma_idempotencia"
+    __table_args__ = (
+        UniqueConstraint("username", "clave", name="uq_idempotencia_usuario_clave"),
+    )
+
+    idIdempotencia = Column(Integer, primary_key=True, autoincrement=True)
+    username       = Column(String(50), nullable=False)
+    clave          = Column(String(100), nullable=False)
+    ruta           = Column(String(100), nullable=False)
+    huella         = Column(String(64), nullable=False)  # sha256 de la ruta y el cuerpo
+    estado         = Column(String(20), nullable=False)  # EN_PROCESO | COMPLETADO
+    codigoEstado   = Column(Integer, nullable=True)
+    respuesta      = Column(Text, nullable=True)
+    fechaCreacion  = Column(TIMESTAMP, server_default=func.now(), index=True)
+
+class LimiteLogin(Base):
+    # Intentos de login por ventana, compartidos entre trabajadores (ver app.limite_login)
+    __tablename__ = "bcoma_limitelogin"
+    __table_args__ = (
+        UniqueConstraint("clave", "ventana", name="uq_limitelogin_clave_ventana"),
+    )
+
+    idLimiteLogin = Column(Integer, primary_key=True, autoincrement=True)
+    clave         = Column(String(150), nullable=False)  # "ip:<dirección>" o "usuario:<username>"
+    ventana       = Column(Integer, nullable=False)
+    intentos      = Column(Integer, nullable=False, default=0)
+    vence         = Column(Integer, nullable=False, index=True)  # epoch en segundos
+
+class LoteTransferencia(Base):
+    __tablename__ = "bcoma_lotetransferencia"
+
+    idLote          = Column(Integer, primary_key=True, autoincrement=True)
+    idCuentaOrigen  = Column(Integer, ForeignKey("bcoma_cuenta.idCuenta", ondelete="CASCADE"), nullable=False)
+    username        = Column(String(50), nullable=False)
+    descripcion     = Column(Text, nullable=True)
+    totalLineas     = Column(Integer, nullable=False)
+    lineasAplicadas = Column(Integer, nullable=False, default=0)
+    montoAplicado   = Column(DECIMAL(14, 2), nullable=False, default=0)
+    fecha           = Column(TIMESTAMP, server_default=func.now())
+
+    detalles = relationship("LoteTransferenciaDetalle", back_populates="lote", order_by="LoteTransferenciaDetalle.linea")
+
+class LoteTransferenciaDetalle(Base):
+    __tablename__ = "bcoma_lotetransferenciadetalle"
+    __table_args__ = (
+        UniqueConstraint("idLote", "linea", name="uq_lotedetalle_lote_linea"),
+    )
+
+    idLoteDetalle   = Column(Integer, primary_key=True, autoincrement=True)
+    idLote          = Column(Integer, ForeignKey("bcoma_lotetransferencia.idLote", ondelete="CASCADE"), nullable=False)
+    linea           = Column(Integer, nullable=False)
+    numeroCuentaDestino = Column(String(20), nullable=False)
+    monto           = Column(DECIMAL(12, 2), nullable=False)
+    estado          = Column(String(20), nullable=False)  # APLICADA | RECHAZADA
+    motivo          = Column(String(255), nullable=True)
+    numeroDocumento = Column(String(50), nullable=True)
+    idTransaccion   = Column(Integer, ForeignKey("bcoma_transaccion.idTransaccion"), nullable=True)
+
+    lote = relationship("LoteTransferencia", back_populates="detalles")
+
+class Trabajo(Base):
+    __tablename__ = "bcoma_trabajo"
+    __table_args__ = (
+        # Los trabajadores toman el pendiente más antiguo
+        Index("ix_trabajo_estado", "estado", "idTrabajo"),
+    )
+
+    idTrabajo     = Column(Integer, primary_key=True, autoincrement=True)
+    tipo          = Column(String(50), nullable=False)
+    parametros    = Column(Text, nullable=True)   # JSON
+    estado        = Column(String(20), nullable=False, default="PENDIENTE")  # PENDIENTE | EN_PROCESO | COMPLETADO | FALLIDO
+    username      = Column(String(50), nullable=False)
+    trabajador    = Column(String(100), nullable=True)
+    resultado     = Column(Text, nullable=True)   # JSON
+    error         = Column(Text, nullable=True)
+    # Avance mientras corre (ver app.trabajos.avance); total NULL si no se conoce
+    procesados    = Column(Integer, nullable=False, default=0, server_default="0")
+    total         = Column(Integer, nullable=True)
+    fechaCreacion = Column(TIMESTAMP, server_default=func.now())
+    fechaInicio   = Column(TIMESTAMP, nullable=True)
+    fechaFin      = Column(TIMESTAMP, nullable=True)
+
 class Institucion(Base):
     __tablename__ = "pre_institucion"
     idInstitucion = Column(Integer, primary_key=True, autoincrement=True)
@@ -105,6 +238,23 @@ class Moneda(Base):
     codigo = Column(String(5), unique=True, nullable=False)
     nombre = Column(String(50), nullable=False)
 
+class TipoCambio(Base):
+    __tablename__ = "bcoma_tipocambio"
+    __table_args__ = (
+        UniqueConstraint("idMoneda", "fechaVigencia", name="uq_tipocambio_moneda_fecha"),
+    )
+
+    idTipoCambio  = Column(Integer, primary_key=True, autoincrement=True)
+    idMoneda      = Column(Integer, ForeignKey("bcoma_moneda.idMoneda"), nullable=False)
+    fechaVigencia = Column(Date, nullable=False)
+    tasa          = Column(DECIMAL(12, 6), nullable=False)  # quetzales por unidad de la moneda
+
+class CatalogoVersion(Base):
+    __tablename__ = "bcoma_catalogoversion"
+    idCatalogoVersion  = Column(Integer, primary_key=True, autoincrement=True)
+    version            = Column(Integer, nullable=False, default=0)
+    fechaActualizacion = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
 class PrestamoEncabezado(Base):
     __tablename__ = "pre_prestamoencabezado"
     __table_args__  = {'extend_existing': True}
@@ -120,6 +270,8 @@ class PrestamoEncabezado(Base):
     montoPrestamo     = Column(Numeric(12,2), nullable=False)
     saldoPrestamo     = Column(Numeric(12,2), nullable=False)
     fechaAutorizacion = Column(Date, nullable=True)
+    # NULL mientras está pendiente; fechaAutorizacion se llena también al rechazar
+    aprobado          = Column(Boolean, nullable=True)
     fechaVencimiento  = Column(Date, nullable=False)
     observacion       = Column(Text)
     idCuentaDestino   = Column(Integer, ForeignKey("bcoma_cuenta.idCuenta"), nullable=False)
@@ -145,6 +297,10 @@ class TipoTransaccion(Base):
 
 class PrestamoDetalle(Base):
     __tablename__ = "pre_prestamodetalle"
+    __table_args__ = (
+        # Usado por el cálculo de mora: cuotas VIGENTES con fecha de pago vencida
+        Index("ix_prestamodetalle_estado_fecha", "estado", "fechaPago"),
+    )
 
     idPrestamoDet = Column(Integer, primary_key=True, autoincrement=True)
     idPrestamoEnc = Column(Integer, ForeignKey("pre_prestamoencabezado.idPrestamoEnc", ondelete="CASCADE"), nullable=False)
@@ -157,6 +313,33 @@ class PrestamoDetalle(Base):
     fechaCancelado = Column(Date, nullable=True)
     documentoPago = Column(String(100), nullable=True)
 
+class MoraCuota(Base):
+    __tablename__ = "pre_moracuota"
+    __table_args__ = (
+        # Un solo cálculo por cuota y fecha de corte (el proceso es idempotente)
+        UniqueConstraint("idPrestamoDet", "fechaCorte", name="uq_moracuota_det_fecha"),
+    )
+
+    idMoraCuota   = Column(Integer, primary_key=True, autoincrement=True)
+    idPrestamoDet = Column(Integer, ForeignKey("pre_prestamodetalle.idPrestamoDet", ondelete="CASCADE"), nullable=False)
+    idPrestamoEnc = Column(Integer, ForeignKey("pre_prestamoencabezado.idPrestamoEnc", ondelete="CASCADE"), nullable=False, index=True)
+    fechaCorte    = Column(Date, nullable=False)
+    diasAtraso    = Column(Integer, nullable=False)
+    montoMora     = Column(DECIMAL(12, 2), nullable=False)
+
+# Resumen por préstamo para el reporte de antigüedad de cartera
+class CarteraResumen(Base):
+    __tablename__ = "pre_carteraresumen"
+
+    idPrestamoEnc      = Column(Integer, ForeignKey("pre_prestamoencabezado.idPrestamoEnc", ondelete="CASCADE"), primary_key=True)
+    idInstitucion      = Column(Integer, ForeignKey("pre_institucion.idInstitucion"), nullable=False)
+    idTipoPrestamo     = Column(Integer, ForeignKey("pre_tipoprestamo.idTipoPrestamo"), nullable=False)
+    idMoneda           = Column(Integer, ForeignKey("bcoma_moneda.idMoneda"), nullable=False)
+    saldoPendiente     = Column(DECIMAL(12, 2), nullable=False)
+    # fechaPago de la cuota VIGENTE más antigua; de ella salen los días de atraso
+    fechaCuotaVencida  = Column(Date, nullable=True)
+    fechaActualizacion = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
 class MovimientoPagoEncabezado(Base):
     __tablename__ = "pre_movimientopagoencabezado"
 
@@ -202,6 +385,11 @@ class TipoFormaPago(Base):
 
 class Transaccion(Base):
     __tablename__ = "bcoma_transaccion"
+    __table_args__ = (
+        Index("ix_transaccion_fecha", "fecha"),
+        # Procesos por lote: recuperar los ids insertados a partir del documento
+        Index("ix_transaccion_documento", "numeroDocumento"),
+    )
 
     idTransaccion = Column(Integer, primary_key=True, autoincrement=True)
     numeroDocumento = Column(String(50), nullable=True)
@@ -0,0 +1,168 @@
+# app/mora.py
+"""
+Proceso nocturno de cálculo de mora sobre las cuotas vencidas.
+
+La mora de las cuotas VIGENTES de préstamos aprobados con fecha de pago anterior a la fecha de corte
+se calcula en la base con `INSERT ... SELECT` sobre `pre_prestamodetalle`, por
+rangos de idPrestamoDet, y se guarda en `pre_moracuota`. Las filas nunca pasan
+por Python.
+
+El borrado de los resultados previos de la fecha de corte y todas las
+inserciones van en una sola transacción: volver a correr el proceso para la
+misma fecha los reemplaza (es idempotente) y una corrida interrumpida no deja
+un corte a medias.
+
+Uso:
+    python -m app.mora --fecha 2025-05-31 --lote 5000
+"""
+import argparse
+import logging
+import time
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import Date, Integer, func, insert, literal, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+from app import models
+from app.database import SessionLocal, engine
+
+logger = logging.getLogger("banco_mr.mora")
+
+LOTE_POR_DEFECTO = 5000
+DIAS_ANIO = 365
+
+
+class dias_entre(FunctionElement):
+    """Días de `fin` a `inicio` (dos fechas), en el dialecto de la base."""
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(dias_entre)
+def _dias_entre(elemento, compilador, **kw):
+    fin, inicio = list(elemento.clauses)
+    return f"({compilador.process(fin, **kw)} - {compilador.process(inicio, **kw)})"
+
+
+@compiles(dias_entre, "mysql")
+def _dias_entre_mysql(elemento, compilador, **kw):
+    fin, inicio = list(elemento.clauses)
+    return f"DATEDIFF({compilador.process(fin, **kw)}, {compilador.process(inicio, **kw)})"
+
+
+@compiles(dias_entre, "sqlite")
+def _dias_entre_sqlite(elemento, compilador, **kw):
+    fin, inicio = list(elemento.clauses)
+    return (
+        f"CAST(julianday({compilador.process(fin, **kw)}) - "
+        f"julianday({compilador.process(inicio, **kw)}) AS INTEGER)"
+    )
+
+
+def _seleccion_mora(fecha_corte: date, desde_id: int, hasta_id: int):
+    """
+    SELECT con la mora de las cuotas vencidas de un rango de idPrestamoDet.
+    `porcentajeMora` es una tasa anual que se aplica sobre el capital vencido
+    por cada día de atraso.
+    """
+    corte = literal(fecha_corte, Date)
+    dias = dias_entre(corte, models.PrestamoDetalle.fechaPago)
+    monto = func.round(
+        models.PrestamoDetalle.montoCapital * models.Plazo.porcentajeMora * dias / (100 * DIAS_ANIO), 2
+    )
+    return (
+        select(
+            models.PrestamoDetalle.idPrestamoDet,
+            models.PrestamoDetalle.idPrestamoEnc,
+            corte,
+            dias,
+            monto,
+        )
+        .join(models.PrestamoEncabezado,
+              models.PrestamoEncabezado.idPrestamoEnc == models.PrestamoDetalle.idPrestamoEnc)
+        .join(models.Plazo, models.Plazo.idPlazo == models.PrestamoEncabezado.idPlazo)
+        .where(
+            models.PrestamoDetalle.estado == "VIGENTE",
+            models.PrestamoDetalle.fechaPago < fecha_corte,
+            models.PrestamoDetalle.idPrestamoDet > desde_id,
+            models.PrestamoDetalle.idPrestamoDet <= hasta_id,
+            # Los rechazados también tienen fechaAutorizacion, pero nunca se desembolsaron
+            models.PrestamoEncabezado.aprobado.is_(True),
+        )
+    )
+
+
+def ejecutar(db: Session, fecha_corte: date, lote: int = LOTE_POR_DEFECTO) -> dict:
+    """
+    Calcula y guarda la mora de todas las cuotas vencidas a `fecha_corte`.
+    Devuelve un resumen con las filas procesadas, la mora total y el rendimiento.
+    """
+    inicio = time.perf_counter()
+    columnas = ["idPrestamoDet", "idPrestamoEnc", "fechaCorte", "diasAtraso", "montoMora"]
+
+    try:
+        # 1) Idempotencia: se descartan los resultados previos de la misma fecha de corte
+        db.query(models.MoraCuota).filter(models.MoraCuota.fechaCorte == fecha_corte) \
+          .delete(synchronize_session=False)
+
+        # 2) INSERT ... SELECT por rangos de idPrestamoDet, todo en la misma transacción
+        ultimo_id = db.query(func.max(models.PrestamoDetalle.idPrestamoDet)).scalar() or 0
+        desde_id = 0
+        while desde_id < ultimo_id:
+            hasta_id = desde_id + lote
+            db.execute(
+                insert(models.MoraCuota).from_select(columnas, _seleccion_mora(fecha_corte, desde_id, hasta_id))
+            )
+            logger.info(f"Mora {fecha_corte}: cuotas hasta idPrestamoDet {min(hasta_id, ultimo_id)}")
+            desde_id = hasta_id
+
+        procesadas, total_mora = (
+            db.query(func.count(models.MoraCuota.idMoraCuota), func.coalesce(func.sum(models.MoraCuota.montoMora), 0))
+              .filter(models.MoraCuota.fechaCorte == fecha_corte)
+              .one()
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    duracion = time.perf_counter() - inicio
+    return {
+        "fechaCorte": fecha_corte.isoformat(),
+        "cuotasProcesadas": procesadas,
+        "moraTotal": float(Decimal(str(total_mora))),
+        "segundos": round(duracion, 3),
+        "filasPorSegundo": round(procesadas / duracion, 1) if duracion > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cálculo nocturno de mora de préstamos")
+    parser.add_argument("--fecha", type=date.fromisoformat, default=date.today(),
+                        help="Fecha de corte (YYYY-MM-DD), por defecto hoy")
+    parser.add_argument("--lote", type=int, default=LOTE_POR_DEFECTO,
+                        help="Cantidad de cuotas por bloque")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # El eco de SQL es útil en desarrollo pero multiplica el tiempo del lote
+    engine.echo = False
+
+    db = SessionLocal()
+    try:
+        resumen = ejecutar(db, args.fecha, args.lote)
+    finally:
+        db.close()
+
+    print(
+        f"Mora al {resumen['fechaCorte']}: {resumen['cuotasProcesadas']} cuotas, "
+        f"Q{resumen['moraTotal']:,.2f} en {resumen['segundos']}s "
+        f"({resumen['filasPorSegundo']} filas/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+# app/pagos.py
+"""
+Aplicación de pagos a préstamos.
+
+El pago se aplica dentro de una sola transacción que bloquea (FOR UPDATE) la
+cuenta origen y el encabezado del préstamo, de modo que dos pagos simultáneos
+sobre el mismo préstamo o la misma cuenta se serializan y no pueden sobregirar.
+Sólo se leen las cuotas que el monto alcanza a cubrir y los detalles del
+movimiento se insertan en bloque.
+
+Lo ya abonado a cada cuota (mora, intereses y capital de los detalles de pagos
+anteriores) se descuenta de lo que se cobra: un pago parcial seguido de otro
+nunca cobra dos veces la misma mora ni la misma parte de la cuota.
+"""
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session, lazyload
+
+from app import models
+from app.cartera import actualizar_cartera
+from app.utils import generar_numero_documento_pago
+
+# El pago se registra como un débito (retiro) a la cuenta origen
+TIPO_TRANSACCION_PAGO = 2
+CERO = Decimal("0.00")
+
+
+@dataclass
+class ResultadoPago:
+    documento: str
+    fecha: date
+    cuenta: models.Cuenta
+    prestamo: models.PrestamoEncabezado
+    cuotas_pagadas: int
+    capital: Decimal
+    interes: Decimal
+    mora: Decimal
+
+    @property
+    def total(self) -> Decimal:
+        return self.capital + self.interes + self.mora
+
+
+def _bloquear_cuenta(db: Session, numero_cuenta: str, id_cliente: int) -> models.Cuenta:
+    cuenta = (
+        db.query(models.Cuenta)
+          .options(lazyload("*"))
+          .filter_by(numeroCuenta=numero_cuenta, idCliente=id_cliente)
+          .with_for_update()
+          .first()
+    )
+    if not cuenta:
+        raise HTTPException(status_code=404, detail="Cuenta inválida o no pertenece al cliente")
+    return cuenta
+
+
+def _bloquear_prestamo(db: Session, numero_prestamo: str) -> models.PrestamoEncabezado:
+    # Sin cargas "joined": sólo se bloquea la fila del encabezado
+    prestamo = (
+        db.query(models.PrestamoEncabezado)
+          .options(lazyload("*"))
+          .filter_by(numeroPrestamo=numero_prestamo)
+          .with_for_update()
+          .first()
+    )
+    if not prestamo or prestamo.fechaAutorizacion is None:
+        raise HTTPException(status_code=404, detail="Préstamo no válido o no aprobado")
+    return prestamo
+
+
+def _siguientes_cuotas(db: Session, id_prestamo: int, despues_de: int, cantidad: int):
+    return (
+        db.query(
+            models.PrestamoDetalle.idPrestamoDet,
+            models.PrestamoDetalle.numeroCuota,
+            models.PrestamoDetalle.montoCapital,
+            models.PrestamoDetalle.montoIntereses,
+            models.PrestamoDetalle.totalAPagar,
+        )
+        .filter(
+            models.PrestamoDetalle.idPrestamoEnc == id_prestamo,
+            models.PrestamoDetalle.estado == "VIGENTE",
+            models.PrestamoDetalle.numeroCuota > despues_de,
+        )
+        .order_by(models.PrestamoDetalle.numeroCuota)
+        .limit(cantidad)
+        .all()
+    )
+
+
+def _mora_calculada(db: Session, ids_cuotas: list) -> dict:
+    """Mora del último corte calculado por `app.mora` para cada cuota (acumulada desde el vencimiento)."""
+    ultimo_corte = (
+        db.query(
+            models.MoraCuota.idPrestamoDet,
+            func.max(models.MoraCuota.fechaCorte).label("fechaCorte"),
+        )
+        .filter(models.MoraCuota.idPrestamoDet.in_(ids_cuotas))
+        .group_by(models.MoraCuota.idPrestamoDet)
+        .subquery()
+    )
+    filas = (
+        db.query(models.MoraCuota.idPrestamoDet, models.MoraCuota.montoMora)
+          .join(
+              ultimo_corte,
+              (ultimo_corte.c.idPrestamoDet == models.MoraCuota.idPrestamoDet)
+              & (ultimo_corte.c.fechaCorte == models.MoraCuota.fechaCorte),
+          )
+          .all()
+    )
+    return {id_det: monto for id_det, monto in filas}
+
+
+def _abonado(db: Session, ids_cuotas: list) -> dict:
+    """(mora, intereses, capital) ya pagados a cada cuota en pagos anteriores."""
+    filas = (
+        db.query(
+            models.MovimientoPagoDetalle.idPrestamoDet,
+            func.coalesce(func.sum(models.MovimientoPagoDetalle.pagoMoraCuota), 0),
+            func.coalesce(func.sum(models.MovimientoPagoDetalle.pagoMontoIntereses), 0),
+            func.coalesce(func.sum(models.MovimientoPagoDetalle.pagoMontoCapital), 0),
+        )
+        .filter(models.MovimientoPagoDetalle.idPrestamoDet.in_(ids_cuotas))
+        .group_by(models.MovimientoPagoDetalle.idPrestamoDet)
+        .all()
+    )
+    return {id_det: tuple(Decimal(str(v)) for v in montos) for id_det, *montos in filas}
+
+
+def _pendiente(db: Session, cuotas: list) -> dict:
+    """Mora, intereses y capital que faltan por pagar de cada cuota."""
+    if not cuotas:
+        return {}
+    ids = [c.idPrestamoDet for c in cuotas]
+    moras, abonos = _mora_calculada(db, ids), _abonado(db, ids)
+    pendiente = {}
+    for cuota in cuotas:
+        mora_pag, int_pag, cap_pag = abonos.get(cuota.idPrestamoDet, (CERO, CERO, CERO))
+        pendiente[cuota.idPrestamoDet] = (
+            max(CERO, moras.get(cuota.idPrestamoDet, CERO) - mora_pag),
+            max(CERO, cuota.montoIntereses - int_pag),
+            max(CERO, cuota.montoCapital - cap_pag),
+        )
+    return pendiente
+
+
+def aplicar_pago(
+    db: Session,
+    numero_prestamo: str,
+    numero_cuenta: str,
+    id_cliente: int,
+    monto: Decimal,
+) -> ResultadoPago:
+    """
+    Aplica `monto` a lo que falta de las cuotas VIGENTES del préstamo en orden
+    (mora, intereses y capital de cada cuota) debitándolo de la cuenta origen.
+    No hace commit: la transacción (y los bloqueos) quedan a cargo del llamador.
+    """
+    # 1) Bloquear cuenta y préstamo, siempre en ese orden para evitar interbloqueos
+    cuenta = _bloquear_cuenta(db, numero_cuenta, id_cliente)
+    prestamo = _bloquear_prestamo(db, numero_prestamo)
+
+    if cuenta.saldo < monto:
+        raise HTTPException(status_code=400, detail="Saldo insuficiente")
+
+    # 2) Leer sólo las cuotas que el monto alcanza a cubrir. Con el sistema francés
+    #    las cuotas son iguales, así que la primera sirve para estimar cuántas faltan.
+    cuotas = _siguientes_cuotas(db, prestamo.idPrestamoEnc, 0, 1)
+    if not cuotas:
+        raise HTTPException(status_code=400, detail="No hay cuotas pendientes")
+
+    doc_pago = generar_numero_documento_pago(db)
+    fecha_hoy = date.today()
+    mov_enc = models.MovimientoPagoEncabezado(
+        documentoPago=doc_pago,
+        fechaPago=fecha_hoy,
+        idPrestamoEnc=prestamo.idPrestamoEnc,
+        idFormaPago=1,
+        cantidadCuotasPaga=0,
+        descripcionPago=f"Pago préstamo {numero_prestamo}",
+        pagoMontoCapital=CERO,
+        pagoMontoInteres=CERO,
+        pagoMora=CERO,
+        totalPago=CERO,
+        estado="VIGENTE",
+    )
+    db.add(mov_enc)
+    db.flush()  # para obtener mov_enc.idMovimientoEnc
+
+    # 3) Repartir el pago cuota a cuota
+    detalles, canceladas = [], []
+    total_capital = total_interes = total_mora = CERO
+    restante = monto
+
+    while cuotas and restante > 0:
+        pendientes = _pendiente(db, cuotas)
+        for cuota in cuotas:
+            if restante <= 0:
+                break
+
+            mora_cuota, interes_cuota, capital_cuota = pendientes[cuota.idPrestamoDet]
+            if restante >= mora_cuota + interes_cuota + capital_cuota:
+                # Pago completo de lo que falta de la cuota
+                pago_mor, pago_int, pago_cap = mora_cuota, interes_cuota, capital_cuota
+                detalle_estado = "CANCELADO"
+                canceladas.append(cuota.idPrestamoDet)
+            else:
+                # Pago parcial: primero mora, luego intereses y por último capital
+                pago_mor = min(restante, mora_cuota)
+                pago_int = min(restante - pago_mor, interes_cuota)
+                pago_cap = min(restante - pago_mor - pago_int, capital_cuota)
+                detalle_estado = "VIGENTE"
+
+            aplicado = pago_mor + pago_int + pago_cap
+            detalles.append({
+                "idMovimientoPagoEnc": mov_enc.idMovimientoEnc,
+                "idPrestamoEnc": prestamo.idPrestamoEnc,
+                "idPrestamoDet": cuota.idPrestamoDet,
+                "numeroCuota": cuota.numeroCuota,
+                "pagoMontoCapital": pago_cap,
+                "pagoMontoIntereses": pago_int,
+                "pagoMoraCuota": pago_mor,
+                "totalPago": aplicado,
+                "estado": detalle_estado,
+            })
+            total_capital += pago_cap
+            total_interes += pago_int
+            total_mora += pago_mor
+            restante -= aplicado
+
+        if restante <= 0:
+            break
+        faltantes = int(restante // cuotas[-1].totalAPagar) + 1
+        cuotas = _siguientes_cuotas(db, prestamo.idPrestamoEnc, cuotas[-1].numeroCuota, faltantes)
+
+    # 4) Escrituras en bloque
+    db.execute(insert(models.MovimientoPagoDetalle), detalles)
+    if canceladas:
+        db.execute(
+            update(models.PrestamoDetalle)
+            .where(models.PrestamoDetalle.idPrestamoDet.in_(canceladas))
+            .values(estado="CANCELADO", fechaCancelado=fecha_hoy, documentoPago=doc_pago)
+        )
+
+    total = total_capital + total_interes + total_mora
+    mov_enc.cantidadCuotasPaga = len(canceladas)
+    mov_enc.pagoMontoCapital = total_capital
+    mov_enc.pagoMontoInteres = total_interes
+    mov_enc.pagoMora = total_mora
+    mov_enc.totalPago = total
+
+    # La mora no reduce el saldo del préstamo, sólo capital e intereses
+    prestamo.saldoPrestamo -= total_capital + total_interes
+    cuenta.saldo -= total
+
+    # 5) Registrar el débito en la cuenta origen
+    transaccion = models.Transaccion(
+        numeroDocumento=doc_pago,
+        idCuentaOrigen=cuenta.idCuenta,
+        idCuentaDestino=None,
+        idTipoTransaccion=TIPO_TRANSACCION_PAGO,
+        monto=total,
+        descripcion=f"Pago préstamo {numero_prestamo}",
+    )
+    db.add(transaccion)
+    db.flush()
+    db.add(models.Historial(
+        idCuenta=cuenta.idCuenta,
+        idTransaccion=transaccion.idTransaccion,
+        numeroDocumento=doc_pago,
+        monto=total,
+        saldo=cuenta.saldo,
+    ))
+
+    # 6) Mantener al día el resumen del reporte de cartera
+    actualizar_cartera(db, prestamo)
+
+    return ResultadoPago(
+        documento=doc_pago,
+        fecha=fecha_hoy,
+        cuenta=cuenta,
+        prestamo=prestamo,
+        cuotas_pagadas=len(canceladas),
+        capital=total_capital,
+        interes=total_interes,
+        mora=total_mora,
+    )
@@ -0,0 +1,79 @@
+# app/pdf_utils.py
+"""
+Generador mínimo de PDF de sólo texto (Courier, para alinear columnas), sin
+dependencias externas.
+
+Los objetos del documento se emiten a medida que se completa cada página, por
+lo que el PDF puede enviarse en streaming sin armarlo completo en memoria.
+"""
+from typing import Iterable, Iterator
+
+LINEAS_POR_PAGINA = 54
+TAMANIO_LETRA = 9
+ALTO_LINEA = 13
+MARGEN_IZQ = 40
+MARGEN_SUP = 800  # página A4: 595 x 842 puntos
+
+
+def _texto_pdf(linea: str) -> bytes:
+    datos = linea.encode("cp1252", errors="replace")
+    return datos.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class _Escritor:
+    def __init__(self):
+        self.posicion = 0
+        self.desplazamientos = {}
+
+    def emitir(self, datos: bytes) -> bytes:
+        self.posicion += len(datos)
+        return datos
+
+    def objeto(self, numero: int, cuerpo: bytes) -> bytes:
+        self.desplazamientos[numero] = self.posicion
+        return self.emitir(b"%d 0 obj\n" % numero + cuerpo + b"\nendobj\n")
+
+
+def generar_pdf(lineas: Iterable[str]) -> Iterator[bytes]:
+    """Genera un PDF con una línea de texto por elemento de `lineas`."""
+    w = _Escritor()
+    # 1 = catálogo, 2 = árbol de páginas, 3 = fuente; las páginas desde el 4
+    yield w.emitir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    yield w.objeto(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    yield w.objeto(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+
+    paginas = []
+    siguiente = 4
+
+    def pagina(bloque: list) -> Iterator[bytes]:
+        nonlocal siguiente
+        contenido = b"BT /F1 %d Tf %d TL %d %d Td\n" % (TAMANIO_LETRA, ALTO_LINEA, MARGEN_IZQ, MARGEN_SUP)
+        contenido += b"".join(b"(" + _texto_pdf(l) + b") Tj T*\n" for l in bloque) + b"ET"
+        num_contenido, num_pagina = siguiente, siguiente + 1
+        siguiente += 2
+        paginas.append(num_pagina)
+        yield w.objeto(num_contenido, b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream")
+        yield w.objeto(
+            num_pagina,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % num_contenido,
+        )
+
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) == LINEAS_POR_PAGINA:
+            yield from pagina(bloque)
+            bloque = []
+    if bloque or not paginas:
+        yield from pagina(bloque)
+
+    hijos = b" ".join(b"%d 0 R" % n for n in paginas)
+    yield w.objeto(2, b"<< /Type /Pages /Kids [" + hijos + b"] /Count %d >>" % len(paginas))
+
+    inicio_xref = w.posicion
+    total = siguiente
+    xref = b"xref\n0 %d\n0000000000 65535 f \n" % total
+    xref += b"".join(b"%010d 00000 n \n" % w.desplazamientos[n] for n in range(1, total))
+    yield w.emitir(xref)
+    yield w.emitir(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (total, inicio_xref))
@@ -0,0 +1,181 @@
+# app/perfilador.py
+"""
+Perfilado por muestreo de solicitudes, en formato de pilas colapsadas
+(`marco;marco;marco conteo`), compatible con flamegraph.pl y speedscope.
+
+Dos modos:
+  - Bajo demanda: un administrador agrega el encabezado `X-Profile: 1` (o el
+    parámetro `?__profile=1`). El perfil se guarda en PERFILES_DIR y su nombre
+    vuelve en el encabezado `X-Profile-File`; se descarga en
+    GET /soporte/perfiles/{nombre}.
+  - Global: con PERFIL_MUESTREO_TASA > 0 se perfila esa fracción de todas las
+    solicitudes. El directorio se rota y conserva sólo los PERFIL_MAX_ARCHIVOS
+    más recientes.
+
+El muestreador es un hilo que lee `sys._current_frames()` cada
+PERFIL_INTERVALO_MS milisegundos, así que también ve los endpoints síncronos
+que corren en el threadpool. Descarta los hilos inactivos, pero si hay otras
+solicitudes en curso sus pilas también aparecen en el perfil.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import anyio
+from jose import JWTError, jwt
+
+from app import models
+from app.auth import ALGORITHM, SECRET_KEY
+from app.database import SessionLocal
+
+DIRECTORIO_PERFILES = Path(os.getenv("PERFILES_DIR", "perfiles"))
+TASA_MUESTREO = float(os.getenv("PERFIL_MUESTREO_TASA", "0"))
+MAX_ARCHIVOS = int(os.getenv("PERFIL_MAX_ARCHIVOS", "200"))
+INTERVALO = float(os.getenv("PERFIL_INTERVALO_MS", "1")) / 1000
+
+ENCABEZADO = b"x-profile"
+PARAMETRO = "__profile"
+
+# Funciones donde un hilo está esperando trabajo; esas muestras se descartan
+_ESPERAS = {"wait", "select", "poll", "sleep"}
+
+
+def _pila(marco) -> str:
+    partes = []
+    while marco is not None:
+        codigo = marco.f_code
+        partes.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+        marco = marco.f_back
+    return ";".join(reversed(partes))
+
+
+class Muestreador:
+    def __init__(self, intervalo: float = INTERVALO):
+        self.intervalo = intervalo
+        self.muestras = Counter()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name="perfilador", daemon=True)
+
+    def _ejecutar(self):
+        propio = threading.get_ident()
+        while not self._detener.wait(self.intervalo):
+            for id_hilo, marco in sys._current_frames().items():
+                if id_hilo == propio or marco.f_code.co_name in _ESPERAS:
+                    continue
+                self.muestras[_pila(marco)] += 1
+
+    def iniciar(self):
+        self._hilo.start()
+
+    @property
+    def activo(self) -> bool:
+        return self._hilo.is_alive()
+
+    def detener(self) -> Counter:
+        self._detener.set()
+        self._hilo.join()
+        return self.muestras
+
+
+def guardar_perfil(muestras: Counter, metodo: str, ruta: str, duracion: float) -> str:
+    """Escribe el perfil en formato colapsado y rota el directorio; devuelve el nombre del archivo."""
+    DIRECTORIO_PERFILES.mkdir(parents=True, exist_ok=True)
+    marca = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    ruta_segura = ruta.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "raiz"
+    nombre = f"{marca}_{metodo}_{ruta_segura}_{int(duracion * 1000)}ms.folded"
+    with open(DIRECTORIO_PERFILES / nombre, "w", encoding="utf-8") as archivo:
+        for pila, conteo in muestras.most_common():
+            archivo.write(f"{pila} {conteo}\n")
+
+    archivos = sorted(DIRECTORIO_PERFILES.glob("*.folded"))
+    for viejo in archivos[:-MAX_ARCHIVOS]:
+        viejo.unlink(missing_ok=True)
+    return nombre
+
+
+def _es_admin(token: str) -> bool:
+    try:
+        username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return False
+    if not username:
+        return False
+    db = SessionLocal()
+    try:
+        usuario = db.query(models.Usuario.rol).filter(models.Usuario.username == username).first()
+        return bool(usuario and usuario.rol == "admin")
+    finally:
+        db.close()
+
+
+def _solicitado(scope) -> bool:
+    for nombre, valor in scope["headers"]:
+        if nombre == ENCABEZADO:
+            return valor.strip() in (b"1", b"true")
+    consulta = scope.get("query_string", b"")
+    return PARAMETRO.encode() in consulta and \
+        parse_qs(consulta.decode("latin-1")).get(PARAMETRO, [""])[0] in ("1", "true")
+
+
+def _token(scope) -> str:
+    for nombre, valor in scope["headers"]:
+        if nombre == b"authorization":
+            esquema, _, token = valor.decode("latin-1").partition(" ")
+            return token if esquema.lower() == "bearer" else ""
+    return ""
+
+
+class PerfiladorMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        bajo_demanda = _solicitado(scope)
+        if bajo_demanda:
+            token = _token(scope)
+            bajo_demanda = bool(token) and await anyio.to_thread.run_sync(_es_admin, token)
+        if not bajo_demanda and not (TASA_MUESTREO and random.random() < TASA_MUESTREO):
+            await self.app(scope, receive, send)
+            return
+
+        muestreador = Muestreador()
+        inicio = time.perf_counter()
+        muestreador.iniciar()
+        inicio_respuesta = None
+
+        async def send_perfilado(mensaje):
+            nonlocal inicio_respuesta
+            if mensaje["type"] == "http.response.start":
+                # Se retiene para poder agregar el nombre del perfil en los encabezados
+                inicio_respuesta = mensaje
+                return
+            if inicio_respuesta is not None:
+                # El perfil cubre hasta el primer bloque del cuerpo (todo, si no es streaming)
+                ruta = getattr(scope.get("route"), "path", scope["path"])
+                nombre = await anyio.to_thread.run_sync(
+                    guardar_perfil, muestreador.detener(), scope["method"], ruta, time.perf_counter() - inicio
+                )
+                if bajo_demanda:
+                    inicio_respuesta = {
+                        **inicio_respuesta,
+                        "headers": list(inicio_respuesta.get("headers", [])) + [(b"x-profile-file", nombre.encode())],
+                    }
+                await send(inicio_respuesta)
+                inicio_respuesta = None
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_perfilado)
+        finally:
+            if muestreador.activo:
+                muestreador.detener()
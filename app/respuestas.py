@@ -0,0 +1,70 @@
+# app/respuestas.py
+"""
+Respuestas JSON para listados grandes.
+
+Con `response_model`, FastAPI valida con Pydantic cada fila que devuelve el
+handler antes de serializarla; sin él, recorre el contenido con
+`jsonable_encoder` y lo serializa con el json de la biblioteca estándar. En
+listados de miles de filas cualquiera de los dos caminos domina el tiempo de
+respuesta.
+
+Los handlers de listado arman sus filas como dicts desde consultas de
+columnas, así que ya conocen su forma. Para esos casos:
+
+  - `RespuestaJSON` serializa con orjson si está instalado (si no, con json)
+    y entiende fechas, Decimal y enums. Si el handler la devuelve, FastAPI
+    omite su validación y su codificación.
+  - `validar_primera` valida una sola fila contra el esquema de salida, para
+    que un cambio en la forma de las filas siga fallando como antes, sin
+    pagar la validación del listado completo.
+
+El `response_model` de cada endpoint se conserva para la documentación
+OpenAPI. `python -m benchmarks.serializacion` compara los caminos.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from typing import Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+
+def _por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, Enum):
+        return valor.value
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def serializar(contenido) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(contenido, default=_por_defecto)
+    return json.dumps(
+        contenido, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_por_defecto
+    ).encode("utf-8")
+
+
+class RespuestaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        return serializar(content)
+
+
+def validar_primera(filas: list, esquema: Type[BaseModel]):
+    """Valida la primera fila contra el esquema y rechaza campos que el esquema no declara."""
+    if not filas:
+        return
+    fila = filas[0]
+    sobrantes = set(fila) - set(esquema.model_fields)
+    if sobrantes:
+        raise ValueError(f"Campos no declarados en {esquema.__name__}: {sorted(sobrantes)}")
+    esquema.model_validate(fila)
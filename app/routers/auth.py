@@ -1,24 +1,28 @@
 # app/routers/auth.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 import secrets
 from datetime import timedelta, datetime
 import os
 from app.database import get_db
-from app import models, schemas, auth, email_utils
+from app import models, schemas, auth, email_utils, limite_login
 
 router = APIRouter()
 
 @router.post("/login")
 def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """
     Iniciar sesión y obtener token Bearer.
     """
+    # Límite de intentos por IP y por usuario, antes de consultar la base
+    limite_login.verificar(request, form_data.username)
+
     user = db.query(models.Usuario) \
         .filter(
         models.Usuario.username == form_data.username,
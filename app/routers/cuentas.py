@@ -1,11 +1,15 @@
 # app/routers/cuentas.py
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app import models, schemas, auth
+from app import cache_cuentas, models, schemas, auth
 from app.database import SessionLocal
 from app.utils import generate_account_number  # Función definida en app/utils.py
-from typing import Optional, List
+from app.estados_cuenta import estado_cuenta, generar_csv, generar_pdf_estado
+from app.respuestas import RespuestaJSON, validar_primera
+from app.saldos_cierre import saldo_a_fecha
+from typing import Literal, Optional, List
 from datetime import date
 
 router = APIRouter()
@@ -66,6 +70,7 @@ def create_cuenta(
         db.rollback()
         raise HTTPException(status_code=400, detail="Error al crear la cuenta: " + str(e))
     db.refresh(nueva_cuenta)
+    cache_cuentas.escribir(db, id_cliente)
     return nueva_cuenta
 
 @router.get("/cuentas", response_model=List[schemas.Cuenta])
@@ -82,28 +87,14 @@ def list_cuentas(
     Lista las cuentas del cliente autenticado y permite filtrar por tipo de cuenta, moneda,
     estado de la cuenta y por un rango de fechas de creación.
     """
-    # Obtener el usuario autenticado y el idCliente
-    usuario = db.query(models.Usuario).filter(models.Usuario.username == current_user["username"]).first()
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado.")
-    id_cliente = usuario.idCliente
-
-    # Construir la consulta con filtro base para el idCliente
-    query = db.query(models.Cuenta).filter(models.Cuenta.idCliente == id_cliente)
-
-    if idTipoCuenta is not None:
-        query = query.filter(models.Cuenta.idTipoCuenta == idTipoCuenta)
-    if idMoneda is not None:
-        query = query.filter(models.Cuenta.idMoneda == idMoneda)
-    if idEstadoCuenta is not None:
-        query = query.filter(models.Cuenta.idEstadoCuenta == idEstadoCuenta)
-    if fechaInicio is not None:
-        query = query.filter(models.Cuenta.fechaCreacion >= fechaInicio)
-    if fechaFin is not None:
-        query = query.filter(models.Cuenta.fechaCreacion <= fechaFin)
-
-    cuentas = query.all()
-    return cuentas
+    # Filas desde la caché por cliente (ver app.cache_cuentas)
+    cuentas = cache_cuentas.cuentas_de(
+        db, current_user["idCliente"],
+        idTipoCuenta=idTipoCuenta, idMoneda=idMoneda, idEstadoCuenta=idEstadoCuenta,
+        fechaInicio=fechaInicio, fechaFin=fechaFin,
+    )
+    validar_primera(cuentas, schemas.Cuenta)
+    return RespuestaJSON(cuentas)
 
 
 @router.get("/cuentas/all", response_model=List[schemas.Cuenta])
@@ -114,15 +105,57 @@ def list_all_accounts(
     """
     Lista todas las cuentas pertenecientes al cliente autenticado.
     """
-    # Obtener el usuario autenticado y su idCliente
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.username == current_user["username"]
-    ).first()
-    if not usuario:
-        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    cuentas = cache_cuentas.cuentas_de(db, current_user["idCliente"])
+    validar_primera(cuentas, schemas.Cuenta)
+    return RespuestaJSON(cuentas)
+
 
-    cuentas = db.query(models.Cuenta).filter(
-        models.Cuenta.idCliente == usuario.idCliente
-    ).all()
+@router.get("/cuentas/{numero}/estado-cuenta", response_model=schemas.EstadoCuentaOut)
+def obtener_estado_cuenta(
+    numero: str,
+    desde: date = Query(..., description="Fecha inicial del período (YYYY-MM-DD)"),
+    hasta: date = Query(..., description="Fecha final del período (YYYY-MM-DD)"),
+    formato: Literal["json", "csv", "pdf"] = Query("json", description="json, csv o pdf"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(auth.get_current_user)
+):
+    """
+    Estado de cuenta del período: saldo inicial, movimientos y saldo final.
+    """
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="La fecha final debe ser posterior a la inicial")
+
+    cuenta = db.query(models.Cuenta).filter_by(numeroCuenta=numero).first()
+    if not cuenta:
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+    if cuenta.idCliente != current_user["idCliente"] and current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="No tiene permisos para ver esta cuenta")
+
+    estado = estado_cuenta(db, cuenta, desde, hasta)
+    if formato == "json":
+        return estado
+
+    nombre = f"estado_{numero}_{desde.isoformat()}_{hasta.isoformat()}.{formato}"
+    headers = {"Content-Disposition": f'attachment; filename="{nombre}"'}
+    if formato == "csv":
+        return StreamingResponse(generar_csv(estado), media_type="text/csv; charset=utf-8", headers=headers)
+    return StreamingResponse(generar_pdf_estado(estado), media_type="application/pdf", headers=headers)
+
+
+@router.get("/cuentas/{numero}/saldo", response_model=schemas.SaldoFechaOut)
+def obtener_saldo_a_fecha(
+    numero: str,
+    fecha: date = Query(..., description="Fecha de consulta (YYYY-MM-DD)"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(auth.get_current_user)
+):
+    """
+    Saldo de la cuenta al final del día indicado.
+    """
+    cuenta = db.query(models.Cuenta).filter_by(numeroCuenta=numero).first()
+    if not cuenta:
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+    if cuenta.idCliente != current_user["idCliente"] and current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="No tiene permisos para ver esta cuenta")
 
-    return cuentas
\ No newline at end of file
+    return saldo_a_fecha(db, cuenta, fecha)
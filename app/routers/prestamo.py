@@ -1,22 +1,27 @@
 # app/routers/prestamo.py
 import os
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload
-from datetime import date, datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from sqlalchemy.orm import Session, joinedload, lazyload
+from datetime import date
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
 from typing import Optional, List
 from fastapi import Path
 from app.schemas import CuotaOut
 from app.database import get_db
-from app import models, schemas
+from app import cache_cuentas, models, schemas
 from app.auth import get_current_user
 from app.utils import (
     generar_numero_prestamo,
-    generar_numero_documento,
     generar_cuotas_sistema_frances,
-    generar_numero_documento_pago,
 )
+from app.pagos import aplicar_pago
+from app.idempotencia import con_idempotencia
+from app.aprobaciones import notificar_aprobacion, procesar_aprobacion
+from app.cartera import reporte_cartera
+from app.catalogos import respuesta_catalogo
+from app.respuestas import RespuestaJSON, validar_primera
+from app.trabajos import encolar
 from app.email_utils import send_email
 import logging
 router = APIRouter()
@@ -144,97 +149,35 @@ def aprobar_prestamo(
     if not usuario or usuario.rol != "admin":
         raise HTTPException(403, "Solo administradores pueden aprobar préstamos")
 
-    prestamo = (
-        db.query(models.PrestamoEncabezado)
-        .filter_by(numeroPrestamo=data.numeroPrestamo)
-        .first()
-    )
-    if not prestamo:
-        raise HTTPException(404, "Préstamo no encontrado")
-    if prestamo.fechaAutorizacion is not None:
-        raise HTTPException(400, "Este préstamo ya fue procesado")
-
-    cuenta = (
-        db.query(models.Cuenta)
-        .filter_by(idCuenta=prestamo.idCuentaDestino, idCliente=prestamo.idCliente)
-        .first()
-    )
-    if not cuenta:
-        raise HTTPException(404, "Cuenta destino no válida o no pertenece al cliente")
-
-    fecha_actual = date.today()
-    prestamo.fechaAutorizacion = fecha_actual
-    if data.aprobar:
-        cuenta.saldo += prestamo.montoPrestamo
-        num_doc = generar_numero_documento(db)
-        trans = models.Transaccion(
-            numeroDocumento=num_doc,
-            idCuentaOrigen=None,
-            idCuentaDestino=cuenta.idCuenta,
-            idTipoTransaccion=4,
-            monto=prestamo.montoPrestamo,
-            descripcion=f"Acreditación préstamo {prestamo.numeroPrestamo}",
-        )
-        db.add(trans); db.flush()
-        db.add(
-            models.Historial(
-                idCuenta=cuenta.idCuenta,
-                idTransaccion=trans.idTransaccion,
-                numeroDocumento=num_doc,
-                monto=prestamo.montoPrestamo,
-                saldo=cuenta.saldo,
-            )
-        )
+    resultado = procesar_aprobacion(db, data.numeroPrestamo, data.aprobar)
     db.commit()
-    # 5) Enviar correo al cliente notificando la aprobación
-    cliente = db.query(models.Cliente).filter_by(idCliente=prestamo.idCliente).first()
-    if cliente and cliente.correo and data.aprobar:
-        # Hora actual formateada
-        ahora = datetime.now().strftime("%d/%m/%Y %H:%M")
-        subject = f"Banco M&R – Préstamo {prestamo.numeroPrestamo} Aprobado"
-        html_body = f"""
-            <html>
-              <body style="font-family:Arial,sans-serif; color:#333;">
-                <p>Estimado/a <strong>{cliente.primerNombre} {cliente.primerApellido}</strong>,</p>
-
-                <p>
-                  Nos complace informarle que su solicitud de préstamo
-                  <strong>{prestamo.numeroPrestamo}</strong> ha sido <strong>APROBADA</strong> 
-                  el {fecha_actual.strftime('%d/%m/%Y')} a las {ahora.split()[1]}.
-                </p>
-
-                <p>Detalle de la operación:</p>
-                <ul>
-                  <li><strong>Monto aprobado:</strong> Q{float(prestamo.montoPrestamo):,.2f}</li>
-                  <li><strong>Cuenta acreditada:</strong> {cuenta.numeroCuenta}</li>
-                  <li><strong>Documento:</strong> {num_doc}</li>
-                </ul>
+    cache_cuentas.escribir(db, resultado.cuenta.idCliente)
+    # Enviar correo al cliente notificando la aprobación
+    notificar_aprobacion(db, resultado)
 
-                <p>
-                  El monto ya se encuentra disponible en su cuenta. 
-                  Para cualquier consulta, puede responder a este correo o contactarnos
-                  a través de nuestros canales de atención.
-                </p>
+    return {"mensaje": f"Préstamo {'aprobado' if data.aprobar else 'rechazado'} correctamente."}
 
-                <br>
-                <p>Saludos cordiales,<br>Equipo Banco M&amp;R</p>
-                <hr style="border:none; border-top:1px solid #eee; margin:40px 0;" />
-                <div style="text-align:center;">
-                  <img src="cid:logo_cid" alt="Logo Banco M&R" style="width:120px;"/>
-                </div>
-              </body>
-            </html>
-            """
-        # Ruta al logo (ajusta si es necesario)
-        logo_path = os.path.join(os.path.dirname(__file__), "..", "Logo.png")
 
-        try:
-            send_email(subject, cliente.correo, html_body, logo_path=logo_path)
-        except Exception:
-            # No interrumpimos si falla el envío de correo
-            pass
+@router.post("/prestamos/aprobar/lote", status_code=202)
+def aprobar_prestamos_lote(
+    data: schemas.AprobacionPrestamoLote,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Encola la aprobación (o rechazo) de varios préstamos; el avance se consulta en GET /jobs/{id}.
+    """
+    usuario = db.query(models.Usuario).filter_by(username=user["username"]).first()
+    if not usuario or usuario.rol != "admin":
+        raise HTTPException(403, "Solo administradores pueden aprobar préstamos")
 
-    return {"mensaje": f"Préstamo {'aprobado' if data.aprobar else 'rechazado'} correctamente."}
+    trabajo = encolar(
+        db,
+        "aprobar_prestamos",
+        {"numerosPrestamo": data.numerosPrestamo, "aprobar": data.aprobar},
+        usuario.username,
+    )
+    return {"idTrabajo": trabajo.idTrabajo, "estado": trabajo.estado}
 
 
 @router.post("/prestamos/pagar")
@@ -242,123 +185,42 @@ def pagar_prestamo(
     data: schemas.PagoPrestamo,
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
+    return con_idempotencia(
+        db,
+        idempotency_key,
+        user["username"],
+        "POST /prestamos/pagar",
+        data,
+        lambda: _pagar_prestamo(data, db, user),
+    )
+
+
+def _pagar_prestamo(data: schemas.PagoPrestamo, db: Session, user: dict):
     # 1) Validar cliente y rol
     usuario = db.query(models.Usuario).filter_by(username=user["username"]).first()
     if not usuario or usuario.rol != "cliente":
         raise HTTPException(status_code=403, detail="Acceso denegado")
 
-    # 2) Buscar y validar préstamo
-    prestamo = db.query(models.PrestamoEncabezado).filter_by(
-        numeroPrestamo=data.numeroPrestamo
-    ).first()
-    if not prestamo or prestamo.fechaAutorizacion is None:
-        raise HTTPException(status_code=404, detail="Préstamo no válido o no aprobado")
-
-    # 3) Buscar y validar cuenta origen
-    cuenta = db.query(models.Cuenta).filter_by(
-        numeroCuenta=data.numeroCuentaOrigen,
-        idCliente=usuario.idCliente
-    ).first()
-    if not cuenta:
-        raise HTTPException(status_code=404, detail="Cuenta inválida o no pertenece al cliente")
-
+    # 2) Aplicar el pago con la cuenta y el préstamo bloqueados
     monto_disp = Decimal(str(data.montoPago))
-    if cuenta.saldo < monto_disp:
-        raise HTTPException(status_code=400, detail="Saldo insuficiente")
-
-    # 4) Obtener todas las cuotas VIGENTES ordenadas
-    cuotas = (
-        db.query(models.PrestamoDetalle)
-          .filter_by(idPrestamoEnc=prestamo.idPrestamoEnc, estado="VIGENTE")
-          .order_by(models.PrestamoDetalle.numeroCuota)
-          .all()
-    )
-    if not cuotas:
-        raise HTTPException(status_code=400, detail="No hay cuotas pendientes")
-
-    # 5) Crear encabezado de movimiento de pago
-    doc_pago = generar_numero_documento_pago(db)
-    fecha_hoy = date.today()
-    mov_enc = models.MovimientoPagoEncabezado(
-        documentoPago=doc_pago,
-        fechaPago=fecha_hoy,
-        idPrestamoEnc=prestamo.idPrestamoEnc,
-        idFormaPago=1,
-        cantidadCuotasPaga=0,
-        descripcionPago=f"Pago préstamo {data.numeroPrestamo}",
-        pagoMontoCapital=Decimal("0.00"),
-        pagoMontoInteres=Decimal("0.00"),
-        pagoMora=Decimal("0.00"),
-        totalPago=Decimal("0.00"),
-        estado="VIGENTE",
+    pago = aplicar_pago(
+        db,
+        numero_prestamo=data.numeroPrestamo,
+        numero_cuenta=data.numeroCuentaOrigen,
+        id_cliente=usuario.idCliente,
+        monto=monto_disp,
     )
-    db.add(mov_enc)
-    db.flush()  # para obtener mov_enc.idMovimientoEnc
-
-    # 6) Aplicar el pago cuota a cuota
-    total_capital = total_interes = total_mora = Decimal("0.00")
-    cuotas_pagadas = 0
-    restante_pago = monto_disp
-
-    for cuota in cuotas:
-        if restante_pago <= 0:
-            break
-
-        total_cuota = cuota.totalAPagar
-
-        if restante_pago >= total_cuota:
-            # Pago completo de la cuota
-            pago_int = cuota.montoIntereses
-            pago_cap = cuota.montoCapital
-            pago_mor = Decimal("0.00")
-            aplicado = total_cuota
-
-            cuota.estado = "CANCELADO"
-            cuota.fechaCancelado = fecha_hoy
-            cuota.documentoPago = doc_pago
-            detalle_estado = "CANCELADO"
-            cuotas_pagadas += 1
-        else:
-            # Pago parcial de la cuota
-            pago_int = min(restante_pago, cuota.montoIntereses)
-            rem = restante_pago - pago_int
-            pago_cap = min(rem, cuota.montoCapital)
-            pago_mor = Decimal("0.00")
-            aplicado = pago_int + pago_cap
-            detalle_estado = "VIGENTE"
-
-        # Insertar detalle de pago
-        db.add(models.MovimientoPagoDetalle(
-            idMovimientoPagoEnc=mov_enc.idMovimientoEnc,
-            idPrestamoEnc=prestamo.idPrestamoEnc,
-            idPrestamoDet=cuota.idPrestamoDet,
-            numeroCuota=cuota.numeroCuota,
-            pagoMontoCapital=pago_cap,
-            pagoMontoIntereses=pago_int,
-            pagoMoraCuota=pago_mor,
-            totalPago=aplicado,
-            estado=detalle_estado,
-        ))
-
-        # Acumular totales y ajustar saldos
-        total_capital += pago_cap
-        total_interes += pago_int
-        total_mora += pago_mor
-        prestamo.saldoPrestamo -= aplicado
-        cuenta.saldo -= aplicado
-        restante_pago -= aplicado
-
-    # 7) Actualizar el encabezado con los totales
-    mov_enc.cantidadCuotasPaga = cuotas_pagadas
-    mov_enc.pagoMontoCapital = total_capital
-    mov_enc.pagoMontoInteres = total_interes
-    mov_enc.pagoMora = total_mora
-    mov_enc.totalPago = total_capital + total_interes + total_mora
-
     db.commit()
+    cache_cuentas.escribir(db, usuario.idCliente)
 
-    # 8) Enviar correo de confirmación al cliente
+    prestamo, cuenta = pago.prestamo, pago.cuenta
+    doc_pago, fecha_hoy = pago.documento, pago.fecha
+    cuotas_pagadas = pago.cuotas_pagadas
+    total_capital, total_interes, total_mora = pago.capital, pago.interes, pago.mora
+
+    # 3) Enviar correo de confirmación al cliente
     cliente = db.query(models.Cliente).filter_by(idCliente=usuario.idCliente).first()
     if cliente and cliente.correo:
         # Ruta absoluta al logo (ajústala según tu proyecto)
@@ -375,6 +237,7 @@ def pagar_prestamo(
               <li><strong>Cuotas pagadas:</strong> {cuotas_pagadas}</li>
               <li><strong>Capital abonado:</strong> Q{float(total_capital):,.2f}</li>
               <li><strong>Intereses abonados:</strong> Q{float(total_interes):,.2f}</li>
+              <li><strong>Mora abonada:</strong> Q{float(total_mora):,.2f}</li>
               <li><strong>Saldo deudor restante:</strong> Q{float(prestamo.saldoPrestamo):,.2f}</li>
               <li><strong>Saldo de su cuenta:</strong> Q{float(cuenta.saldo):,.2f}</li>
             </ul>
@@ -394,7 +257,7 @@ def pagar_prestamo(
             # No interrumpimos si falla el envío de correo
             pass
 
-    # 9) Respuesta al cliente de la API
+    # 4) Respuesta al cliente de la API
     return {
         "mensaje": "Pago aplicado correctamente",
         "documento": doc_pago,
@@ -550,14 +413,17 @@ def listar_todos_prestamos(
         raise HTTPException(status_code=403, detail="Solo administradores pueden ver todos los préstamos")
 
     # 2) Preparamos query base (sin filtrar por cliente)
+    #    El cliente viene en la misma consulta; los pagos no se usan en el listado
     q = (
-        db.query(models.PrestamoEncabezado)
+        db.query(models.PrestamoEncabezado, models.Cliente)
+          .join(models.Cliente, models.Cliente.idCliente == models.PrestamoEncabezado.idCliente)
           .options(
               joinedload(models.PrestamoEncabezado.institucion),
               joinedload(models.PrestamoEncabezado.tipoPrestamo),
               joinedload(models.PrestamoEncabezado.plazo),
               joinedload(models.PrestamoEncabezado.moneda),
               joinedload(models.PrestamoEncabezado.cuentaDestino),
+              lazyload(models.PrestamoEncabezado.pagos),
           )
     )
 
@@ -581,8 +447,7 @@ def listar_todos_prestamos(
 
     # 4) Mapear cada préstamo a un dict incluyendo nombre completo y observación
     resultados = []
-    for p in prestamos:
-        cliente = db.query(models.Cliente).filter_by(idCliente=p.idCliente).first()
+    for p, cliente in prestamos:
         nombre_completo = " ".join(filter(None, [
             cliente.primerNombre,
             cliente.segundoNombre,
@@ -606,7 +471,23 @@ def listar_todos_prestamos(
             "observacion":       p.observacion,
         })
 
-    return resultados
+    validar_primera(resultados, schemas.PrestamoOut)
+    return RespuestaJSON(resultados)
+
+@router.get(
+    "/prestamos/reportes/cartera",
+    response_model=schemas.ReporteCarteraOut,
+    summary="Antigüedad de la cartera de préstamos por tramos de atraso (solo admin)",
+)
+def reporte_cartera_prestamos(
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo administradores pueden ver el reporte de cartera")
+
+    fecha_corte = date.today()
+    return {"fechaCorte": fecha_corte, "filas": reporte_cartera(db, fecha_corte)}
 
 @router.get("/prestamos/mis-pagos", response_model=List[schemas.PagoPrestamoOut])
 def listar_pagos_cliente(
@@ -686,51 +567,20 @@ def listar_pagos_filtrados(
     ]
 
 @router.get("/instituciones", response_model=List[schemas.InstitucionOut], summary="Listar todas las instituciones")
-def listar_instituciones(db: Session = Depends(get_db)):
-    instituciones = db.query(models.Institucion).all()
-    return [
-        {
-            "idInstitucion": inst.idInstitucion,
-            "nombre": inst.descripcion
-        }
-        for inst in instituciones
-    ]
+def listar_instituciones(request: Request, db: Session = Depends(get_db)):
+    return respuesta_catalogo(request, db, "instituciones")
 
 @router.get("/tipos-prestamo", response_model=List[schemas.TipoPrestamoOut], summary="Listar todos los tipos de préstamo")
-def listar_tipos_prestamo(db: Session = Depends(get_db)):
-    tipos = db.query(models.TipoPrestamo).all()
-    return [
-        {
-            "idTipoPrestamo": tp.idTipoPrestamo,
-            "nombre": tp.descripcion
-        }
-        for tp in tipos
-    ]
+def listar_tipos_prestamo(request: Request, db: Session = Depends(get_db)):
+    return respuesta_catalogo(request, db, "tipos-prestamo")
 
 @router.get("/plazos", response_model=List[schemas.PlazoOut], summary="Listar todos los plazos de préstamo")
-def listar_plazos(db: Session = Depends(get_db)):
-    plazos = db.query(models.Plazo).all()
-    return [
-        {
-            "idPlazo": p.idPlazo,
-            "cantidadCuotas": p.cantidadCuotas,
-            "porcentajeAnualIntereses": float(p.porcentajeAnualIntereses),
-            "descripcion": p.descripcion
-        }
-        for p in plazos
-    ]
+def listar_plazos(request: Request, db: Session = Depends(get_db)):
+    return respuesta_catalogo(request, db, "plazos")
 
 @router.get("/monedas", response_model=List[schemas.MonedaOut], summary="Listar todos los tipos de moneda")
-def listar_monedas(db: Session = Depends(get_db)):
-    monedas = db.query(models.Moneda).all()
-    return [
-        {
-            "idMoneda": m.idMoneda,
-            "nombre": m.nombre,
-            "simbolo": m.codigo
-        }
-        for m in monedas
-    ]
+def listar_monedas(request: Request, db: Session = Depends(get_db)):
+    return respuesta_catalogo(request, db, "monedas")
 
 @router.get(
     "/prestamos/{numero_prestamo}/cuotas",
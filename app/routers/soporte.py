@@ -1,12 +1,19 @@
 # app/routers/soporte.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
+from typing import Literal, Optional
+from datetime import datetime
 
-from app import models
+from app import cache_cuentas, models
 from app.database import get_db
+from app.exportacion import TIPOS_CONTENIDO, generar_exportacion, comprimir_gzip
+from app.perfilador import DIRECTORIO_PERFILES
+from app.respuestas import RespuestaJSON
 from app.auth import get_current_user, pwd_context
-from app.schemas import SoporteCambioEstadoCuenta, SoporteCambioPassword
+from app.schemas import SoporteCambioEstadoCuenta, SoporteCambioPassword, DesactivacionUsuariosLote
+from app.trabajos import encolar
 
 router = APIRouter(
     prefix="/soporte",
@@ -19,47 +26,156 @@ def check_admin(user: dict):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sólo administradores pueden usar este módulo")
 
 
-@router.get("/usuarios", status_code=status.HTTP_200_OK, summary="Listar todos los usuarios")
+def _pagina(filas: list, limite: int, llave: str) -> dict:
+    """Recorta la página y calcula el cursor para la siguiente (paginación por llave)."""
+    hay_mas = len(filas) > limite
+    items = [dict(f._mapping) for f in filas[:limite]]
+    return {
+        "items": items,
+        "siguienteCursor": items[-1][llave] if hay_mas else None,
+    }
+
+
+@router.get("/usuarios", status_code=status.HTTP_200_OK, summary="Listar usuarios (paginado por cursor)")
 def listar_usuarios(
+    cursor: Optional[int] = Query(None, description="siguienteCursor devuelto por la página anterior"),
+    limite: int = Query(100, ge=1, le=1000, description="Cantidad de registros por página"),
+    estado: Optional[int] = Query(None, description="1=activo, 2=inactivo"),
+    rol: Optional[str] = Query(None, description="cliente o admin"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     check_admin(current_user)
-    usuarios = db.query(models.Usuario).all()
-    return [
-        {
-            "idUsuario": u.idUsuario,
-            "username": u.username,
-            "rol": u.rol,
-            "estado": getattr(u, "estado", None),
-            "idCliente": u.idCliente,
-            "fechaRegistro": u.fechaRegistro
-        }
-        for u in usuarios
-    ]
-
-
-@router.get("/cuentas", status_code=status.HTTP_200_OK, summary="Listar todas las cuentas")
+    q = db.query(
+        models.Usuario.idUsuario,
+        models.Usuario.username,
+        models.Usuario.rol,
+        models.Usuario.estado,
+        models.Usuario.idCliente,
+        models.Usuario.fechaRegistro,
+    )
+    if cursor is not None:
+        q = q.filter(models.Usuario.idUsuario > cursor)
+    if estado is not None:
+        q = q.filter(models.Usuario.estado == estado)
+    if rol:
+        q = q.filter(models.Usuario.rol == rol)
+
+    filas = q.order_by(models.Usuario.idUsuario).limit(limite + 1).all()
+    return RespuestaJSON(_pagina(filas, limite, "idUsuario"))
+
+
+@router.get("/cuentas", status_code=status.HTTP_200_OK, summary="Listar cuentas (paginado por cursor)")
 def listar_cuentas(
+    cursor: Optional[int] = Query(None, description="siguienteCursor devuelto por la página anterior"),
+    limite: int = Query(100, ge=1, le=1000, description="Cantidad de registros por página"),
+    estado: Optional[int] = Query(None, description="idEstadoCuenta: 1=activo, 2=inactivo"),
+    idMoneda: Optional[int] = Query(None, description="1=Quetzales, 2=Dólares, 3=Euros"),
+    idTipoCuenta: Optional[int] = Query(None, description="1=Monetaria, 2=Ahorro"),
+    numeroCuenta: Optional[str] = Query(None, description="Prefijo del número de cuenta"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     check_admin(current_user)
-    cuentas = db.query(models.Cuenta).all()
-    return [
+    q = db.query(
+        models.Cuenta.idCuenta,
+        models.Cuenta.numeroCuenta,
+        models.Cuenta.idCliente,
+        models.Cuenta.idTipoCuenta,
+        models.Cuenta.saldoInicial,
+        models.Cuenta.saldo,
+        models.Cuenta.idMoneda,
+        models.Cuenta.idEstadoCuenta,
+        models.Cuenta.fechaCreacion,
+    )
+    if cursor is not None:
+        q = q.filter(models.Cuenta.idCuenta > cursor)
+    if estado is not None:
+        q = q.filter(models.Cuenta.idEstadoCuenta == estado)
+    if idMoneda is not None:
+        q = q.filter(models.Cuenta.idMoneda == idMoneda)
+    if idTipoCuenta is not None:
+        q = q.filter(models.Cuenta.idTipoCuenta == idTipoCuenta)
+    if numeroCuenta:
+        q = q.filter(models.Cuenta.numeroCuenta.startswith(numeroCuenta, autoescape=True))
+
+    filas = q.order_by(models.Cuenta.idCuenta).limit(limite + 1).all()
+    # RespuestaJSON convierte los saldos (Decimal) a número
+    return RespuestaJSON(_pagina(filas, limite, "idCuenta"))
+
+
+@router.get("/export/{entidad}", summary="Exportar cuentas, usuarios o transacciones (NDJSON o CSV)")
+def exportar(
+    entidad: Literal["cuentas", "usuarios", "transacciones"],
+    request: Request,
+    formato: Literal["ndjson", "csv"] = Query("ndjson"),
+    updated_since: Optional[datetime] = Query(None, description="Sólo registros modificados desde esta fecha"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Descarga la tabla completa (o los cambios desde `updated_since`) en streaming.
+    Se comprime con gzip si el cliente envía `Accept-Encoding: gzip`.
+    """
+    check_admin(current_user)
+
+    contenido = generar_exportacion(entidad, formato, updated_since)
+    headers = {"Content-Disposition": f'attachment; filename="{entidad}.{formato}"'}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        contenido = comprimir_gzip(contenido)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(contenido, media_type=TIPOS_CONTENIDO[formato], headers=headers)
+
+
+@router.post("/export/{entidad}/trabajo", status_code=status.HTTP_202_ACCEPTED,
+             summary="Encolar una exportación completa comprimida")
+def encolar_exportacion(
+    entidad: Literal["cuentas", "usuarios", "transacciones"],
+    formato: Literal["ndjson", "csv"] = Query("ndjson"),
+    updated_since: Optional[datetime] = Query(None, description="Sólo registros creados o modificados desde esta fecha"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    check_admin(current_user)
+    trabajo = encolar(
+        db,
+        "exportacion",
         {
-            "idCuenta": c.idCuenta,
-            "numeroCuenta": c.numeroCuenta,
-            "idCliente": c.idCliente,
-            "idTipoCuenta": c.idTipoCuenta,
-            "saldoInicial": float(c.saldoInicial),
-            "saldo": float(c.saldo),
-            "idMoneda": c.idMoneda,
-            "idEstadoCuenta": c.idEstadoCuenta,
-            "fechaCreacion": c.fechaCreacion
-        }
-        for c in cuentas
-    ]
+            "entidad": entidad,
+            "formato": formato,
+            "desde": updated_since.isoformat() if updated_since else None,
+        },
+        current_user["username"],
+    )
+    return {"idTrabajo": trabajo.idTrabajo, "estado": trabajo.estado}
+
+
+@router.post("/usuarios/desactivar", status_code=status.HTTP_202_ACCEPTED,
+             summary="Desactivar usuarios y sus cuentas en segundo plano")
+def desactivar_usuarios_lote(
+    datos: DesactivacionUsuariosLote,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    check_admin(current_user)
+    trabajo = encolar(db, "desactivar_usuarios", {"idsUsuarios": datos.idsUsuarios}, current_user["username"])
+    return {"idTrabajo": trabajo.idTrabajo, "estado": trabajo.estado}
+
+
+@router.get("/perfiles", summary="Listar perfiles de solicitudes guardados")
+def listar_perfiles(current_user: dict = Depends(get_current_user)):
+    check_admin(current_user)
+    if not DIRECTORIO_PERFILES.exists():
+        return []
+    return sorted((p.name for p in DIRECTORIO_PERFILES.glob("*.folded")), reverse=True)
+
+
+@router.get("/perfiles/{nombre}", summary="Descargar un perfil (pilas colapsadas para flamegraph)")
+def descargar_perfil(nombre: str, current_user: dict = Depends(get_current_user)):
+    check_admin(current_user)
+    archivo = DIRECTORIO_PERFILES / nombre
+    if archivo.name != nombre or archivo.suffix != ".folded" or not archivo.exists():
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(archivo, media_type="text/plain; charset=utf-8", filename=nombre)
 
 
 @router.put("/usuarios/{user_id}/desactivar", status_code=status.HTTP_200_OK)
@@ -85,6 +201,7 @@ def desactivar_usuario(
       .update({"idEstadoCuenta": 2}, synchronize_session="fetch")
 
     db.commit()
+    cache_cuentas.escribir(db, usuario.idCliente)
 
     return {"mensaje": f"Usuario {usuario.username} y sus cuentas fueron desactivadas correctamente"}
 
@@ -104,6 +221,7 @@ def cambiar_estado_cuenta(
         raise HTTPException(status_code=400, detail="Estado inválido, sólo 1=activo o 2=inactivo")
     cuenta.idEstadoCuenta = datos.nuevo_estado
     db.commit()
+    cache_cuentas.escribir(db, cuenta.idCliente)
     return {"mensaje": f"Cuenta {numero_cuenta} ahora en estado {datos.nuevo_estado} (1=Activo, 2=Inactivo)"}
 
 
@@ -144,4 +262,5 @@ def reactivar_usuario(
       .update({"idEstadoCuenta": 1}, synchronize_session="fetch")
 
     db.commit()
+    cache_cuentas.escribir(db, usuario.idCliente)
     return {"mensaje": f"Usuario {usuario.username} y sus cuentas fueron reactivados correctamente"}
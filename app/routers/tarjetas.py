@@ -1,7 +1,7 @@
 # app/routers/tarjetas.py
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Bundle, Session, contains_eager
 from sqlalchemy import and_
 from datetime import datetime, timedelta, date
 import random
@@ -21,6 +21,24 @@ router = APIRouter(
 LOGO_PATH = r"C:\Users\marlo\Desktop\banco_mr\app\Logo.png"
 
 
+def _tarjeta_con_cliente(db: Session, idTarjeta: int):
+    """Tarjeta (con su cuenta) y los datos de contacto del cliente, en una sola consulta."""
+    fila = (
+        db.query(
+            models.Tarjeta,
+            Bundle("cliente", models.Cliente.primerNombre, models.Cliente.primerApellido, models.Cliente.correo),
+        )
+          .join(models.Tarjeta.cuenta)
+          .join(models.Cliente, models.Cliente.idCliente == models.Cuenta.idCliente)
+          .options(contains_eager(models.Tarjeta.cuenta))
+          .filter(models.Tarjeta.idTarjeta == idTarjeta)
+          .first()
+    )
+    if not fila:
+        raise HTTPException(status_code=404, detail="Tarjeta no encontrada")
+    return fila.Tarjeta, fila.cliente
+
+
 def generar_numero_tarjeta() -> str:
     return "".join(str(random.randint(0, 9)) for _ in range(16))
 
@@ -184,9 +202,7 @@ def bloquear_tarjeta(
     db: Session = Depends(get_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
-    tarjeta = db.query(models.Tarjeta).filter_by(idTarjeta=idTarjeta).first()
-    if not tarjeta:
-        raise HTTPException(status_code=404, detail="Tarjeta no encontrada")
+    tarjeta, cliente = _tarjeta_con_cliente(db, idTarjeta)
     if current_user["rol"] != "admin" and tarjeta.cuenta.idCliente != current_user["idCliente"]:
         raise HTTPException(status_code=403, detail="Sin permiso para bloquear esta tarjeta")
 
@@ -194,7 +210,6 @@ def bloquear_tarjeta(
     db.commit()
 
     # Notificar al cliente
-    cliente = db.query(models.Cliente).filter_by(idCliente=tarjeta.cuenta.idCliente).first()
     subject = "Tarjeta bloqueada"
     html_body = f"""
     <p>Estimado/a {cliente.primerNombre},</p>
@@ -225,16 +240,13 @@ def desbloquear_tarjeta(
     db: Session = Depends(get_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
-    tarjeta = db.query(models.Tarjeta).filter_by(idTarjeta=idTarjeta).first()
-    if not tarjeta:
-        raise HTTPException(status_code=404, detail="Tarjeta no encontrada")
+    tarjeta, cliente = _tarjeta_con_cliente(db, idTarjeta)
     if current_user["rol"] != "admin" and tarjeta.cuenta.idCliente != current_user["idCliente"]:
         raise HTTPException(status_code=403, detail="Sin permiso para desbloquear esta tarjeta")
 
     tarjeta.estado = models.EstadoTarjetaEnum.activa
     db.commit()
 
-    cliente = db.query(models.Cliente).filter_by(idCliente=tarjeta.cuenta.idCliente).first()
     subject = "Tarjeta desbloqueada"
     html_body = f"""
     <p>Estimado/a {cliente.primerNombre},</p>
@@ -282,9 +294,7 @@ def procesar_solicitud_tarjeta(
             detail="Solo el admin puede procesar solicitudes"
         )
 
-    tarjeta = db.query(models.Tarjeta).filter_by(idTarjeta=idTarjeta).first()
-    if not tarjeta:
-        raise HTTPException(status_code=404, detail="Tarjeta no encontrada")
+    tarjeta, cliente = _tarjeta_con_cliente(db, idTarjeta)
 
     if accion == "aprobar":
         if limiteCredito is None or fechaExpiracion is None:
@@ -301,12 +311,6 @@ def procesar_solicitud_tarjeta(
     db.commit()
     db.refresh(tarjeta)
 
-    cliente = (
-        db.query(models.Cliente)
-          .join(models.Cuenta)
-          .filter(models.Cuenta.idCuenta == tarjeta.idCuenta)
-          .first()
-    )
     subject = (
         "Solicitud de tarjeta APROBADA"
         if accion == "aprobar"
@@ -355,15 +359,10 @@ def cancelar_tarjeta(
     db: Session = Depends(get_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
-    tarjeta = db.query(models.Tarjeta).filter_by(idTarjeta=idTarjeta).first()
-    if not tarjeta:
-        raise HTTPException(status_code=404, detail="Tarjeta no encontrada")
+    tarjeta, cliente = _tarjeta_con_cliente(db, idTarjeta)
     if current_user["rol"] != "admin":
         raise HTTPException(status_code=403, detail="Solo el admin puede cancelar tarjetas")
 
-    cuenta = db.query(models.Cuenta).filter_by(idCuenta=tarjeta.idCuenta).first()
-    cliente = db.query(models.Cliente).filter_by(idCliente=cuenta.idCliente).first()
-
     db.delete(tarjeta)
     db.commit()
 
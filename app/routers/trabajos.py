@@ -0,0 +1,58 @@
+# app/routers/trabajos.py
+import json
+import os
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app import models
+from app.auth import get_current_user
+from app.database import get_db
+from app.schemas import TrabajoOut
+
+router = APIRouter(tags=["trabajos"])
+
+
+def _obtener_trabajo(db: Session, id_trabajo: int, user: dict) -> models.Trabajo:
+    trabajo = db.query(models.Trabajo).filter_by(idTrabajo=id_trabajo).first()
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if user["rol"] != "admin" and trabajo.username != user["username"]:
+        raise HTTPException(status_code=403, detail="No tiene permisos para ver este trabajo")
+    return trabajo
+
+
+@router.get("/jobs/{id_trabajo}", response_model=TrabajoOut)
+def obtener_trabajo(
+    id_trabajo: int,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user),
+):
+    trabajo = _obtener_trabajo(db, id_trabajo, user)
+    return TrabajoOut(
+        idTrabajo=trabajo.idTrabajo,
+        tipo=trabajo.tipo,
+        estado=trabajo.estado,
+        procesados=trabajo.procesados or 0,
+        total=trabajo.total,
+        fechaCreacion=trabajo.fechaCreacion,
+        fechaInicio=trabajo.fechaInicio,
+        fechaFin=trabajo.fechaFin,
+        resultado=json.loads(trabajo.resultado) if trabajo.resultado else None,
+        error=trabajo.error,
+    )
+
+
+@router.get("/jobs/{id_trabajo}/archivo")
+def descargar_archivo_trabajo(
+    id_trabajo: int,
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user),
+):
+    """Descarga el archivo generado por un trabajo de exportación."""
+    trabajo = _obtener_trabajo(db, id_trabajo, user)
+    archivo = json.loads(trabajo.resultado).get("archivo") if trabajo.resultado else None
+    if not archivo or not os.path.exists(archivo):
+        raise HTTPException(status_code=404, detail="El trabajo no tiene un archivo disponible")
+    return FileResponse(archivo, media_type="application/gzip", filename=os.path.basename(archivo))
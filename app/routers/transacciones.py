@@ -1,13 +1,16 @@
 # app/routers/transacciones.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, status
+from sqlalchemy.orm import Session, aliased, joinedload
 from datetime import datetime
 from decimal import Decimal
 from datetime import timezone
 from zoneinfo import ZoneInfo
-from app import models, schemas, auth, email_utils
+from app import cache_cuentas, models, schemas, auth, email_utils
 from app.database import SessionLocal
 from app.utils import generate_document_number, convert_currency
+from app.idempotencia import con_idempotencia
+from app.lotes import procesar_lote
+from app.respuestas import RespuestaJSON, validar_primera
 import os
 from app.schemas import TransaccionOut, TransaccionesListOut
 from typing import Optional, List
@@ -23,8 +26,27 @@ def get_db():
 @router.post("/transacciones", status_code=status.HTTP_201_CREATED)
 def create_transaccion(
     transaccion_data: schemas.TransaccionCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: dict = Depends(auth.get_current_user)
+    current_user: dict = Depends(auth.get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    return con_idempotencia(
+        db,
+        idempotency_key,
+        current_user["username"],
+        "POST /transacciones",
+        transaccion_data,
+        lambda: _crear_transaccion(transaccion_data, background_tasks, db, current_user),
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+def _crear_transaccion(
+    transaccion_data: schemas.TransaccionCreate,
+    background_tasks: BackgroundTasks,
+    db: Session,
+    current_user: dict,
 ):
     usuario = db.query(models.Usuario).filter(
         models.Usuario.username == current_user["username"]
@@ -69,7 +91,7 @@ def create_transaccion(
             descripcion=transaccion_data.descripcion
         )
         db.add(transaccion)
-        db.commit()
+        db.flush()
         db.refresh(transaccion)
 
         historial = models.Historial(
@@ -81,6 +103,7 @@ def create_transaccion(
         )
         db.add(historial)
         db.commit()
+        cache_cuentas.escribir(db, cuenta_origen.idCliente)
 
         cliente = db.query(models.Cliente).filter_by(idCliente=cuenta_origen.idCliente).first()
 
@@ -121,8 +144,8 @@ def create_transaccion(
         # Construye la ruta al logo (ajústala si tu Logo.png está en otra carpeta)
         logo_path = os.path.join(os.path.dirname(__file__), "..", "Logo.png")
 
-        # Envía el correo en HTML con logo inline
-        email_utils.send_email(subject, cliente.correo, html_body, logo_path=logo_path)
+        # El correo se envía después de responder: el movimiento ya está confirmado
+        background_tasks.add_task(email_utils.send_email, subject, cliente.correo, html_body, logo_path=logo_path)
 
         return {"mensaje": "Depósito realizado exitosamente", "transaccion": transaccion}
 
@@ -140,7 +163,7 @@ def create_transaccion(
             descripcion=transaccion_data.descripcion
         )
         db.add(transaccion)
-        db.commit()
+        db.flush()
         db.refresh(transaccion)
 
         historial = models.Historial(
@@ -152,6 +175,7 @@ def create_transaccion(
         )
         db.add(historial)
         db.commit()
+        cache_cuentas.escribir(db, cuenta_origen.idCliente)
 
         cliente = db.query(models.Cliente).filter_by(idCliente=cuenta_origen.idCliente).first()
 
@@ -192,8 +216,8 @@ def create_transaccion(
         # Construye la ruta al logo (ajústala si tu Logo.png está en otra carpeta)
         logo_path = os.path.join(os.path.dirname(__file__), "..", "Logo.png")
 
-        # Envía el correo en HTML con logo inline
-        email_utils.send_email(subject, cliente.correo, html_body, logo_path=logo_path)
+        # El correo se envía después de responder: el movimiento ya está confirmado
+        background_tasks.add_task(email_utils.send_email, subject, cliente.correo, html_body, logo_path=logo_path)
 
         return {"mensaje": "Depósito realizado exitosamente", "transaccion": transaccion}
 
@@ -211,7 +235,7 @@ def create_transaccion(
 
         if cuenta_origen.idMoneda != cuenta_destino.idMoneda:
 
-            monto_convertido = convert_currency(monto, cuenta_origen.idMoneda, cuenta_destino.idMoneda)
+            monto_convertido = convert_currency(db, monto, cuenta_origen.idMoneda, cuenta_destino.idMoneda)
 
         else:
 
@@ -249,7 +273,7 @@ def create_transaccion(
 
         db.add(transaccion)
 
-        db.commit()
+        db.flush()
 
         db.refresh(transaccion)
 
@@ -289,6 +313,7 @@ def create_transaccion(
         db.add_all([historial_origen, historial_destino])
 
         db.commit()
+        cache_cuentas.escribir(db, cuenta_origen.idCliente, cuenta_destino.idCliente)
 
         cliente_origen = db.query(models.Cliente).filter_by(idCliente=cuenta_origen.idCliente).first()
         cliente_destino = db.query(models.Cliente).filter_by(idCliente=cuenta_destino.idCliente).first()
@@ -368,9 +393,9 @@ def create_transaccion(
         # Ruta al logo
         logo_path = os.path.join(os.path.dirname(__file__), "..", "Logo.png")
 
-        # Envío de correos
-        email_utils.send_email(subject_enviado, cliente_origen.correo, html_enviado, logo_path=logo_path)
-        email_utils.send_email(subject_recibido, cliente_destino.correo, html_recibido, logo_path=logo_path)
+        # Envío de correos después de responder: la transferencia ya está confirmada
+        background_tasks.add_task(email_utils.send_email, subject_enviado, cliente_origen.correo, html_enviado, logo_path=logo_path)
+        background_tasks.add_task(email_utils.send_email, subject_recibido, cliente_destino.correo, html_recibido, logo_path=logo_path)
 
         return {
             "mensaje": "Transferencia realizada exitosamente",
@@ -384,6 +409,104 @@ def create_transaccion(
     raise HTTPException(status_code=400, detail="Tipo de transacción no válido")
 
 
+@router.post(
+    "/transacciones/lote",
+    response_model=schemas.LoteTransferenciaOut,
+    status_code=status.HTTP_201_CREATED,
+)
+def create_lote_transferencias(
+    lote_data: schemas.LoteTransferenciaCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(auth.get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """
+    Transferencias masivas (planillas) desde una cuenta. Cada línea se aplica o
+    se rechaza por separado y se envía un único correo resumen.
+    """
+    return con_idempotencia(
+        db,
+        idempotency_key,
+        current_user["username"],
+        "POST /transacciones/lote",
+        lote_data,
+        lambda: _crear_lote(lote_data, background_tasks, db, current_user),
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+def _crear_lote(
+    lote_data: schemas.LoteTransferenciaCreate,
+    background_tasks: BackgroundTasks,
+    db: Session,
+    current_user: dict,
+):
+    usuario = db.query(models.Usuario).filter(
+        models.Usuario.username == current_user["username"]
+    ).first()
+
+    resultado = procesar_lote(db, lote_data, usuario)
+    db.commit()
+    cache_cuentas.escribir(db, resultado.cuenta_origen.idCliente, *resultado.clientes_destino)
+
+    lote, cuenta_origen = resultado.lote, resultado.cuenta_origen
+    rechazadas = resultado.rechazadas
+
+    cliente = db.query(models.Cliente).filter_by(idCliente=cuenta_origen.idCliente).first()
+    if cliente and cliente.correo:
+        detalle_rechazos = "".join(
+            f"<li>Línea {l['linea']} – {l['idCuentaDestino']}: {l['motivo']}</li>"
+            for l in rechazadas[:20]
+        )
+        if len(rechazadas) > 20:
+            detalle_rechazos += f"<li>… y {len(rechazadas) - 20} más</li>"
+
+        subject = f"Banco M&R – Resumen de Transferencias por Lote #{lote.idLote}"
+        html_body = f"""
+        <html>
+          <body style="font-family:Arial,sans-serif; color:#333;">
+            <p>Estimado/a <strong>{cliente.primerNombre} {cliente.primerApellido}</strong>,</p>
+
+            <p>Se procesó el lote de transferencias <strong>#{lote.idLote}</strong> desde su cuenta
+            <strong>{cuenta_origen.numeroCuenta}</strong>:</p>
+
+            <ul>
+              <li><strong>Fecha y hora:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M')}</li>
+              <li><strong>Transferencias aplicadas:</strong> {lote.lineasAplicadas} de {lote.totalLineas}</li>
+              <li><strong>Monto total debitado:</strong> {lote.montoAplicado:,.2f}</li>
+              <li><strong>Saldo de la cuenta:</strong> {resultado.saldo_origen:,.2f}</li>
+            </ul>
+            {f"<p><strong>Líneas rechazadas:</strong></p><ul>{detalle_rechazos}</ul>" if rechazadas else ""}
+
+            <p>
+              Si usted no reconoce esta operación, por favor contáctenos de inmediato.
+            </p>
+
+            <br>
+            <p>Atentamente,<br>Equipo Banco M&amp;R</p>
+
+            <hr style="border:none; border-top:1px solid #eee; margin:40px 0;" />
+
+            <div style="text-align:center;">
+              <img src="cid:logo_cid" alt="Logo Banco M&R" style="width:120px;"/>
+            </div>
+          </body>
+        </html>
+        """
+        logo_path = os.path.join(os.path.dirname(__file__), "..", "Logo.png")
+        background_tasks.add_task(email_utils.send_email, subject, cliente.correo, html_body, logo_path=logo_path)
+
+    return {
+        "idLote": lote.idLote,
+        "lineasAplicadas": lote.lineasAplicadas,
+        "lineasRechazadas": len(rechazadas),
+        "montoAplicado": float(lote.montoAplicado),
+        "saldoOrigen": float(resultado.saldo_origen),
+        "lineas": resultado.lineas,
+    }
+
+
 @router.get("/transacciones", response_model=list[schemas.TransaccionOut])
 def listar_transacciones(
     numero_cuenta: str,
@@ -432,55 +555,48 @@ def listar_transacciones(
     db: Session = Depends(get_db),
     current_user: dict = Depends(auth.get_current_user)
 ):
-    # 1. Obtener y validar el usuario
-    usuario = db.query(models.Usuario).filter_by(username=current_user["username"]).first()
-    if not usuario:
-        raise HTTPException(status_code=403, detail="Usuario no válido")
-
-    # 2. Determinar rol (usuario.rol ya es un str)
-    rol_nombre = usuario.rol.lower()
-
-    # 3a. Si es admin, traer todas las transacciones
-    if rol_nombre == "admin":
-        transacciones = (
-            db.query(models.Transaccion)
-              .order_by(models.Transaccion.fecha.desc())
-              .all()
+    # 1. Rol del usuario (ya validado por get_current_user)
+    rol_nombre = current_user["rol"].lower()
+
+    # 2. Una sola consulta con los números de cuenta y el tipo ya resueltos
+    origen = aliased(models.Cuenta)
+    destino = aliased(models.Cuenta)
+    q = (
+        db.query(
+            models.Transaccion.numeroDocumento,
+            models.Transaccion.fecha,
+            origen.numeroCuenta.label("cuentaOrigen"),
+            destino.numeroCuenta.label("cuentaDestino"),
+            models.TipoTransaccion.nombre.label("tipoTransaccion"),
+            models.Transaccion.monto,
+            models.Transaccion.descripcion,
+        )
+        .join(models.TipoTransaccion,
+              models.TipoTransaccion.idTipoTransaccion == models.Transaccion.idTipoTransaccion)
+        .outerjoin(origen, origen.idCuenta == models.Transaccion.idCuentaOrigen)
+        .outerjoin(destino, destino.idCuenta == models.Transaccion.idCuentaDestino)
+    )
+
+    # 3. Si es cliente, sólo las de sus cuentas; el admin ve todas
+    if rol_nombre != "admin":
+        cuentas_ids = (
+            db.query(models.Cuenta.idCuenta)
+              .filter(models.Cuenta.idCliente == current_user["idCliente"])
+              .scalar_subquery()
         )
-    # 3b. Si es cliente, traer sólo las de sus cuentas
-    else:
-        cuentas = db.query(models.Cuenta).filter_by(idCliente=usuario.idCliente).all()
-        cuentas_ids = [c.idCuenta for c in cuentas]
-
-        transacciones = (
-            db.query(models.Transaccion)
-              .filter(
-                  (models.Transaccion.idCuentaOrigen.in_(cuentas_ids)) |
-                  (models.Transaccion.idCuentaDestino.in_(cuentas_ids))
-              )
-              .order_by(models.Transaccion.fecha.desc())
-              .all()
+        q = q.filter(
+            (models.Transaccion.idCuentaOrigen.in_(cuentas_ids)) |
+            (models.Transaccion.idCuentaDestino.in_(cuentas_ids))
         )
+    transacciones = q.order_by(models.Transaccion.fecha.desc()).all()
 
-    # 4. Construir lista de salida
-    lista = []
-    for t in transacciones:
-        cuenta_origen = db.query(models.Cuenta).get(t.idCuentaOrigen)
-        cuenta_destino = db.query(models.Cuenta).get(t.idCuentaDestino)
-
-        lista.append(TransaccionOut(
-            numeroDocumento=t.numeroDocumento,
-            fecha=t.fecha,
-            cuentaOrigen=cuenta_origen.numeroCuenta if cuenta_origen else None,
-            cuentaDestino=cuenta_destino.numeroCuenta if cuenta_destino else None,
-            tipoTransaccion=t.tipoTransaccion.nombre,
-            monto=float(t.monto),
-            descripcion=t.descripcion
-        ))
+    # 4. Las filas ya tienen la forma de TransaccionOut: se valida sólo la primera
+    lista = [t._asdict() for t in transacciones]
+    validar_primera(lista, TransaccionOut)
 
     # 5. Devolver username, rol y transacciones
-    return TransaccionesListOut(
-        username=usuario.username,
-        rol=usuario.rol,
-        transacciones=lista
-    )
\ No newline at end of file
+    return RespuestaJSON({
+        "username": current_user["username"],
+        "rol": current_user["rol"],
+        "transacciones": lista,
+    })
@@ -0,0 +1,207 @@
+# app/saldos_cierre.py
+"""
+Saldos de cierre de mes por cuenta y consulta de saldo a una fecha.
+
+El proceso de cierre guarda en `bcoma_saldocierre` el saldo de cada cuenta al
+último día del período junto con el último registro del historial incluido.
+El saldo a cualquier fecha se obtiene del cierre más cercano anterior más los
+movimientos posteriores a ese cierre, sin recorrer todo el historial.
+
+El saldo del historial es acumulado en el orden en que se registraron los
+movimientos, así que el "último registro" antes de una fecha es siempre el de
+mayor idCorrelativo, tanto en el cierre como en la consulta (aunque haya
+registros con fecha retroactiva). El cierre de un período se reemplaza en una
+sola transacción: quien consulte mientras corre ve el cierre anterior completo.
+
+Uso (por defecto el mes anterior):
+    python -m app.saldos_cierre --periodo 2025-04
+"""
+import argparse
+import logging
+import time as reloj
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal, engine
+
+logger = logging.getLogger("banco_mr.saldos_cierre")
+
+LOTE_POR_DEFECTO = 5000
+
+
+def _fin_de_dia(fecha: date) -> datetime:
+    return datetime.combine(fecha + timedelta(days=1), time.min)
+
+
+def ultimos_registros(db: Session, ids_cuentas: list, hasta: datetime, desde: Optional[datetime] = None) -> dict:
+    """idCuenta -> (idCorrelativo, saldo) del último registro del historial antes de `hasta`."""
+    if not ids_cuentas:
+        return {}
+    q = (
+        db.query(models.Historial.idCuenta, func.max(models.Historial.idCorrelativo))
+          .filter(models.Historial.idCuenta.in_(ids_cuentas), models.Historial.fecha < hasta)
+    )
+    if desde is not None:
+        q = q.filter(models.Historial.fecha >= desde)
+    ultimos = [id_corr for _, id_corr in q.group_by(models.Historial.idCuenta).all()]
+    if not ultimos:
+        return {}
+    filas = (
+        db.query(models.Historial.idCuenta, models.Historial.idCorrelativo, models.Historial.saldo)
+          .filter(models.Historial.idCorrelativo.in_(ultimos))
+          .all()
+    )
+    return {id_cuenta: (id_corr, saldo) for id_cuenta, id_corr, saldo in filas}
+
+
+def generar_cierre(db: Session, fin_periodo: date, lote: int = LOTE_POR_DEFECTO) -> dict:
+    """
+    Calcula el saldo de cierre de todas las cuentas a `fin_periodo`.
+    Volver a correrlo para la misma fecha reemplaza los saldos anteriores; el
+    borrado y todos los bloques se confirman juntos al final.
+    """
+    inicio = reloj.perf_counter()
+    inicio_periodo = fin_periodo.replace(day=1)
+    cierre_anterior = inicio_periodo - timedelta(days=1)
+    limite = _fin_de_dia(fin_periodo)
+
+    try:
+        procesadas = _reemplazar_cierre(db, fin_periodo, inicio_periodo, cierre_anterior, limite, lote)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    duracion = reloj.perf_counter() - inicio
+    return {
+        "fechaCorte": fin_periodo.isoformat(),
+        "cuentasProcesadas": procesadas,
+        "segundos": round(duracion, 3),
+        "filasPorSegundo": round(procesadas / duracion, 1) if duracion > 0 else 0.0,
+    }
+
+
+def _reemplazar_cierre(db: Session, fin_periodo: date, inicio_periodo: date, cierre_anterior: date,
+                       limite: datetime, lote: int) -> int:
+    """Borra e inserta por bloques los saldos del cierre, sin confirmar."""
+    db.query(models.SaldoCierre).filter(models.SaldoCierre.fechaCorte == fin_periodo) \
+      .delete(synchronize_session=False)
+
+    procesadas, ultimo_id = 0, 0
+    while True:
+        cuentas = (
+            db.query(models.Cuenta.idCuenta, models.Cuenta.saldoInicial)
+              .filter(models.Cuenta.idCuenta > ultimo_id)
+              .order_by(models.Cuenta.idCuenta)
+              .limit(lote)
+              .all()
+        )
+        if not cuentas:
+            break
+        ids = [c.idCuenta for c in cuentas]
+
+        # 1) Cuentas con movimientos en el período: último registro del mes
+        saldos = ultimos_registros(db, ids, limite, datetime.combine(inicio_periodo, time.min))
+
+        # 2) Sin movimientos en el mes: se arrastra el cierre anterior
+        pendientes = [i for i in ids if i not in saldos]
+        if pendientes:
+            anteriores = (
+                db.query(models.SaldoCierre.idCuenta, models.SaldoCierre.idCorrelativo, models.SaldoCierre.saldo)
+                  .filter(
+                      models.SaldoCierre.idCuenta.in_(pendientes),
+                      models.SaldoCierre.fechaCorte == cierre_anterior,
+                  )
+                  .all()
+            )
+            saldos.update({i: (id_corr, saldo) for i, id_corr, saldo in anteriores})
+
+        # 3) Primer cierre de la cuenta: se busca en todo el historial anterior
+        pendientes = [i for i in ids if i not in saldos]
+        saldos.update(ultimos_registros(db, pendientes, limite))
+
+        filas = []
+        for cuenta in cuentas:
+            id_corr, saldo = saldos.get(cuenta.idCuenta, (None, cuenta.saldoInicial or 0))
+            filas.append({
+                "idCuenta": cuenta.idCuenta,
+                "fechaCorte": fin_periodo,
+                "saldo": saldo,
+                "idCorrelativo": id_corr,
+            })
+        db.execute(insert(models.SaldoCierre), filas)
+
+        procesadas += len(filas)
+        ultimo_id = ids[-1]
+        logger.info(f"Cierre {fin_periodo}: {procesadas} cuentas procesadas")
+    return procesadas
+
+
+def saldo_a_fecha(db: Session, cuenta: models.Cuenta, fecha: date) -> dict:
+    """Saldo de la cuenta al final del día `fecha`."""
+    cierre = (
+        db.query(models.SaldoCierre)
+          .filter(models.SaldoCierre.idCuenta == cuenta.idCuenta, models.SaldoCierre.fechaCorte <= fecha)
+          .order_by(models.SaldoCierre.fechaCorte.desc())
+          .first()
+    )
+
+    # Último movimiento entre el cierre y la fecha consultada
+    q = (
+        db.query(models.Historial.saldo)
+          .filter(models.Historial.idCuenta == cuenta.idCuenta, models.Historial.fecha < _fin_de_dia(fecha))
+    )
+    if cierre:
+        q = q.filter(models.Historial.fecha >= _fin_de_dia(cierre.fechaCorte))
+    # El mismo criterio que `ultimos_registros`: el saldo es acumulado por idCorrelativo
+    ultimo = q.order_by(models.Historial.idCorrelativo.desc()).first()
+
+    if ultimo:
+        saldo = ultimo.saldo
+    elif cierre:
+        saldo = cierre.saldo
+    else:
+        saldo = cuenta.saldoInicial or 0
+
+    return {
+        "numeroCuenta": cuenta.numeroCuenta,
+        "fecha": fecha,
+        "saldo": float(saldo),
+        "fechaCierreBase": cierre.fechaCorte if cierre else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Saldos de cierre de mes por cuenta")
+    parser.add_argument("--periodo", help="Mes a cerrar (YYYY-MM); por defecto el mes anterior")
+    parser.add_argument("--lote", type=int, default=LOTE_POR_DEFECTO, help="Cuentas por bloque")
+    args = parser.parse_args()
+
+    if args.periodo:
+        inicio_mes = date.fromisoformat(f"{args.periodo}-01")
+    else:
+        inicio_mes = date.today().replace(day=1) - relativedelta(months=1)
+    fin_periodo = inicio_mes + relativedelta(months=1) - timedelta(days=1)
+
+    logging.basicConfig(level=logging.INFO)
+    engine.echo = False
+
+    db = SessionLocal()
+    try:
+        resumen = generar_cierre(db, fin_periodo, args.lote)
+    finally:
+        db.close()
+
+    print(
+        f"Cierre al {resumen['fechaCorte']}: {resumen['cuentasProcesadas']} cuentas en "
+        f"{resumen['segundos']}s ({resumen['filasPorSegundo']} filas/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
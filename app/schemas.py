@@ -62,6 +62,56 @@ class TransaccionCreate(BaseModel):
     descripcion: Optional[str] = None
     idCuentaDestino: Optional[str] = None
 
+class LineaLoteIn(BaseModel):
+    idCuentaDestino: str
+    monto: Decimal = Field(..., gt=0, description="Monto a transferir, en la moneda de la cuenta origen")
+    descripcion: Optional[str] = None
+
+class LoteTransferenciaCreate(BaseModel):
+    idCuentaOrigen: str
+    descripcion: Optional[str] = None
+    lineas: List[LineaLoteIn] = Field(..., min_length=1, max_length=5000)
+
+class LineaLoteOut(BaseModel):
+    linea: int
+    idCuentaDestino: str
+    monto: float
+    estado: Literal["APLICADA", "RECHAZADA"]
+    motivo: Optional[str] = None
+    numeroDocumento: Optional[str] = None
+
+class LoteTransferenciaOut(BaseModel):
+    idLote: int
+    lineasAplicadas: int
+    lineasRechazadas: int
+    montoAplicado: float
+    saldoOrigen: float
+    lineas: List[LineaLoteOut]
+
+class MovimientoEstadoCuentaOut(BaseModel):
+    fecha: Optional[datetime] = None
+    numeroDocumento: Optional[str] = None
+    tipoTransaccion: str
+    descripcion: Optional[str] = None
+    credito: float
+    debito: float
+    saldo: float
+
+class EstadoCuentaOut(BaseModel):
+    numeroCuenta: str
+    moneda: Optional[str] = None
+    desde: date
+    hasta: date
+    saldoInicial: float
+    movimientos: List[MovimientoEstadoCuentaOut]
+    saldoFinal: float
+
+class SaldoFechaOut(BaseModel):
+    numeroCuenta: str
+    fecha: date
+    saldo: float
+    fechaCierreBase: Optional[date] = None
+
 class SolicitudPrestamo(BaseModel):
     idInstitucion: int = Field(..., gt=0, description="ID válido de institución")
     idTipoPrestamo: int = Field(..., gt=0, description="ID válido de tipo de préstamo")
@@ -75,6 +125,13 @@ class AprobacionPrestamo(BaseModel):
     numeroPrestamo: str
     aprobar: bool
 
+class AprobacionPrestamoLote(BaseModel):
+    numerosPrestamo: List[str] = Field(..., min_length=1, max_length=1000)
+    aprobar: bool
+
+class DesactivacionUsuariosLote(BaseModel):
+    idsUsuarios: List[int] = Field(..., min_length=1, max_length=100000)
+
 class PagoPrestamo(BaseModel):
     numeroPrestamo: str
     montoPago: float
@@ -163,6 +220,25 @@ class PrestamoOut(BaseModel):
     class Config:
         orm_mode = True
 
+class CarteraFilaOut(BaseModel):
+    idInstitucion: int
+    institucion: Optional[str] = None
+    idTipoPrestamo: int
+    tipoPrestamo: Optional[str] = None
+    idMoneda: int
+    moneda: Optional[str] = None
+    prestamos: int
+    saldoTotal: float
+    alDia: float
+    de1a30: float
+    de31a60: float
+    de61a90: float
+    mas90: float
+
+class ReporteCarteraOut(BaseModel):
+    fechaCorte: date
+    filas: List[CarteraFilaOut]
+
 class SoporteCambioEstadoCuenta(BaseModel):
     nuevo_estado: int = Field(..., description="1=activo, 2=inactivo")
 
@@ -235,4 +311,17 @@ class TarjetaAprobacion(BaseModel):
     class Config:
         schema_extra = {
             "example": { "limiteCredito": 10000.00 }
-        }
\ No newline at end of file
+        }
+
+
+class TrabajoOut(BaseModel):
+    idTrabajo: int
+    tipo: str
+    estado: str
+    procesados: int = 0
+    total: Optional[int] = None
+    fechaCreacion: Optional[datetime] = None
+    fechaInicio: Optional[datetime] = None
+    fechaFin: Optional[datetime] = None
+    resultado: Optional[dict] = None
+    error: Optional[str] = None
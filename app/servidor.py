@@ -0,0 +1,74 @@
+# app/servidor.py
+"""
+Punto de entrada de producción: uvicorn con varios procesos trabajadores.
+
+Todo se configura con variables de entorno:
+  - WEB_CONCURRENCY: procesos trabajadores (por defecto, uno por núcleo)
+  - HILOS_POR_TRABAJADOR: tamaño del threadpool donde corren los endpoints
+    síncronos, en cada trabajador (por defecto 40, el de AnyIO); se reparte
+    entre clases de rutas con HILOS_DINERO y HILOS_REPORTES (ver `app.hilos`),
+    y el trabajador no arranca si el resto queda por debajo de
+    HILOS_GENERAL_MINIMO
+  - KEEP_ALIVE_SEGUNDOS: tiempo que se mantiene abierta una conexión inactiva
+  - MAX_SOLICITUDES / MAX_SOLICITUDES_VARIACION: un trabajador se recicla
+    tras atender esa cantidad de solicitudes (más un extra aleatorio de hasta
+    la variación, para que no se reinicien todos a la vez); 0 = nunca
+  - DB_CONEXIONES_TOTALES: presupuesto de conexiones de la base, repartido
+    entre los trabajadores (ver `app.database`)
+  - FORWARDED_ALLOW_IPS: proxies cuyo X-Forwarded-For se acepta como IP del
+    cliente (por defecto 127.0.0.1); detrás de un proxy sin dirección fija se
+    usa PROXIES_CONFIABLES (ver `app.limite_login`)
+
+    python -m app.servidor
+
+Los trabajadores se crean con spawn e importan la aplicación por su cuenta, así
+que cada uno arma su propio engine y su pool. Si se sirve con un gestor que
+hace fork después de importar la app (gunicorn --preload), `app.database`
+descarta en el hijo las conexiones heredadas.
+"""
+import logging
+import os
+
+logger = logging.getLogger("banco_mr.servidor")
+
+
+def configurar_trabajador():
+    """Se llama al iniciar cada trabajador (lifespan de `app.main`)."""
+    from app import hilos
+    from app.database import opciones_pool
+
+    hilos.configurar()
+    # El threadpool real es la suma de los cupos de cada clase
+    total_hilos = sum(l.total_tokens for l in hilos.limitadores.values())
+    tamano_pool = opciones_pool().get("pool_size")
+    if tamano_pool and total_hilos > tamano_pool:
+        logger.warning(
+            f"{total_hilos} hilos y {tamano_pool} conexiones por trabajador: "
+            "las solicitudes que no alcancen conexión esperarán en el pool"
+        )
+
+
+def main():
+    import uvicorn
+
+    trabajadores = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+    # Los trabajadores heredan el entorno: `app.database` reparte el pool con este valor
+    os.environ["WEB_CONCURRENCY"] = str(trabajadores)
+
+    uvicorn.run(
+        "app.main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=trabajadores,
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_SEGUNDOS", "5")),
+        limit_max_requests=int(os.getenv("MAX_SOLICITUDES", "0")) or None,
+        limit_max_requests_jitter=int(os.getenv("MAX_SOLICITUDES_VARIACION", "0")),
+        proxy_headers=True,
+        # Sólo se cree a X-Forwarded-For si la conexión viene de un proxy conocido
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        access_log=os.getenv("ACCESS_LOG", "0") == "1",
+    )
+
+
+if __name__ == "__main__":
+    main()
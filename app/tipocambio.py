@@ -0,0 +1,150 @@
+# app/tipocambio.py
+"""
+Tipos de cambio históricos y matriz de conversión en memoria.
+
+`bcoma_tipocambio` guarda cuántos quetzales vale una unidad de cada moneda a
+partir de una fecha de vigencia. Al cargar se precalcula, para cada fecha en
+que cambió alguna tasa, la matriz completa de tasas cruzadas; convertir un
+monto es entonces una búsqueda binaria por fecha y una multiplicación, sin
+consultar la base de datos.
+
+La matriz forma parte de la caché de catálogos y se recarga con ella cuando
+cambia la versión. Registrar una tasa nueva:
+    python -m app.tipocambio --moneda 2 --fecha 2025-06-01 --tasa 7.72
+"""
+from bisect import bisect_right
+from datetime import date
+from decimal import Decimal
+from typing import Iterable, Optional, Sequence, Union
+
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Tasas usadas cuando no hay ningún registro vigente para una moneda
+TASAS_QUETZAL = {
+    1: "1.0",   # Quetzal
+    2: "7.7",   # Dólar (1 USD = 7.7 GTQ)
+    3: "8.5",   # Euro (1 EUR = 8.5 GTQ)
+}
+
+
+class MatrizTipoCambio:
+    def __init__(self, registros: Iterable = ()):
+        """
+        `registros` son tuplas (idMoneda, fechaVigencia, tasa en quetzales).
+        """
+        tasas = {id_moneda: Decimal(tasa) for id_moneda, tasa in TASAS_QUETZAL.items()}
+        por_fecha = {}
+        for id_moneda, fecha, tasa in registros:
+            por_fecha.setdefault(fecha, {})[id_moneda] = Decimal(tasa)
+
+        # La primera entrada (date.min) son las tasas por defecto
+        self.fechas = [date.min]
+        self.matrices = [self._cruzar(tasas)]
+        for fecha in sorted(por_fecha):
+            tasas = {**tasas, **por_fecha[fecha]}
+            self.fechas.append(fecha)
+            self.matrices.append(self._cruzar(tasas))
+
+    @staticmethod
+    def _cruzar(tasas: dict) -> dict:
+        # Se guarda el par (tasa origen, tasa destino) en lugar del cociente para
+        # convertir como monto * origen / destino sin perder precisión decimal
+        return {
+            (origen, destino): (tasas[origen], tasas[destino])
+            for origen in tasas
+            for destino in tasas
+        }
+
+    def _par(self, indice: int, origen: int, destino: int) -> tuple:
+        try:
+            return self.matrices[indice][(origen, destino)]
+        except KeyError:
+            raise ValueError("Moneda no soportada para la conversión")
+
+    def tasa(self, origen: int, destino: int, fecha: Optional[date] = None) -> Decimal:
+        """Tasa para convertir de `origen` a `destino` vigente en `fecha` (hoy si se omite)."""
+        numerador, denominador = self._par(bisect_right(self.fechas, fecha or date.today()) - 1, origen, destino)
+        return numerador / denominador
+
+    def convertir(self, monto: Decimal, origen: int, destino: int, fecha: Optional[date] = None) -> Decimal:
+        # Se valida el par aunque sea la misma moneda: una moneda no soportada es un error
+        numerador, denominador = self._par(bisect_right(self.fechas, fecha or date.today()) - 1, origen, destino)
+        if origen == destino:
+            return monto
+        return monto * numerador / denominador
+
+    def convertir_lote(
+        self,
+        montos: Sequence[Decimal],
+        origen: int,
+        destino: int,
+        fechas: Union[None, date, Sequence[date]] = None,
+    ) -> list:
+        """
+        Convierte una lista de montos (reportes). `fechas` puede ser una sola
+        fecha para todos o una fecha por monto; la tasa cruzada de cada fecha
+        de vigencia distinta se resuelve una sola vez.
+        """
+        if fechas is None or isinstance(fechas, date):
+            numerador, denominador = self._par(bisect_right(self.fechas, fechas or date.today()) - 1, origen, destino)
+            if origen == destino:
+                return list(montos)
+            return [monto * numerador / denominador for monto in montos]
+
+        if len(fechas) != len(montos):
+            raise ValueError("Se requiere una fecha por cada monto")
+        indices = [bisect_right(self.fechas, fecha) - 1 for fecha in fechas]
+        pares = {indice: self._par(indice, origen, destino) for indice in set(indices)}
+        if origen == destino:
+            return list(montos)
+        return [
+            monto * pares[indice][0] / pares[indice][1]
+            for monto, indice in zip(montos, indices)
+        ]
+
+
+def cargar_matriz(db: Session) -> MatrizTipoCambio:
+    registros = db.query(
+        models.TipoCambio.idMoneda,
+        models.TipoCambio.fechaVigencia,
+        models.TipoCambio.tasa,
+    ).all()
+    return MatrizTipoCambio(registros)
+
+
+def registrar_tipo_cambio(db: Session, id_moneda: int, fecha: date, tasa: Decimal) -> models.TipoCambio:
+    """Guarda (o corrige) la tasa de una moneda e invalida la caché en todos los procesos."""
+    from app.catalogos import incrementar_version
+
+    registro = (
+        db.query(models.TipoCambio)
+          .filter_by(idMoneda=id_moneda, fechaVigencia=fecha)
+          .first()
+    )
+    if not registro:
+        registro = models.TipoCambio(idMoneda=id_moneda, fechaVigencia=fecha)
+        db.add(registro)
+    registro.tasa = tasa
+    incrementar_version(db)  # hace commit
+    return registro
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Registrar un tipo de cambio")
+    parser.add_argument("--moneda", type=int, required=True, help="idMoneda")
+    parser.add_argument("--fecha", type=date.fromisoformat, default=date.today(), help="Fecha de vigencia")
+    parser.add_argument("--tasa", type=Decimal, required=True, help="Quetzales por unidad de la moneda")
+    args = parser.parse_args()
+
+    sesion = SessionLocal()
+    try:
+        registrar_tipo_cambio(sesion, args.moneda, args.fecha, args.tasa)
+    finally:
+        sesion.close()
+    print(f"Tipo de cambio registrado: moneda {args.moneda} = Q{args.tasa} desde {args.fecha}")
@@ -0,0 +1,295 @@
+# app/trabajos.py
+"""
+Cola de trabajos en segundo plano respaldada por `bcoma_trabajo`.
+
+Los endpoints encolan operaciones largas (desactivación masiva de usuarios,
+aprobación de préstamos por lote, exportaciones) y responden de inmediato con
+el id del trabajo; el estado y el avance (procesados de total) se consultan en
+GET /jobs/{id}. Cada tarea registra su avance por bloque con `avance`, en un
+commit corto propio, mientras el trabajo sigue EN_PROCESO. Los trabajadores
+toman los pendientes con SELECT ... FOR UPDATE SKIP LOCKED, de modo que varios
+procesos pueden atender la misma cola sin tomar dos veces el mismo trabajo.
+
+Un trabajo que queda EN_PROCESO más de TRABAJOS_ABANDONO_SEGUNDOS (el proceso
+murió a mitad) se devuelve a PENDIENTE una vez y, si vuelve a quedar abandonado,
+se marca FALLIDO. Las tareas vuelven a revisar el estado de cada registro, así
+que repetirlas no aplica dos veces la misma operación. Los trabajadores hacen
+esta revisión periódicamente; también puede lanzarse a mano.
+
+Iniciar los trabajadores:
+    python -m app.trabajos --procesos 2
+Recuperar trabajos abandonados:
+    python -m app.trabajos --recuperar
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app import models
+from app.aprobaciones import notificar_aprobacion, procesar_aprobacion
+from app.database import SessionLocal, engine
+from app.exportacion import comprimir_gzip, generar_exportacion
+
+logger = logging.getLogger("banco_mr.trabajos")
+
+PENDIENTE = "PENDIENTE"
+EN_PROCESO = "EN_PROCESO"
+COMPLETADO = "COMPLETADO"
+FALLIDO = "FALLIDO"
+
+DIRECTORIO_EXPORTACIONES = Path(os.getenv("EXPORTACIONES_DIR", "exportaciones"))
+FILAS_POR_BLOQUE = 1000
+# Cada cuántos préstamos se registra el avance de una aprobación por lote
+PRESTAMOS_POR_AVANCE = 50
+# Debe superar la duración del trabajo más largo (exportaciones completas)
+ABANDONO_SEGUNDOS = int(os.getenv("TRABAJOS_ABANDONO_SEGUNDOS", "1800"))
+REVISION_ABANDONADOS_SEGUNDOS = 60
+NOTA_ABANDONO = "Reencolado: el trabajador {} no terminó el trabajo"
+
+# tipo de trabajo -> función(db, trabajo, **parametros) que devuelve el resultado
+TAREAS = {}
+
+
+def tarea(tipo: str):
+    """Registra una función como tarea ejecutable por los trabajadores."""
+    def registrar(funcion: Callable) -> Callable:
+        TAREAS[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar(db: Session, tipo: str, parametros: dict, username: str) -> models.Trabajo:
+    if tipo not in TAREAS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    trabajo = models.Trabajo(
+        tipo=tipo,
+        parametros=json.dumps(parametros, ensure_ascii=False),
+        estado=PENDIENTE,
+        username=username,
+    )
+    db.add(trabajo)
+    db.commit()
+    db.refresh(trabajo)
+    return trabajo
+
+
+def reclamar(db: Session, trabajador: str) -> Optional[models.Trabajo]:
+    """Toma el trabajo pendiente más antiguo que no esté bloqueado por otro trabajador."""
+    trabajo = (
+        db.query(models.Trabajo)
+          .filter(models.Trabajo.estado == PENDIENTE)
+          .order_by(models.Trabajo.idTrabajo)
+          .with_for_update(skip_locked=True)
+          .first()
+    )
+    if not trabajo:
+        db.rollback()
+        return None
+    trabajo.estado = EN_PROCESO
+    trabajo.trabajador = trabajador
+    trabajo.fechaInicio = datetime.utcnow()
+    trabajo.procesados = 0
+    db.commit()
+    return trabajo
+
+
+def avance(db: Session, trabajo: models.Trabajo, procesados: int, total: Optional[int] = None):
+    """
+    Registra cuánto lleva el trabajo. Hace commit: se llama entre bloques, cuando
+    la tarea ya confirmó (o no tiene) su propio trabajo pendiente.
+    """
+    valores = {"procesados": procesados}
+    if total is not None:
+        valores["total"] = total
+    db.query(models.Trabajo).filter(models.Trabajo.idTrabajo == trabajo.idTrabajo) \
+      .update(valores, synchronize_session=False)
+    db.commit()
+
+
+def recuperar_abandonados(db: Session, segundos: int = ABANDONO_SEGUNDOS) -> dict:
+    """Reencola (o marca FALLIDO si ya se reencoló) los trabajos EN_PROCESO vencidos."""
+    limite = datetime.utcnow() - timedelta(seconds=segundos)
+    vencidos = db.query(models.Trabajo).filter(
+        models.Trabajo.estado == EN_PROCESO,
+        models.Trabajo.fechaInicio < limite,
+    )
+    fallidos = vencidos.filter(models.Trabajo.error.isnot(None)).update(
+        {"estado": FALLIDO, "fechaFin": datetime.utcnow()}, synchronize_session=False
+    )
+    reencolados = 0
+    for id_trabajo, trabajador in (
+        vencidos.filter(models.Trabajo.error.is_(None))
+                .with_entities(models.Trabajo.idTrabajo, models.Trabajo.trabajador).all()
+    ):
+        # Condicionado al estado: si el trabajador terminó entretanto no se toca
+        reencolados += db.query(models.Trabajo).filter(
+            models.Trabajo.idTrabajo == id_trabajo,
+            models.Trabajo.estado == EN_PROCESO,
+        ).update(
+            {"estado": PENDIENTE, "trabajador": None, "fechaInicio": None, "procesados": 0,
+             "error": NOTA_ABANDONO.format(trabajador)},
+            synchronize_session=False,
+        )
+    db.commit()
+    if fallidos or reencolados:
+        logger.warning(f"Trabajos abandonados: {reencolados} reencolados, {fallidos} fallidos")
+    return {"reencolados": reencolados, "fallidos": fallidos}
+
+
+def ejecutar(db: Session, trabajo: models.Trabajo):
+    parametros = json.loads(trabajo.parametros or "{}")
+    try:
+        resultado = TAREAS[trabajo.tipo](db, trabajo, **parametros)
+    except Exception as e:
+        db.rollback()
+        logger.exception(f"Trabajo {trabajo.idTrabajo} ({trabajo.tipo}) falló")
+        trabajo.estado = FALLIDO
+        trabajo.error = str(e)
+    else:
+        trabajo.estado = COMPLETADO
+        trabajo.error = None
+        trabajo.resultado = json.dumps(resultado, ensure_ascii=False, default=str)
+    trabajo.fechaFin = datetime.utcnow()
+    db.commit()
+
+
+def trabajar(nombre: str, espera: float = 2.0, una_vez: bool = False):
+    """Ciclo de un trabajador: toma y ejecuta trabajos hasta que no queden (si `una_vez`)."""
+    # Tras el fork cada proceso abre sus propias conexiones
+    engine.dispose(close=False)
+    ultima_revision = None
+    while True:
+        db = SessionLocal()
+        try:
+            if ultima_revision is None or time.monotonic() - ultima_revision >= REVISION_ABANDONADOS_SEGUNDOS:
+                recuperar_abandonados(db)
+                ultima_revision = time.monotonic()
+            trabajo = reclamar(db, nombre)
+            if trabajo:
+                logger.info(f"{nombre}: ejecutando trabajo {trabajo.idTrabajo} ({trabajo.tipo})")
+                ejecutar(db, trabajo)
+        finally:
+            db.close()
+        if not trabajo:
+            if una_vez:
+                return
+            time.sleep(espera)
+
+
+def _en_bloques(filas: list):
+    for i in range(0, len(filas), FILAS_POR_BLOQUE):
+        yield filas[i:i + FILAS_POR_BLOQUE]
+
+
+@tarea("desactivar_usuarios")
+def desactivar_usuarios(db: Session, trabajo: models.Trabajo, idsUsuarios: list) -> dict:
+    """Desactiva los usuarios y todas las cuentas de sus clientes, por bloques."""
+    usuarios = cuentas = revisados = 0
+    avance(db, trabajo, 0, len(idsUsuarios))
+    for bloque in _en_bloques(idsUsuarios):
+        activos = models.Usuario.idUsuario.in_(bloque), models.Usuario.estado != 2
+        clientes = [
+            id_cliente for (id_cliente,) in db.query(models.Usuario.idCliente).filter(*activos)
+            if id_cliente is not None
+        ]
+        usuarios += db.query(models.Usuario).filter(*activos) \
+                      .update({"estado": 2}, synchronize_session=False)
+        if clientes:
+            cuentas += db.query(models.Cuenta) \
+                         .filter(models.Cuenta.idCliente.in_(clientes), models.Cuenta.idEstadoCuenta != 2) \
+                         .update({"idEstadoCuenta": 2}, synchronize_session=False)
+        db.commit()
+        revisados += len(bloque)
+        avance(db, trabajo, revisados)
+    return {"usuariosDesactivados": usuarios, "cuentasDesactivadas": cuentas}
+
+
+@tarea("aprobar_prestamos")
+def aprobar_prestamos(db: Session, trabajo: models.Trabajo, numerosPrestamo: list, aprobar: bool) -> dict:
+    """Aprueba o rechaza cada préstamo en su propia transacción y notifica al cliente."""
+    procesados, errores = 0, []
+    avance(db, trabajo, 0, len(numerosPrestamo))
+    for revisados, numero in enumerate(numerosPrestamo, 1):
+        try:
+            resultado = procesar_aprobacion(db, numero, aprobar)
+            db.commit()
+        except HTTPException as e:
+            db.rollback()
+            errores.append({"numeroPrestamo": numero, "detalle": e.detail})
+        else:
+            procesados += 1
+            notificar_aprobacion(db, resultado)
+        if revisados % PRESTAMOS_POR_AVANCE == 0 or revisados == len(numerosPrestamo):
+            avance(db, trabajo, revisados)
+    return {"procesados": procesados, "errores": errores}
+
+
+@tarea("exportacion")
+def exportar(db: Session, trabajo: models.Trabajo, entidad: str, formato: str,
+             desde: Optional[str] = None) -> dict:
+    """Genera la exportación comprimida en el directorio de exportaciones (sin total: avanza por filas)."""
+    DIRECTORIO_EXPORTACIONES.mkdir(parents=True, exist_ok=True)
+    archivo = DIRECTORIO_EXPORTACIONES / f"{entidad}_{trabajo.idTrabajo}.{formato}.gz"
+    contenido = generar_exportacion(
+        entidad, formato, datetime.fromisoformat(desde) if desde else None,
+        avance=lambda filas: avance(db, trabajo, filas),
+    )
+    tamanio = 0
+    with open(archivo, "wb") as salida:
+        for parte in comprimir_gzip(contenido):
+            salida.write(parte)
+            tamanio += len(parte)
+    return {"archivo": str(archivo), "bytes": tamanio}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trabajadores de la cola de trabajos")
+    parser.add_argument("--procesos", type=int, default=1, help="Cantidad de procesos trabajadores")
+    parser.add_argument("--espera", type=float, default=2.0, help="Segundos entre consultas si la cola está vacía")
+    parser.add_argument("--una-vez", action="store_true", help="Terminar cuando no queden trabajos pendientes")
+    parser.add_argument("--recuperar", action="store_true",
+                        help="Sólo recuperar los trabajos abandonados EN_PROCESO y terminar")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    engine.echo = False
+
+    if args.recuperar:
+        db = SessionLocal()
+        try:
+            print(json.dumps(recuperar_abandonados(db)))
+        finally:
+            db.close()
+        return
+
+    prefijo = f"{socket.gethostname()}:{os.getpid()}"
+    if args.procesos == 1:
+        trabajar(f"{prefijo}-1", args.espera, args.una_vez)
+        return
+
+    procesos = [
+        multiprocessing.Process(target=trabajar, args=(f"{prefijo}-{i}", args.espera, args.una_vez))
+        for i in range(1, args.procesos + 1)
+    ]
+    for p in procesos:
+        p.start()
+    try:
+        for p in procesos:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procesos:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,70 @@
 # app/utils.py
 from app import models
+from app.catalogos import cache as catalogos
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from datetime import date
 from decimal import Decimal
 from dateutil.relativedelta import relativedelta
-from typing import List
+from typing import List, Optional, Sequence, Union
 from datetime import datetime
 
+def _siguiente_correlativo(db: Session, columna, prefix: str) -> int:
+    """
+    Siguiente correlativo de `prefix` + número de al menos 4 dígitos, con una
+    consulta por cantidad de dígitos (una sola hasta llegar a 9999). Dentro de
+    un mismo ancho el máximo textual es el máximo numérico; los documentos de
+    transferencias por lote (prefijo + "L" + ...) son más largos y no entran.
+    """
+    ancho = 4
+    while True:
+        ultimo = db.query(func.max(columna)).filter(columna.like(prefix + "_" * ancho)).scalar()
+        sufijo = ultimo[len(prefix):] if ultimo else ""
+        if not sufijo.isdigit():
+            return 1 if ancho == 4 else 10 ** (ancho - 1)
+        if sufijo != "9" * ancho:
+            return int(sufijo) + 1
+        ancho += 1
+
 def generate_account_number(db, idTipoCuenta: int, idMoneda: int) -> str:
-    tipo_code = {1: "MT", 2: "AH"}.get(idTipoCuenta, "OT")
-    moneda_code = {1: "Q", 2: "D", 3: "E"}.get(idMoneda, "X")
+    tipo_code = catalogos.codigos_tipo_cuenta.get(idTipoCuenta, "OT")
+    moneda_code = catalogos.codigos_moneda.get(idMoneda, "X")
     prefix = f"{tipo_code}{moneda_code}"
-    n = 1
-    while db.query(models.Cuenta).filter(models.Cuenta.numeroCuenta == f"{prefix}{n:04d}").first():
-        n += 1
+    n = _siguiente_correlativo(db, models.Cuenta.numeroCuenta, prefix)
     return f"{prefix}{n:04d}"
 
 def generate_document_number(db, idTipoTransaccion: int, idMoneda: int) -> str:
-    tipo_code = {1: "DEP", 2: "RET", 3: "TRA"}.get(idTipoTransaccion, "OTR")
-    moneda_code = {1: "Q", 2: "D", 3: "E"}.get(idMoneda, "X")
+    tipo_code = catalogos.codigos_tipo_transaccion.get(idTipoTransaccion, "OTR")
+    moneda_code = catalogos.codigos_moneda.get(idMoneda, "X")
     prefix = f"{tipo_code}{moneda_code}"
-    n = 1
-    while db.query(models.Transaccion).filter(models.Transaccion.numeroDocumento == f"{prefix}{n:04d}").first():
-        n += 1
+    n = _siguiente_correlativo(db, models.Transaccion.numeroDocumento, prefix)
     return f"{prefix}{n:04d}"
 
-def convert_currency(amount: Decimal, source_currency: int, dest_currency: int) -> Decimal:
-    rates = {
-        1: Decimal("1.0"),   # Quetzal
-        2: Decimal("7.7"),   # Dólar (1 USD = 7.7 GTQ)
-        3: Decimal("8.5"),   # Euro (1 EUR = 8.5 GTQ)
-    }
-
-    if source_currency not in rates or dest_currency not in rates:
-        raise ValueError("Moneda no soportada para la conversión")
+def convert_currency(
+    db: Session,
+    amount: Decimal,
+    source_currency: int,
+    dest_currency: int,
+    rate_date: Optional[date] = None
+) -> Decimal:
+    """
+    Convierte `amount` con el tipo de cambio vigente en `rate_date` (hoy si se omite).
+    La matriz se toma de la caché de catálogos, que se recarga si cambió su versión.
+    """
+    return catalogos.vigente(db).tipos_cambio.convertir(amount, source_currency, dest_currency, rate_date)
 
-    amount_in_quetzales = amount * rates[source_currency]
-    return amount_in_quetzales / rates[dest_currency]
+def convert_currency_batch(
+    db: Session,
+    amounts: Sequence[Decimal],
+    source_currency: int,
+    dest_currency: int,
+    rate_dates: Union[None, date, Sequence[date]] = None
+) -> list:
+    """
+    Convierte una lista de montos de una vez (reportes). `rate_dates` es una fecha
+    para todos o una por monto; cada tasa distinta se resuelve una sola vez.
+    """
+    return catalogos.vigente(db).tipos_cambio.convertir_lote(amounts, source_currency, dest_currency, rate_dates)
 
 def generar_numero_prestamo(db: Session) -> str:
     last = db.query(models.PrestamoEncabezado).order_by(models.PrestamoEncabezado.idPrestamoEnc.desc()).first()
@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+"""
+Benchmarks de la API. Cada módulo se ejecuta con `python -m benchmarks.<nombre>`
+y reporta sus resultados como JSON.
+"""
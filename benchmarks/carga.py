@@ -0,0 +1,270 @@
+# benchmarks/carga.py
+"""
+Prueba de carga contra un uvicorn local, con la mezcla de tráfico de
+`benchmarks.escenarios` ponderada por `Escenario.peso`.
+
+Cada usuario virtual representa a un cliente: elige escenarios al azar según
+su peso, espera un tiempo de reflexión (exponencial, media --espera) entre
+solicitudes y reutiliza su token hasta que el escenario `login` abre una
+sesión nueva. La concurrencia sube por escalones (--escalon usuarios cada
+--duracion segundos) hasta --usuarios; por escalón se reporta el throughput,
+la latencia y la tasa de errores, y al final el escalón donde el throughput
+deja de crecer (saturación). Con eso se dimensiona la cantidad de
+trabajadores de render.yaml.
+
+    python -m benchmarks.datos --escala 0.01
+    python -m benchmarks.carga --iniciar-servidor --trabajadores 2 --usuarios 200
+
+Sin --iniciar-servidor se usa el servidor que ya esté escuchando en --url; la
+base sembrada debe ser la misma (BENCH_DATABASE_URL).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import replace
+
+from benchmarks import entorno
+from benchmarks.escenarios import ESCENARIOS, cargar_contexto
+from benchmarks.latencia import percentil
+
+# Un escalón cuyo throughput crece menos que esto respecto al anterior está saturado
+CRECIMIENTO_MINIMO = 0.05
+
+logger = logging.getLogger("banco_mr.benchmarks")
+
+
+class Estadisticas:
+    """Solicitudes completadas durante un escalón."""
+
+    def __init__(self, usuarios: int):
+        self.usuarios = usuarios
+        self.inicio = time.perf_counter()
+        self.latencias = []
+        # escenario -> [solicitudes, errores]
+        self.por_escenario = defaultdict(lambda: [0, 0])
+
+    def registrar(self, escenario: str, duracion: float, error: bool):
+        self.latencias.append(duracion)
+        conteo = self.por_escenario[escenario]
+        conteo[0] += 1
+        conteo[1] += error
+
+    def resumen(self) -> dict:
+        segundos = time.perf_counter() - self.inicio
+        solicitudes = len(self.latencias)
+        errores = sum(e for _, e in self.por_escenario.values())
+        ms = [d * 1000 for d in self.latencias] or [0]
+        return {
+            "usuarios": self.usuarios,
+            "solicitudes": solicitudes,
+            "solicitudesPorSegundo": round(solicitudes / segundos, 2),
+            "tasaErrores": round(errores / solicitudes, 4) if solicitudes else 0,
+            "p50Ms": round(percentil(ms, 50), 2),
+            "p95Ms": round(percentil(ms, 95), 2),
+            "p99Ms": round(percentil(ms, 99), 2),
+        }
+
+
+class Sesiones:
+    """Tokens por usuario, compartidos entre usuarios virtuales; un solo login por usuario a la vez."""
+
+    def __init__(self, cliente, registrar):
+        self.cliente = cliente
+        self.registrar = registrar
+        self.tokens = {}
+        self._bloqueos = defaultdict(asyncio.Lock)
+
+    async def token(self, username: str) -> str:
+        if username in self.tokens:
+            return self.tokens[username]
+        async with self._bloqueos[username]:
+            if username not in self.tokens:
+                await self.iniciar(username)
+        return self.tokens.get(username, "")
+
+    async def iniciar(self, username: str):
+        from benchmarks.datos import CLAVE
+
+        inicio = time.perf_counter()
+        try:
+            respuesta = await self.cliente.post("/login", data={"username": username, "password": CLAVE})
+            error = respuesta.status_code != 200
+        except Exception:
+            respuesta, error = None, True
+        self.registrar("login", time.perf_counter() - inicio, error)
+        if not error:
+            self.tokens[username] = respuesta.json()["access_token"]
+
+    def invalidar(self, username: str):
+        self.tokens.pop(username, None)
+
+
+async def _usuario_virtual(cliente, sesiones: Sesiones, contexto, escenarios: list, rnd: random.Random,
+                           espera: float, estado: dict, detener: asyncio.Event):
+    pesos = [e.peso for e in escenarios]
+    while not detener.is_set():
+        escenario = rnd.choices(escenarios, pesos)[0]
+        solicitud = escenario.construir(rnd, contexto)
+        if escenario.nombre == "login":
+            # Sesión nueva: reemplaza el token que venía usando el cliente
+            await sesiones.iniciar(solicitud.data["username"])
+        else:
+            encabezados = {}
+            if solicitud.usuario:
+                encabezados["Authorization"] = f"Bearer {await sesiones.token(solicitud.usuario)}"
+            inicio = time.perf_counter()
+            try:
+                respuesta = await cliente.request(
+                    solicitud.metodo, solicitud.ruta, headers=encabezados,
+                    json=solicitud.json, data=solicitud.data,
+                )
+                error = respuesta.status_code >= 400
+                if respuesta.status_code == 401 and solicitud.usuario:
+                    sesiones.invalidar(solicitud.usuario)
+            except Exception:
+                error = True
+            estado["actual"].registrar(escenario.nombre, time.perf_counter() - inicio, error)
+
+        if espera:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(detener.wait(), min(rnd.expovariate(1 / espera), espera * 5))
+
+
+def saturacion(escalones: list) -> dict:
+    """Primer escalón cuyo throughput ya no crece; si todos crecen, el último."""
+    for anterior, actual in zip(escalones, escalones[1:]):
+        if actual["solicitudesPorSegundo"] < anterior["solicitudesPorSegundo"] * (1 + CRECIMIENTO_MINIMO):
+            return {**anterior, "saturado": True}
+    return {**escalones[-1], "saturado": False}
+
+
+async def _ejecutar(url: str, contexto, escenarios: list, usuarios: int, escalon: int,
+                    duracion: float, espera: float, semilla: int) -> dict:
+    import httpx
+
+    rnd = random.Random(semilla)
+    estado = {"actual": Estadisticas(0)}
+    detener = asyncio.Event()
+    escalones, tareas = [], []
+    totales = defaultdict(lambda: [0, 0])
+
+    limites = httpx.Limits(max_connections=usuarios, max_keepalive_connections=usuarios)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=30) as cliente:
+        sesiones = Sesiones(cliente, lambda *a: estado["actual"].registrar(*a))
+        activos = 0
+        while activos < usuarios:
+            nuevos = min(escalon, usuarios - activos)
+            for _ in range(nuevos):
+                propio = replace(contexto, fijo=contexto.cliente(rnd))
+                tareas.append(asyncio.create_task(_usuario_virtual(
+                    cliente, sesiones, propio, escenarios, random.Random(rnd.random()),
+                    espera, estado, detener,
+                )))
+            activos += nuevos
+            estado["actual"] = Estadisticas(activos)
+            await asyncio.sleep(duracion)
+            medicion = estado["actual"]
+            escalones.append(medicion.resumen())
+            for nombre, (solicitudes, errores) in medicion.por_escenario.items():
+                totales[nombre][0] += solicitudes
+                totales[nombre][1] += errores
+            logger.info(f"{activos} usuarios: {escalones[-1]['solicitudesPorSegundo']} sol/s")
+
+        detener.set()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    return {
+        "escalones": escalones,
+        "saturacion": saturacion(escalones),
+        "maximoSolicitudesPorSegundo": max(e["solicitudesPorSegundo"] for e in escalones),
+        "escenarios": {
+            nombre: {"solicitudes": s, "errores": e, "tasaErrores": round(e / s, 4) if s else 0}
+            for nombre, (s, e) in sorted(totales.items())
+        },
+    }
+
+
+@contextlib.contextmanager
+def servidor_local(puerto: int, trabajadores: int):
+    """Levanta `benchmarks.servidor` en otro proceso y espera a que responda."""
+    import httpx
+
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.servidor", "--puerto", str(puerto), "--trabajadores", str(trabajadores)],
+        env={**os.environ, "BENCH_DATABASE_URL": entorno.DATABASE_URL},
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        limite = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{puerto}/", timeout=1)
+                break
+            except httpx.HTTPError:
+                if proceso.poll() is not None or time.monotonic() > limite:
+                    raise RuntimeError("El servidor de pruebas no inició")
+                time.sleep(0.2)
+        yield f"http://127.0.0.1:{puerto}"
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def ejecutar(url: str, usuarios: int, escalon: int, duracion: float, espera: float,
+             escrituras: bool = True, semilla: int = 7) -> dict:
+    from app.database import SessionLocal
+
+    entorno.engine_benchmark()
+    db = SessionLocal()
+    try:
+        contexto = cargar_contexto(db)
+    finally:
+        db.close()
+    if not contexto.clientes:
+        raise RuntimeError("La base del benchmark está vacía; ejecute primero python -m benchmarks.datos")
+
+    escenarios = [
+        e for e in ESCENARIOS.values()
+        if (escrituras or not e.escritura) and (contexto.prestamos or e.nombre != "pago_prestamo")
+    ]
+    resultado = asyncio.run(_ejecutar(url, contexto, escenarios, usuarios, escalon, duracion, espera, semilla))
+    return {
+        "url": url,
+        "esperaMediaSegundos": espera,
+        "mezcla": {e.nombre: e.peso for e in escenarios},
+        **resultado,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con mezcla de tráfico y rampa de usuarios")
+    parser.add_argument("--url", default="http://127.0.0.1:8010")
+    parser.add_argument("--iniciar-servidor", action="store_true", help="Levantar uvicorn sobre la base del benchmark")
+    parser.add_argument("--puerto", type=int, default=8010)
+    parser.add_argument("--trabajadores", type=int, default=1, help="Procesos de uvicorn (con --iniciar-servidor)")
+    parser.add_argument("--usuarios", type=int, default=100, help="Usuarios virtuales al final de la rampa")
+    parser.add_argument("--escalon", type=int, default=10, help="Usuarios agregados por escalón")
+    parser.add_argument("--duracion", type=float, default=20.0, help="Segundos por escalón")
+    parser.add_argument("--espera", type=float, default=1.0, help="Tiempo de reflexión medio en segundos (0 = sin espera)")
+    parser.add_argument("--sin-escrituras", action="store_true", help="Excluir transferencias y pagos")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    with contextlib.redirect_stdout(sys.stderr), contextlib.ExitStack() as pila:
+        url = pila.enter_context(servidor_local(args.puerto, args.trabajadores)) if args.iniciar_servidor else args.url
+        resultado = ejecutar(url, args.usuarios, args.escalon, args.duracion, args.espera,
+                             not args.sin_escrituras, args.semilla)
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
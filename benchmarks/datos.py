@@ -0,0 +1,328 @@
+# benchmarks/datos.py
+"""
+Esquema y datos sembrados para los benchmarks.
+
+El esquema se crea desde `app.models` y los datos se generan de forma
+determinista (misma semilla, mismos datos) con inserciones en bloque. Con
+escala 1 se siembran 100 mil clientes, 300 mil cuentas, 5 millones de
+transacciones (con su historial) y 50 mil préstamos; la escala multiplica
+todos los volúmenes.
+
+    python -m benchmarks.datos --escala 0.01
+
+Todos los usuarios sembrados comparten la contraseña CLAVE. El cliente i
+inicia sesión como `cliente{i}` y es dueño de las cuentas i, i + C e i + 2C
+(C = cantidad de clientes); `admin` es el administrador.
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from benchmarks import entorno
+
+CLIENTES = 100_000
+CUENTAS_POR_CLIENTE = 3
+TRANSACCIONES = 5_000_000
+PRESTAMOS = 50_000
+FRACCION_TARJETAS = 0.3
+
+CLAVE = "benchmark"
+# bcrypt de CLAVE, precalculado: hashear cien mil contraseñas tomaría horas
+HASH_CLAVE = "$2b$12$Q3s1I6N03xMQkE0A8BzKAuwdlIQL8dm6oa21uQ7mbHE9w1EQu6NGe"
+FILAS_POR_BLOQUE = 10_000
+
+logger = logging.getLogger("banco_mr.benchmarks")
+
+
+def numero_cuenta(id_cuenta: int) -> str:
+    return f"BN{id_cuenta:010d}"
+
+
+def numero_prestamo(id_prestamo: int) -> str:
+    return f"BNP{id_prestamo:08d}"
+
+
+def volumenes(escala: float) -> dict:
+    return {
+        "clientes": max(2, int(CLIENTES * escala)),
+        "transacciones": max(10, int(TRANSACCIONES * escala)),
+        "prestamos": max(1, int(PRESTAMOS * escala)),
+    }
+
+
+def crear_esquema(engine):
+    from app.database import Base
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+def _insertar(db: Session, modelo, filas: list):
+    for i in range(0, len(filas), FILAS_POR_BLOQUE):
+        db.execute(insert(modelo), filas[i:i + FILAS_POR_BLOQUE])
+
+
+def _catalogos(db: Session):
+    from app import models
+
+    _insertar(db, models.TipoTransaccion, [
+        {"idTipoTransaccion": i, "nombre": n}
+        for i, n in [(1, "Depósito"), (2, "Retiro"), (3, "Transferencia"), (4, "Préstamo")]
+    ])
+    _insertar(db, models.Moneda, [
+        {"idMoneda": 1, "codigo": "GTQ", "nombre": "Quetzal"},
+        {"idMoneda": 2, "codigo": "USD", "nombre": "Dólar"},
+        {"idMoneda": 3, "codigo": "EUR", "nombre": "Euro"},
+    ])
+    hoy = date.today()
+    _insertar(db, models.TipoCambio, [
+        {"idMoneda": 2, "fechaVigencia": hoy - timedelta(days=365), "tasa": Decimal("7.75")},
+        {"idMoneda": 3, "fechaVigencia": hoy - timedelta(days=365), "tasa": Decimal("8.40")},
+    ])
+    _insertar(db, models.Institucion, [{"descripcion": "Banco M&R"}, {"descripcion": "Cooperativa"}])
+    _insertar(db, models.TipoPrestamo, [{"descripcion": "Personal"}, {"descripcion": "Hipotecario"}])
+    _insertar(db, models.Plazo, [
+        {"cantidadCuotas": c, "porcentajeAnualIntereses": Decimal(t), "porcentajeMora": Decimal("24"),
+         "descripcion": f"{c} meses"}
+        for c, t in [(12, "12"), (24, "14"), (36, "16")]
+    ])
+    _insertar(db, models.TipoFormaPago, [{"descripcion": "Débito a cuenta"}])
+
+
+def _clientes(db: Session, rnd: random.Random, clientes: int):
+    from app import models
+
+    _insertar(db, models.Cliente, [
+        {
+            "idCliente": i,
+            "primerNombre": rnd.choice(("Ana", "Luis", "María", "José", "Carla", "Pedro")),
+            "segundoNombre": None,
+            "primerApellido": rnd.choice(("López", "Pérez", "García", "Morales", "Ramírez")),
+            "segundoApellido": rnd.choice(("Castillo", "Méndez", "Herrera", "Reyes")),
+            "dpi": f"{i:013d}",
+            "telefono": f"5{i:07d}",
+            "correo": f"cliente{i}@bench.local",
+        }
+        for i in range(1, clientes + 1)
+    ])
+    usuarios = [{"username": "admin", "password": HASH_CLAVE, "rol": "admin", "idCliente": 1, "estado": 1}]
+    usuarios += [
+        {"username": f"cliente{i}", "password": HASH_CLAVE, "rol": "cliente", "idCliente": i, "estado": 1}
+        for i in range(1, clientes + 1)
+    ]
+    _insertar(db, models.Usuario, usuarios)
+
+
+def _cuentas(db: Session, rnd: random.Random, clientes: int) -> list:
+    """Inserta las cuentas y devuelve su saldo inicial, indexado por idCuenta - 1."""
+    from app import models
+
+    total = clientes * CUENTAS_POR_CLIENTE
+    saldos = [Decimal(rnd.randint(500, 50_000)) for _ in range(total)]
+    _insertar(db, models.Cuenta, [
+        {
+            "idCuenta": i + 1,
+            "idCliente": i % clientes + 1,
+            "numeroCuenta": numero_cuenta(i + 1),
+            "idTipoCuenta": 1 if i < clientes else 2,
+            "saldoInicial": saldos[i],
+            "saldo": saldos[i],
+            # la tercera cuenta de cada cliente es en dólares
+            "idMoneda": 2 if i >= 2 * clientes else 1,
+            "idEstadoCuenta": 1,
+        }
+        for i in range(total)
+    ])
+    return saldos
+
+
+def _transacciones(db: Session, rnd: random.Random, saldos: list, cantidad: int):
+    """Genera depósitos, retiros y transferencias en orden cronológico con su historial."""
+    from app import models
+
+    total_cuentas = len(saldos)
+    fin = datetime.now() - timedelta(days=1)
+    inicio = fin - timedelta(days=365)
+    paso = (fin - inicio) / cantidad
+
+    for base in range(0, cantidad, FILAS_POR_BLOQUE):
+        transacciones, historial = [], []
+        for id_trans in range(base + 1, min(base + FILAS_POR_BLOQUE, cantidad) + 1):
+            fecha = inicio + paso * id_trans
+            origen = rnd.randrange(total_cuentas)
+            monto = Decimal(rnd.randint(100, 50_000)) / 100
+            tipo = rnd.choices((1, 2, 3), weights=(4, 3, 3))[0]
+            if tipo != 1 and saldos[origen] < monto:
+                tipo = 1
+            documento = f"BNT{id_trans:09d}"
+            destino = None
+            if tipo == 1:
+                saldos[origen] += monto
+            elif tipo == 2:
+                saldos[origen] -= monto
+            else:
+                destino = rnd.randrange(total_cuentas - 1)
+                destino += destino >= origen
+                saldos[origen] -= monto
+                saldos[destino] += monto
+            transacciones.append({
+                "idTransaccion": id_trans,
+                "numeroDocumento": documento,
+                "fecha": fecha,
+                "idCuentaOrigen": origen + 1,
+                "idCuentaDestino": destino + 1 if destino is not None else None,
+                "idTipoTransaccion": tipo,
+                "monto": monto,
+                "descripcion": None,
+            })
+            historial.append({
+                "idCuenta": origen + 1, "idTransaccion": id_trans, "numeroDocumento": documento,
+                "fecha": fecha, "monto": monto, "saldo": saldos[origen],
+            })
+            if destino is not None:
+                historial.append({
+                    "idCuenta": destino + 1, "idTransaccion": id_trans, "numeroDocumento": documento,
+                    "fecha": fecha, "monto": monto, "saldo": saldos[destino],
+                })
+        db.execute(insert(models.Transaccion), transacciones)
+        db.execute(insert(models.Historial), historial)
+        db.commit()
+
+    for i in range(0, total_cuentas, FILAS_POR_BLOQUE):
+        db.execute(update(models.Cuenta), [
+            {"idCuenta": j + 1, "saldo": saldos[j]}
+            for j in range(i, min(i + FILAS_POR_BLOQUE, total_cuentas))
+        ])
+    db.commit()
+
+
+def _prestamos(db: Session, rnd: random.Random, clientes: int, cantidad: int):
+    from app import models
+    from app.utils import generar_cuotas_sistema_frances
+
+    plazos = {p.idPlazo: p for p in db.query(models.Plazo)}
+    hoy = date.today()
+    for base in range(0, cantidad, FILAS_POR_BLOQUE):
+        encabezados, detalles = [], []
+        for id_prestamo in range(base + 1, min(base + FILAS_POR_BLOQUE, cantidad) + 1):
+            id_cliente = rnd.randint(1, clientes)
+            plazo = plazos[rnd.choice(list(plazos))]
+            monto = Decimal(rnd.randint(10, 500) * 100)
+            fecha = hoy - timedelta(days=rnd.randint(0, 720))
+            autorizado = rnd.random() < 0.9
+            cuotas = generar_cuotas_sistema_frances(
+                monto, float(plazo.porcentajeAnualIntereses), plazo.cantidadCuotas, fecha
+            )
+            saldo = monto
+            for cuota in cuotas:
+                pagada = autorizado and cuota["fechaPago"] < hoy and rnd.random() < 0.85
+                if pagada:
+                    saldo -= cuota["montoCapital"]
+                detalles.append({
+                    **cuota,
+                    "idPrestamoEnc": id_prestamo,
+                    "estado": "CANCELADO" if pagada else "VIGENTE",
+                    "fechaCancelado": cuota["fechaPago"] if pagada else None,
+                })
+            encabezados.append({
+                "idPrestamoEnc": id_prestamo,
+                "idCliente": id_cliente,
+                "idInstitucion": rnd.randint(1, 2),
+                "idTipoPrestamo": rnd.randint(1, 2),
+                "idPlazo": plazo.idPlazo,
+                "idMoneda": 1,
+                "numeroPrestamo": numero_prestamo(id_prestamo),
+                "fechaPrestamo": fecha,
+                "montoPrestamo": monto,
+                "saldoPrestamo": saldo,
+                "fechaAutorizacion": fecha if autorizado else None,
+                "aprobado": True if autorizado else None,
+                "fechaVencimiento": cuotas[-1]["fechaPago"],
+                "observacion": None,
+                # cuenta monetaria en quetzales del cliente
+                "idCuentaDestino": id_cliente,
+            })
+        db.execute(insert(models.PrestamoEncabezado), encabezados)
+        _insertar(db, models.PrestamoDetalle, detalles)
+        db.commit()
+
+
+def _tarjetas(db: Session, rnd: random.Random, total_cuentas: int):
+    from app import models
+
+    vencimiento = date.today() + timedelta(days=3 * 365)
+    tarjetas = []
+    for id_cuenta in range(1, total_cuentas + 1):
+        if rnd.random() >= FRACCION_TARJETAS:
+            continue
+        credito = rnd.random() < 0.4
+        tarjetas.append({
+            "numeroTarjeta": f"4{id_cuenta:015d}",
+            "tipo": models.TipoTarjetaEnum.credito if credito else models.TipoTarjetaEnum.debito,
+            "nombreTitular": f"TITULAR {id_cuenta}",
+            "fechaExpiracion": vencimiento,
+            "estado": models.EstadoTarjetaEnum.activa,
+            "status": models.SolicitudEstadoEnum.aprobada,
+            "limiteCredito": Decimal(rnd.randint(5, 50) * 1000) if credito else None,
+            "idCuenta": id_cuenta,
+        })
+    _insertar(db, models.Tarjeta, tarjetas)
+    db.commit()
+
+
+def sembrar(engine, escala: float = 1.0, semilla: int = 7) -> dict:
+    """Crea el esquema y lo llena con los volúmenes de la escala; devuelve un resumen."""
+    from app import cartera
+    from app.database import SessionLocal
+
+    v = volumenes(escala)
+    rnd = random.Random(semilla)
+    inicio = time.perf_counter()
+    crear_esquema(engine)
+
+    db = SessionLocal()
+    try:
+        _catalogos(db)
+        _clientes(db, rnd, v["clientes"])
+        saldos = _cuentas(db, rnd, v["clientes"])
+        db.commit()
+        logger.info(f"Clientes y cuentas sembrados ({len(saldos)} cuentas)")
+
+        _transacciones(db, rnd, saldos, v["transacciones"])
+        logger.info(f"Transacciones sembradas ({v['transacciones']})")
+
+        _prestamos(db, rnd, v["clientes"], v["prestamos"])
+        _tarjetas(db, rnd, len(saldos))
+        cartera.reconstruir(db)
+        logger.info("Préstamos, tarjetas y cartera sembrados")
+    finally:
+        db.close()
+
+    return {
+        **v,
+        "cuentas": v["clientes"] * CUENTAS_POR_CLIENTE,
+        "escala": escala,
+        "semilla": semilla,
+        "segundos": round(time.perf_counter() - inicio, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea y siembra la base de los benchmarks")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplicador de los volúmenes")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(sembrar(entorno.engine_benchmark(), args.escala, args.semilla), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/entorno.py
+"""
+Preparación del entorno para los benchmarks que cargan la aplicación.
+
+Debe importarse antes que cualquier módulo de `app`: fija variables de entorno
+por defecto (base SQLite local, SECRET_KEY, credenciales SMTP ficticias,
+límites de login altos) y
+reemplaza `smtplib.SMTP` por un servidor que sólo cuenta los correos, para que
+ninguna medición dependa de la red.
+
+La base se toma de BENCH_DATABASE_URL; nunca de DATABASE_URL, para no apuntar
+por accidente a la base de la aplicación.
+"""
+import os
+import smtplib
+from pathlib import Path
+
+DIRECTORIO = Path(__file__).resolve().parent
+URL_POR_DEFECTO = f"sqlite:///{DIRECTORIO / 'bench.db'}"
+
+DATABASE_URL = os.getenv("BENCH_DATABASE_URL", URL_POR_DEFECTO)
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("SMTP_USER", "benchmark@localhost")
+os.environ.setdefault("SMTP_PASSWORD", "benchmark")
+
+# Todo el tráfico de los benchmarks sale de 127.0.0.1 y repite pocos usernames:
+# con los límites de producción de `app.limite_login` el escenario `login`
+# terminaría en 429 y contaría como errores. Para medir el límite, fijarlas.
+for _variable in ("LOGIN_IP_CAPACIDAD", "LOGIN_USUARIO_CAPACIDAD"):
+    os.environ.setdefault(_variable, "1000000")
+for _variable in ("LOGIN_IP_POR_MINUTO", "LOGIN_USUARIO_POR_MINUTO"):
+    os.environ.setdefault(_variable, "1000000")
+
+correos_enviados = []
+
+
+class SMTPSimulado:
+    """Sustituto de smtplib.SMTP: acepta la sesión y guarda los destinatarios."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def starttls(self, *args, **kwargs):
+        pass
+
+    def login(self, *args, **kwargs):
+        pass
+
+    def sendmail(self, remitente, destinatario, mensaje):
+        correos_enviados.append(destinatario)
+
+    def quit(self):
+        pass
+
+
+smtplib.SMTP = SMTPSimulado
+
+
+def engine_benchmark():
+    """Devuelve el engine de la aplicación, verificando que apunte a la base del benchmark."""
+    from app.database import engine
+
+    # database.py carga .env con override=True; si ahí hay otra base, se aborta
+    if os.getenv("DATABASE_URL") != DATABASE_URL:
+        raise RuntimeError(
+            "El archivo .env redefine DATABASE_URL; los benchmarks no se ejecutan contra esa base"
+        )
+    engine.echo = False
+    return engine
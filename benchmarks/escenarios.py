@@ -0,0 +1,135 @@
+# benchmarks/escenarios.py
+"""
+Solicitudes representativas de la API sobre los datos sembrados por
+`benchmarks.datos`.
+
+Cada escenario arma la solicitud (método, ruta, cuerpo) para un usuario
+elegido al azar; el usuario se devuelve aparte para que quien ejecute la
+solicitud agregue su token.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from benchmarks.datos import CLAVE, numero_cuenta
+
+
+@dataclass
+class Solicitud:
+    metodo: str
+    ruta: str
+    usuario: Optional[str] = None
+    json: Optional[dict] = None
+    data: Optional[dict] = None
+
+
+@dataclass
+class Contexto:
+    """Lo que los escenarios necesitan saber de los datos sembrados."""
+    clientes: int
+    # (username, numeroPrestamo, numeroCuenta) de préstamos aprobados con saldo
+    prestamos: list = field(default_factory=list)
+    # cliente fijo (usuario virtual de la prueba de carga); None = uno al azar por solicitud
+    fijo: Optional[int] = None
+
+    def cliente(self, rnd: random.Random) -> int:
+        return self.fijo or rnd.randint(1, self.clientes)
+
+
+def cargar_contexto(db: Session, muestra: int = 1000) -> Contexto:
+    from app import models
+
+    clientes = db.query(models.Cliente.idCliente).count()
+    prestamos = (
+        db.query(models.PrestamoEncabezado.idCliente, models.PrestamoEncabezado.numeroPrestamo,
+                 models.PrestamoEncabezado.idCuentaDestino)
+          .filter(models.PrestamoEncabezado.aprobado.is_(True),
+                  models.PrestamoEncabezado.saldoPrestamo > 0)
+          .order_by(models.PrestamoEncabezado.idPrestamoEnc)
+          .limit(muestra)
+          .all()
+    )
+    return Contexto(
+        clientes=clientes,
+        prestamos=[(f"cliente{c}", numero, numero_cuenta(cuenta)) for c, numero, cuenta in prestamos],
+    )
+
+
+@dataclass
+class Escenario:
+    nombre: str
+    construir: Callable[[random.Random, Contexto], Solicitud]
+    # peso relativo en la mezcla de carga
+    peso: int = 1
+    # las escrituras no se repiten en los benchmarks de sólo lectura
+    escritura: bool = False
+
+
+def _login(rnd, ctx):
+    return Solicitud("POST", "/login", data={"username": f"cliente{ctx.cliente(rnd)}", "password": CLAVE})
+
+
+def _get_cliente(ruta: str):
+    def construir(rnd, ctx):
+        return Solicitud("GET", ruta, usuario=f"cliente{ctx.cliente(rnd)}")
+    return construir
+
+
+def _get_admin(ruta: str):
+    def construir(rnd, ctx):
+        return Solicitud("GET", ruta, usuario="admin")
+    return construir
+
+
+def _get_catalogo(rnd, ctx):
+    return Solicitud("GET", rnd.choice(("/monedas", "/plazos", "/tipos-prestamo", "/instituciones")))
+
+
+def _estado_cuenta(rnd, ctx):
+    cliente = ctx.cliente(rnd)
+    hasta = date.today()
+    desde = hasta - timedelta(days=30)
+    return Solicitud(
+        "GET", f"/cuentas/{numero_cuenta(cliente)}/estado-cuenta?desde={desde}&hasta={hasta}",
+        usuario=f"cliente{cliente}",
+    )
+
+
+def _transferencia(rnd, ctx):
+    cliente = ctx.cliente(rnd)
+    destino = cliente % ctx.clientes + 1
+    return Solicitud("POST", "/transacciones", usuario=f"cliente{cliente}", json={
+        "idCuentaOrigen": numero_cuenta(cliente),
+        "idCuentaDestino": numero_cuenta(destino),
+        "idTipoTransaccion": 3,
+        "monto": 1.0,
+        "descripcion": "benchmark",
+    })
+
+
+def _pago_prestamo(rnd, ctx):
+    username, prestamo, cuenta = rnd.choice(ctx.prestamos)
+    return Solicitud("POST", "/prestamos/pagar", usuario=username, json={
+        "numeroPrestamo": prestamo, "numeroCuentaOrigen": cuenta, "montoPago": 2000.0,
+    })
+
+
+ESCENARIOS = {
+    e.nombre: e
+    for e in [
+        Escenario("login", _login, peso=5),
+        Escenario("cuentas", _get_cliente("/cuentas"), peso=20),
+        Escenario("cuentas_all", _get_cliente("/cuentas/all"), peso=5),
+        Escenario("mis_transacciones", _get_cliente("/mis"), peso=15),
+        Escenario("estado_cuenta", _estado_cuenta, peso=5),
+        Escenario("prestamos_mis", _get_cliente("/prestamos/mis"), peso=8),
+        Escenario("prestamos_todos", _get_admin("/prestamos/todos"), peso=1),
+        Escenario("tarjetas_mis", _get_cliente("/tarjetas/mis"), peso=8),
+        Escenario("catalogos", _get_catalogo, peso=13),
+        Escenario("transferencia", _transferencia, peso=15, escritura=True),
+        Escenario("pago_prestamo", _pago_prestamo, peso=5, escritura=True),
+    ]
+}
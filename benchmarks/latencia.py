@@ -0,0 +1,149 @@
+# benchmarks/latencia.py
+"""
+Latencia por endpoint sobre una base local sembrada.
+
+Crea el esquema desde `app.models`, siembra los datos (ver `benchmarks.datos`)
+y ejecuta cada escenario de `benchmarks.escenarios` contra la aplicación
+en proceso, a través de un cliente ASGI (sin red ni uvicorn). Las solicitudes
+de un escenario se hacen una tras otra, así que la latencia no incluye espera
+por otras solicitudes. Reporta como JSON, por escenario, p50/p95/p99 en
+milisegundos, sentencias SQL por solicitud y respuestas con error.
+
+    python -m benchmarks.latencia --escala 0.01 --solicitudes 200
+    python -m benchmarks.latencia --sin-sembrar --escenarios cuentas mis_transacciones
+
+BENCH_DATABASE_URL elige la base (SQLite local por defecto).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import event
+
+from benchmarks import entorno
+from benchmarks.datos import sembrar
+from benchmarks.escenarios import ESCENARIOS, cargar_contexto
+
+
+def percentil(valores: list, p: float) -> float:
+    """Percentil por el método del rango más cercano."""
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[indice]
+
+
+class ContadorSentencias:
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args):
+        self.total += 1
+
+
+def resumir(duraciones: list, sentencias: list, errores: int) -> dict:
+    ms = [d * 1000 for d in duraciones]
+    return {
+        "solicitudes": len(ms),
+        "errores": errores,
+        "p50Ms": round(percentil(ms, 50), 2),
+        "p95Ms": round(percentil(ms, 95), 2),
+        "p99Ms": round(percentil(ms, 99), 2),
+        "promedioMs": round(statistics.fmean(ms), 2),
+        "sentenciasPorSolicitud": round(statistics.fmean(sentencias), 2),
+        "sentenciasMax": max(sentencias),
+    }
+
+
+async def _ejecutar(app, contador: ContadorSentencias, contexto, escenarios: list,
+                    solicitudes: int, semilla: int) -> dict:
+    import httpx
+    from app.auth import create_access_token
+
+    rnd = random.Random(semilla)
+    tokens = {}
+    resultados = {}
+    transporte = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+        for escenario in escenarios:
+            duraciones, sentencias, errores = [], [], 0
+            # La primera solicitud calienta cachés y no se mide
+            for i in range(solicitudes + 1):
+                solicitud = escenario.construir(rnd, contexto)
+                encabezados = {}
+                if solicitud.usuario:
+                    if solicitud.usuario not in tokens:
+                        tokens[solicitud.usuario] = create_access_token({"sub": solicitud.usuario})
+                    encabezados["Authorization"] = f"Bearer {tokens[solicitud.usuario]}"
+
+                antes = contador.total
+                inicio = time.perf_counter()
+                respuesta = await cliente.request(
+                    solicitud.metodo, solicitud.ruta, headers=encabezados,
+                    json=solicitud.json, data=solicitud.data,
+                )
+                duracion = time.perf_counter() - inicio
+                if i == 0:
+                    continue
+                duraciones.append(duracion)
+                sentencias.append(contador.total - antes)
+                errores += respuesta.status_code >= 400
+            resultados[escenario.nombre] = resumir(duraciones, sentencias, errores)
+    return resultados
+
+
+def ejecutar(escala: float, solicitudes: int, nombres: list = None, sembrar_datos: bool = True,
+             semilla: int = 7) -> dict:
+    engine = entorno.engine_benchmark()
+    siembra = sembrar(engine, escala, semilla) if sembrar_datos else None
+
+    from app import catalogos
+    from app.database import SessionLocal
+    from app.main import app
+
+    # ASGITransport no ejecuta el lifespan de la aplicación
+    catalogos.cargar_al_iniciar()
+    db = SessionLocal()
+    try:
+        contexto = cargar_contexto(db)
+    finally:
+        db.close()
+
+    escenarios = [ESCENARIOS[n] for n in (nombres or ESCENARIOS)]
+    if not contexto.prestamos:
+        escenarios = [e for e in escenarios if e.nombre != "pago_prestamo"]
+
+    contador = ContadorSentencias(engine)
+    resultados = asyncio.run(_ejecutar(app, contador, contexto, escenarios, solicitudes, semilla))
+    return {
+        "motor": engine.dialect.name,
+        "siembra": siembra,
+        "escenarios": resultados,
+        "correosSimulados": len(entorno.correos_enviados),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia por endpoint sobre datos sembrados")
+    parser.add_argument("--escala", type=float, default=0.01, help="Multiplicador de los volúmenes sembrados")
+    parser.add_argument("--solicitudes", type=int, default=200, help="Solicitudes medidas por escenario")
+    parser.add_argument("--escenarios", nargs="*", choices=sorted(ESCENARIOS), help="Escenarios a ejecutar (todos por defecto)")
+    parser.add_argument("--sin-sembrar", action="store_true", help="Reutilizar la base ya sembrada")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # La aplicación imprime trazas (p. ej. al enviar correos); stdout queda sólo para el JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        resultado = ejecutar(args.escala, args.solicitudes, args.escenarios, not args.sin_sembrar, args.semilla)
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
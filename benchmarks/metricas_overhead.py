@@ -0,0 +1,77 @@
+# benchmarks/metricas_overhead.py
+"""
+Costo por solicitud del middleware de métricas.
+
+Ejecuta una aplicación ASGI mínima con y sin `MetricasMiddleware` y reporta la
+diferencia en microsegundos por solicitud. Termina con código 1 si supera el
+presupuesto (50 µs por defecto).
+
+    python -m benchmarks.metricas_overhead --solicitudes 200000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from app.metricas import MetricasMiddleware
+
+PRESUPUESTO_US = 50.0
+
+
+class _Ruta:
+    path = "/cuentas/{numero}/saldo"
+
+
+async def _aplicacion(scope, receive, send):
+    await receive()
+    scope["route"] = _Ruta
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"saldo": 100.0}'})
+
+
+async def _medir(app, solicitudes: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b'{"monto": 10}', "more_body": False}
+
+    async def send(mensaje):
+        pass
+
+    inicio = time.perf_counter()
+    for _ in range(solicitudes):
+        scope = {"type": "http", "method": "GET", "path": "/cuentas/123/saldo"}
+        await app(scope, receive, send)
+    return time.perf_counter() - inicio
+
+
+async def _ejecutar(solicitudes: int, repeticiones: int) -> dict:
+    instrumentada = MetricasMiddleware(_aplicacion)
+    # Calentamiento: crea las series de métricas antes de medir
+    await _medir(instrumentada, 1000)
+
+    base = min([await _medir(_aplicacion, solicitudes) for _ in range(repeticiones)])
+    con_metricas = min([await _medir(instrumentada, solicitudes) for _ in range(repeticiones)])
+    return {
+        "solicitudes": solicitudes,
+        "baseUs": round(base / solicitudes * 1e6, 3),
+        "conMetricasUs": round(con_metricas / solicitudes * 1e6, 3),
+        "sobrecargaUs": round((con_metricas - base) / solicitudes * 1e6, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sobrecarga del middleware de métricas")
+    parser.add_argument("--solicitudes", type=int, default=100000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--presupuesto-us", type=float, default=PRESUPUESTO_US)
+    args = parser.parse_args()
+
+    resultado = asyncio.run(_ejecutar(args.solicitudes, args.repeticiones))
+    resultado["presupuestoUs"] = args.presupuesto_us
+    resultado["dentroDelPresupuesto"] = resultado["sobrecargaUs"] <= args.presupuesto_us
+    print(json.dumps(resultado, indent=2))
+    sys.exit(0 if resultado["dentroDelPresupuesto"] else 1)
+
+
+if __name__ == "__main__":
+    main()
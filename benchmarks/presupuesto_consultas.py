@@ -0,0 +1,144 @@
+# benchmarks/presupuesto_consultas.py
+"""
+Presupuesto de sentencias SQL por ruta.
+
+Siembra la base del benchmark, ejecuta los escenarios de `benchmarks.escenarios`
+(lecturas y, después, escrituras) para varios clientes y el administrador, y
+cuenta con eventos del engine las sentencias de cada solicitud, agrupadas por
+la plantilla de la ruta. Termina con código 1 si alguna ruta supera su
+presupuesto: un N+1 hace crecer las sentencias con las filas, así que el
+máximo observado sobre datos sembrados lo delata.
+
+    python -m benchmarks.presupuesto_consultas --escala 0.002
+
+tests/test_presupuesto_consultas.py corre la misma verificación en pytest.
+
+Al agregar un endpoint de listado, declare aquí su presupuesto.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import sys
+from collections import defaultdict
+
+from sqlalchemy import event
+
+from benchmarks import entorno
+from benchmarks.datos import sembrar
+from benchmarks.escenarios import ESCENARIOS, cargar_contexto
+
+# (método, plantilla de la ruta) -> máximo de sentencias por solicitud,
+# contando la del usuario autenticado en get_current_user
+PRESUPUESTOS = {
+    ("POST", "/login"): 1,
+    ("GET", "/cuentas"): 3,
+    ("GET", "/cuentas/all"): 3,
+    ("GET", "/cuentas/{numero}/estado-cuenta"): 4,
+    ("GET", "/mis"): 3,
+    ("GET", "/prestamos/mis"): 3,
+    ("GET", "/prestamos/todos"): 3,
+    ("GET", "/tarjetas/mis"): 2,
+    ("GET", "/monedas"): 1,
+    ("GET", "/plazos"): 1,
+    ("GET", "/tipos-prestamo"): 1,
+    ("GET", "/instituciones"): 1,
+    # Escrituras: incluyen las consultas de los correos en segundo plano; el pago
+    # lee las cuotas por páginas, así que depende de cuántas cubra el monto
+    ("POST", "/transacciones"): 16,
+    ("POST", "/prestamos/pagar"): 28,
+}
+
+
+class _Medidor:
+    """Envuelve la aplicación y anota las sentencias de cada solicitud bajo su ruta."""
+
+    def __init__(self, app, engine):
+        self.app = app
+        self.sentencias = 0
+        self.por_ruta = defaultdict(list)
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args):
+        self.sentencias += 1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        antes = self.sentencias
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ruta = getattr(scope.get("route"), "path", scope["path"])
+            self.por_ruta[(scope["method"], ruta)].append(self.sentencias - antes)
+
+
+async def _recorrer(medidor: _Medidor, contexto, solicitudes: int, semilla: int, escrituras: bool):
+    import httpx
+    from app.auth import create_access_token
+
+    rnd = random.Random(semilla)
+    transporte = httpx.ASGITransport(app=medidor, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://benchmark") as cliente:
+        # Las escrituras al final, para que las lecturas vean los datos sembrados
+        for escenario in sorted(ESCENARIOS.values(), key=lambda e: e.escritura):
+            if escenario.escritura and not escrituras:
+                continue
+            for _ in range(solicitudes):
+                solicitud = escenario.construir(rnd, contexto)
+                encabezados = {}
+                if solicitud.usuario:
+                    encabezados["Authorization"] = f"Bearer {create_access_token({'sub': solicitud.usuario})}"
+                await cliente.request(solicitud.metodo, solicitud.ruta, headers=encabezados,
+                                      json=solicitud.json, data=solicitud.data)
+
+
+def verificar(escala: float, solicitudes: int, semilla: int = 7, escrituras: bool = True) -> dict:
+    engine = entorno.engine_benchmark()
+    sembrar(engine, escala, semilla)
+
+    from app import catalogos
+    from app.database import SessionLocal
+    from app.main import app
+
+    catalogos.cargar_al_iniciar()
+    db = SessionLocal()
+    try:
+        contexto = cargar_contexto(db)
+    finally:
+        db.close()
+
+    medidor = _Medidor(app, engine)
+    asyncio.run(_recorrer(medidor, contexto, solicitudes, semilla, escrituras))
+
+    rutas, excedidas = {}, []
+    for (metodo, ruta), conteos in sorted(medidor.por_ruta.items()):
+        presupuesto = PRESUPUESTOS.get((metodo, ruta))
+        nombre = f"{metodo} {ruta}"
+        rutas[nombre] = {"maximo": max(conteos), "presupuesto": presupuesto, "solicitudes": len(conteos)}
+        if presupuesto is not None and max(conteos) > presupuesto:
+            excedidas.append(nombre)
+    return {"rutas": rutas, "excedidas": excedidas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica el presupuesto de sentencias SQL por ruta")
+    parser.add_argument("--escala", type=float, default=0.002, help="Multiplicador de los volúmenes sembrados")
+    parser.add_argument("--solicitudes", type=int, default=20, help="Solicitudes por escenario")
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--sin-escrituras", action="store_true", help="Sólo los escenarios de lectura")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with contextlib.redirect_stdout(sys.stderr):
+        resultado = verificar(args.escala, args.solicitudes, args.semilla, not args.sin_escrituras)
+    print(json.dumps(resultado, indent=2))
+    if resultado["excedidas"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/serializacion.py
+"""
+Tiempo de serialización de un listado, en milisegundos por cada 10 mil filas.
+
+Compara, sobre filas con la forma de TransaccionOut (como las de /mis), los
+caminos de respuesta de FastAPI:
+  - response_model: valida cada fila con Pydantic y serializa con dump_json
+  - jsonable_encoder: sin response_model, jsonable_encoder + json
+  - respuesta_json: `RespuestaJSON` con `validar_primera` (orjson si está
+    instalado)
+  - respuesta_json_stdlib: el mismo camino con el json de la biblioteca
+    estándar (lo que se usa cuando orjson no está instalado)
+
+Cada camino se mide a través de la aplicación ASGI completa (enrutamiento y
+envío incluidos), sin base de datos.
+
+    python -m benchmarks.serializacion --filas 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+from fastapi import FastAPI
+
+from app import respuestas
+from app.respuestas import RespuestaJSON, validar_primera
+from app.schemas import TransaccionOut
+
+FILAS_REFERENCIA = 10_000
+
+
+def generar_filas(cantidad: int) -> list:
+    inicio = datetime(2025, 1, 1)
+    return [
+        {
+            "numeroDocumento": f"TRAQ{i:08d}",
+            "fecha": inicio + timedelta(minutes=i),
+            "cuentaOrigen": f"MTQ{i % 5000:08d}",
+            "cuentaDestino": f"AHQ{(i * 7) % 5000:08d}" if i % 3 else None,
+            "tipoTransaccion": "Transferencia",
+            "monto": Decimal(i % 100_000) / 100,
+            "descripcion": "Pago de planilla" if i % 2 else None,
+        }
+        for i in range(cantidad)
+    ]
+
+
+def crear_aplicacion(filas: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/response_model", response_model=List[TransaccionOut])
+    def con_modelo():
+        return filas
+
+    @app.get("/jsonable_encoder")
+    def sin_modelo():
+        return filas
+
+    @app.get("/respuesta_json", response_model=List[TransaccionOut])
+    def respuesta_json():
+        validar_primera(filas, TransaccionOut)
+        return RespuestaJSON(filas)
+
+    return app
+
+
+async def _medir(app, ruta: str, repeticiones: int) -> tuple:
+    tamanio = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        nonlocal tamanio
+        if mensaje["type"] == "http.response.body":
+            tamanio += len(mensaje.get("body", b""))
+
+    tiempos = []
+    for _ in range(repeticiones):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": ruta, "raw_path": ruta.encode(), "query_string": b"",
+            "root_path": "", "headers": [], "client": ("127.0.0.1", 1), "server": ("benchmark", 80),
+        }
+        tamanio = 0
+        inicio = time.perf_counter()
+        await app(scope, receive, send)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), tamanio
+
+
+async def _ejecutar(filas: int, repeticiones: int) -> dict:
+    app = crear_aplicacion(generar_filas(filas))
+    escala = FILAS_REFERENCIA / filas
+    resultados = {}
+
+    caminos = [("response_model", "/response_model"), ("jsonable_encoder", "/jsonable_encoder"),
+               ("respuesta_json", "/respuesta_json")]
+    for nombre, ruta in caminos:
+        await _medir(app, ruta, 1)
+        segundos, tamanio = await _medir(app, ruta, repeticiones)
+        resultados[nombre] = {"msPor10kFilas": round(segundos * 1000 * escala, 2), "bytes": tamanio}
+
+    orjson, respuestas.orjson = respuestas.orjson, None
+    try:
+        segundos, tamanio = await _medir(app, "/respuesta_json", repeticiones)
+        resultados["respuesta_json_stdlib"] = {"msPor10kFilas": round(segundos * 1000 * escala, 2), "bytes": tamanio}
+    finally:
+        respuestas.orjson = orjson
+
+    base = resultados["response_model"]["msPor10kFilas"]
+    for r in resultados.values():
+        r["aceleracion"] = round(base / r["msPor10kFilas"], 2) if r["msPor10kFilas"] else None
+    return {"filas": filas, "orjsonInstalado": orjson is not None, "caminos": resultados}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de serialización de listados por camino de respuesta")
+    parser.add_argument("--filas", type=int, default=FILAS_REFERENCIA)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(_ejecutar(args.filas, args.repeticiones)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# benchmarks/servidor.py
+"""
+La aplicación servida por uvicorn sobre la base de los benchmarks.
+
+Cada proceso de uvicorn importa este módulo, así que todos los trabajadores
+usan la base del benchmark y el SMTP simulado de `benchmarks.entorno`.
+
+    python -m benchmarks.servidor --trabajadores 2 --puerto 8010
+"""
+import argparse
+
+from benchmarks import entorno
+
+entorno.engine_benchmark()
+
+from app.main import app  # noqa: E402  (después de preparar el entorno)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor uvicorn para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8010)
+    parser.add_argument("--trabajadores", type=int, default=1)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        "benchmarks.servidor:app",
+        host=args.host,
+        port=args.puerto,
+        workers=args.trabajadores,
+        log_level="warning",
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
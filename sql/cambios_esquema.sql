@@ -0,0 +1,222 @@
+-- sql/cambios_esquema.sql
+--
+-- Cambios de esquema de la base MySQL para los módulos de rendimiento
+-- (procesos por lote, cachés, idempotencia, trabajos, límites de login).
+--
+-- La aplicación no ejecuta `create_all` ni tiene migraciones: este script se
+-- corre una vez, antes de desplegar la versión que lo requiere, con
+--     mysql -h <host> -u <usuario> -p <base> < sql/cambios_esquema.sql
+--
+-- Sin las columnas nuevas de bcoma_usuario y bcoma_cuenta cualquier consulta
+-- del ORM sobre Usuario o Cuenta (incluido /login) falla con "Unknown column".
+-- Las tablas nuevas usan CREATE TABLE IF NOT EXISTS; los ALTER TABLE no son
+-- repetibles.
+
+
+-- ---------------------------------------------------------------------------
+-- Columnas e índices en tablas existentes
+-- ---------------------------------------------------------------------------
+
+-- Exportaciones incrementales (updated_since) y filtros del listado de soporte
+ALTER TABLE bcoma_usuario
+    ADD COLUMN `fechaActualizacion` TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    ADD INDEX `ix_bcoma_usuario_fechaActualizacion` (`fechaActualizacion`),
+    ADD INDEX ix_usuario_estado (estado),
+    ADD INDEX ix_usuario_rol (rol);
+
+-- Exportaciones incrementales, filtros del listado de soporte y sello de
+-- versión de la caché de cuentas (aumenta en cada UPDATE, ver app.cache_cuentas)
+ALTER TABLE bcoma_cuenta
+    ADD COLUMN `fechaActualizacion` TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    ADD COLUMN version INTEGER NOT NULL DEFAULT 0,
+    ADD INDEX `ix_bcoma_cuenta_fechaActualizacion` (`fechaActualizacion`),
+    ADD INDEX ix_cuenta_estado (`idEstadoCuenta`),
+    ADD INDEX ix_cuenta_moneda (`idMoneda`),
+    ADD INDEX ix_cuenta_tipo (`idTipoCuenta`);
+
+-- Estados de cuenta y saldos a una fecha
+CREATE INDEX ix_historial_cuenta_fecha ON bcoma_historial (`idCuenta`, fecha);
+
+-- Listados por fecha y procesos por lote (ids insertados a partir del documento)
+CREATE INDEX ix_transaccion_fecha ON bcoma_transaccion (fecha);
+CREATE INDEX ix_transaccion_documento ON bcoma_transaccion (`numeroDocumento`);
+
+-- Cálculo de mora: cuotas VIGENTES con fecha de pago vencida
+CREATE INDEX ix_prestamodetalle_estado_fecha ON pre_prestamodetalle (estado, `fechaPago`);
+
+-- Resultado de la autorización (fechaAutorizacion se llena también al
+-- rechazar): mora y cartera sólo consideran los préstamos aprobados. Los ya
+-- autorizados se marcan como aprobados si tienen su acreditación (tipo 4).
+ALTER TABLE pre_prestamoencabezado
+    ADD COLUMN aprobado BOOL NULL AFTER `fechaAutorizacion`;
+UPDATE pre_prestamoencabezado p
+   SET p.aprobado = EXISTS (
+           SELECT 1 FROM bcoma_transaccion t
+            WHERE t.`idTipoTransaccion` = 4
+              AND t.descripcion = CONCAT('Acreditación préstamo ', p.`numeroPrestamo`)
+       )
+ WHERE p.`fechaAutorizacion` IS NOT NULL;
+
+
+-- ---------------------------------------------------------------------------
+-- Tablas nuevas
+-- ---------------------------------------------------------------------------
+
+-- Mora por cuota y fecha de corte (app.mora)
+CREATE TABLE IF NOT EXISTS pre_moracuota (
+    `idMoraCuota` INTEGER NOT NULL AUTO_INCREMENT,
+    `idPrestamoDet` INTEGER NOT NULL,
+    `idPrestamoEnc` INTEGER NOT NULL,
+    `fechaCorte` DATE NOT NULL,
+    `diasAtraso` INTEGER NOT NULL,
+    `montoMora` DECIMAL(12, 2) NOT NULL,
+    PRIMARY KEY (`idMoraCuota`),
+    CONSTRAINT uq_moracuota_det_fecha UNIQUE (`idPrestamoDet`, `fechaCorte`),
+    INDEX `ix_pre_moracuota_idPrestamoEnc` (`idPrestamoEnc`),
+    FOREIGN KEY (`idPrestamoDet`) REFERENCES pre_prestamodetalle (`idPrestamoDet`) ON DELETE CASCADE,
+    FOREIGN KEY (`idPrestamoEnc`) REFERENCES pre_prestamoencabezado (`idPrestamoEnc`) ON DELETE CASCADE
+);
+
+-- Resumen por préstamo del reporte de cartera (app.cartera; llenar con `python -m app.cartera`)
+CREATE TABLE IF NOT EXISTS pre_carteraresumen (
+    `idPrestamoEnc` INTEGER NOT NULL,
+    `idInstitucion` INTEGER NOT NULL,
+    `idTipoPrestamo` INTEGER NOT NULL,
+    `idMoneda` INTEGER NOT NULL,
+    `saldoPendiente` DECIMAL(12, 2) NOT NULL,
+    `fechaCuotaVencida` DATE,
+    `fechaActualizacion` TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (`idPrestamoEnc`),
+    FOREIGN KEY (`idPrestamoEnc`) REFERENCES pre_prestamoencabezado (`idPrestamoEnc`) ON DELETE CASCADE,
+    FOREIGN KEY (`idInstitucion`) REFERENCES pre_institucion (`idInstitucion`),
+    FOREIGN KEY (`idTipoPrestamo`) REFERENCES pre_tipoprestamo (`idTipoPrestamo`),
+    FOREIGN KEY (`idMoneda`) REFERENCES bcoma_moneda (`idMoneda`)
+);
+
+-- Tipos de cambio por fecha de vigencia (app.tipocambio)
+CREATE TABLE IF NOT EXISTS bcoma_tipocambio (
+    `idTipoCambio` INTEGER NOT NULL AUTO_INCREMENT,
+    `idMoneda` INTEGER NOT NULL,
+    `fechaVigencia` DATE NOT NULL,
+    tasa DECIMAL(12, 6) NOT NULL,
+    PRIMARY KEY (`idTipoCambio`),
+    CONSTRAINT uq_tipocambio_moneda_fecha UNIQUE (`idMoneda`, `fechaVigencia`),
+    FOREIGN KEY (`idMoneda`) REFERENCES bcoma_moneda (`idMoneda`)
+);
+
+-- Versión de la caché de catálogos (app.catalogos)
+CREATE TABLE IF NOT EXISTS bcoma_catalogoversion (
+    `idCatalogoVersion` INTEGER NOT NULL AUTO_INCREMENT,
+    version INTEGER NOT NULL,
+    `fechaActualizacion` TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (`idCatalogoVersion`)
+);
+
+-- Saldos de cierre mensuales (app.saldos_cierre)
+CREATE TABLE IF NOT EXISTS bcoma_saldocierre (
+    `idSaldoCierre` INTEGER NOT NULL AUTO_INCREMENT,
+    `idCuenta` INTEGER NOT NULL,
+    `fechaCorte` DATE NOT NULL,
+    saldo DECIMAL(12, 2) NOT NULL,
+    `idCorrelativo` INTEGER,
+    PRIMARY KEY (`idSaldoCierre`),
+    CONSTRAINT uq_saldocierre_cuenta_fecha UNIQUE (`idCuenta`, `fechaCorte`),
+    FOREIGN KEY (`idCuenta`) REFERENCES bcoma_cuenta (`idCuenta`) ON DELETE CASCADE
+);
+
+-- Intereses de cuentas de ahorro (app.intereses)
+CREATE TABLE IF NOT EXISTS bcoma_interesahorro (
+    `idInteresAhorro` INTEGER NOT NULL AUTO_INCREMENT,
+    `idCuenta` INTEGER NOT NULL,
+    periodo VARCHAR(7) NOT NULL,
+    `saldoPromedio` DECIMAL(12, 2) NOT NULL,
+    `tasaAnual` DECIMAL(5, 2) NOT NULL,
+    monto DECIMAL(12, 2) NOT NULL,
+    `idTransaccion` INTEGER,
+    `fechaRegistro` TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`idInteresAhorro`),
+    CONSTRAINT uq_interesahorro_cuenta_periodo UNIQUE (`idCuenta`, periodo),
+    FOREIGN KEY (`idCuenta`) REFERENCES bcoma_cuenta (`idCuenta`) ON DELETE CASCADE,
+    FOREIGN KEY (`idTransaccion`) REFERENCES bcoma_transaccion (`idTransaccion`)
+);
+
+-- Claves Idempotency-Key de transferencias y pagos (app.idempotencia)
+CREATE TABLE IF NOT EXISTS bcoma_idempotencia (
+    `idIdempotencia` INTEGER NOT NULL AUTO_INCREMENT,
+    username VARCHAR(50) NOT NULL,
+    clave VARCHAR(100) NOT NULL,
+    ruta VARCHAR(100) NOT NULL,
+    huella VARCHAR(64) NOT NULL,
+    estado VARCHAR(20) NOT NULL,
+    `codigoEstado` INTEGER,
+    respuesta TEXT,
+    `fechaCreacion` TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`idIdempotencia`),
+    CONSTRAINT uq_idempotencia_usuario_clave UNIQUE (username, clave),
+    INDEX `ix_bcoma_idempotencia_fechaCreacion` (`fechaCreacion`)
+);
+
+-- Transferencias por lote (app.lotes)
+CREATE TABLE IF NOT EXISTS bcoma_lotetransferencia (
+    `idLote` INTEGER NOT NULL AUTO_INCREMENT,
+    `idCuentaOrigen` INTEGER NOT NULL,
+    username VARCHAR(50) NOT NULL,
+    descripcion TEXT,
+    `totalLineas` INTEGER NOT NULL,
+    `lineasAplicadas` INTEGER NOT NULL,
+    `montoAplicado` DECIMAL(14, 2) NOT NULL,
+    fecha TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (`idLote`),
+    FOREIGN KEY (`idCuentaOrigen`) REFERENCES bcoma_cuenta (`idCuenta`) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS bcoma_lotetransferenciadetalle (
+    `idLoteDetalle` INTEGER NOT NULL AUTO_INCREMENT,
+    `idLote` INTEGER NOT NULL,
+    linea INTEGER NOT NULL,
+    `numeroCuentaDestino` VARCHAR(20) NOT NULL,
+    monto DECIMAL(12, 2) NOT NULL,
+    estado VARCHAR(20) NOT NULL,
+    motivo VARCHAR(255),
+    `numeroDocumento` VARCHAR(50),
+    `idTransaccion` INTEGER,
+    PRIMARY KEY (`idLoteDetalle`),
+    CONSTRAINT uq_lotedetalle_lote_linea UNIQUE (`idLote`, linea),
+    FOREIGN KEY (`idLote`) REFERENCES bcoma_lotetransferencia (`idLote`) ON DELETE CASCADE,
+    FOREIGN KEY (`idTransaccion`) REFERENCES bcoma_transaccion (`idTransaccion`)
+);
+
+-- Cola de trabajos en segundo plano (app.trabajos)
+CREATE TABLE IF NOT EXISTS bcoma_trabajo (
+    `idTrabajo` INTEGER NOT NULL AUTO_INCREMENT,
+    tipo VARCHAR(50) NOT NULL,
+    parametros TEXT,
+    estado VARCHAR(20) NOT NULL,
+    username VARCHAR(50) NOT NULL,
+    trabajador VARCHAR(100),
+    resultado TEXT,
+    error TEXT,
+    `fechaCreacion` TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+    `fechaInicio` TIMESTAMP NULL,
+    `fechaFin` TIMESTAMP NULL,
+    PRIMARY KEY (`idTrabajo`),
+    INDEX ix_trabajo_estado (estado, `idTrabajo`)
+);
+
+-- Avance de un trabajo en curso (GET /jobs/{id}); va aparte para aplicarse
+-- también donde bcoma_trabajo ya existía
+ALTER TABLE bcoma_trabajo
+    ADD COLUMN procesados INTEGER NOT NULL DEFAULT 0 AFTER error,
+    ADD COLUMN total INTEGER NULL AFTER procesados;
+
+-- Intentos de login compartidos entre trabajadores (app.limite_login, LOGIN_LIMITE_COMPARTIDO=bd)
+CREATE TABLE IF NOT EXISTS bcoma_limitelogin (
+    `idLimiteLogin` INTEGER NOT NULL AUTO_INCREMENT,
+    clave VARCHAR(150) NOT NULL,
+    ventana INTEGER NOT NULL,
+    intentos INTEGER NOT NULL,
+    vence INTEGER NOT NULL,
+    PRIMARY KEY (`idLimiteLogin`),
+    CONSTRAINT uq_limitelogin_clave_ventana UNIQUE (clave, ventana),
+    INDEX ix_bcoma_limitelogin_vence (vence)
+);
@@ -0,0 +1,66 @@
+# tests/conftest.py
+"""
+Entorno común de las pruebas: se fija antes de que algún módulo importe `app`.
+
+La base se toma de TEST_DATABASE_URL (p. ej. una MySQL de pruebas); por
+defecto es un SQLite temporal. Cada prueba que la usa crea el esquema desde
+cero en su fixture.
+"""
+import os
+import tempfile
+
+_directorio = tempfile.mkdtemp(prefix="banco_mr_tests_")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_directorio}/pruebas.db")
+# `benchmarks.entorno` (presupuesto de consultas) usa la misma base
+os.environ["BENCH_DATABASE_URL"] = os.environ["DATABASE_URL"]
+os.environ.setdefault("SECRET_KEY", "pruebas")
+os.environ.setdefault("DB_ECHO", "0")
+# `app.email_utils` las exige al importarse; las pruebas no envían correos
+os.environ.setdefault("SMTP_USER", "pruebas@example.com")
+os.environ.setdefault("SMTP_PASSWORD", "pruebas")
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app import models
+from app.database import Base, SessionLocal, engine
+
+
+@pytest.fixture
+def prestamos_vencidos():
+    """Dos préstamos pendientes (PRE000001 y PRE000002) con sus 3 cuotas vencidas y VIGENTES."""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    sesion = SessionLocal()
+    sesion.add(models.TipoTransaccion(idTipoTransaccion=4, nombre="Préstamo"))
+    sesion.add(models.Moneda(idMoneda=1, codigo="GTQ", nombre="Quetzal"))
+    sesion.add(models.Institucion(idInstitucion=1, descripcion="Banco"))
+    sesion.add(models.TipoPrestamo(idTipoPrestamo=1, descripcion="Personal"))
+    sesion.add(models.Plazo(idPlazo=1, cantidadCuotas=3, porcentajeAnualIntereses=Decimal("12"),
+                            porcentajeMora=Decimal("36.5"), descripcion="3 meses"))
+    sesion.add(models.Cliente(idCliente=1, primerNombre="Ana", primerApellido="López",
+                              segundoApellido="Pérez", dpi="1", correo="ana@example.com"))
+    sesion.flush()
+    cuenta = models.Cuenta(idCliente=1, numeroCuenta="MTQ0001", idTipoCuenta=1, saldoInicial=0,
+                           saldo=Decimal("0"), idMoneda=1, idEstadoCuenta=1)
+    sesion.add(cuenta)
+    sesion.flush()
+    for numero in ("PRE000001", "PRE000002"):
+        encabezado = models.PrestamoEncabezado(
+            idCliente=1, idInstitucion=1, idTipoPrestamo=1, idPlazo=1, idMoneda=1, numeroPrestamo=numero,
+            fechaPrestamo=date(2025, 1, 1), montoPrestamo=Decimal("300.00"), saldoPrestamo=Decimal("300.00"),
+            fechaVencimiento=date(2025, 4, 1), idCuentaDestino=cuenta.idCuenta,
+        )
+        sesion.add(encabezado)
+        sesion.flush()
+        for cuota in range(1, 4):
+            sesion.add(models.PrestamoDetalle(
+                idPrestamoEnc=encabezado.idPrestamoEnc, numeroCuota=cuota, fechaPago=date(2025, cuota + 1, 1),
+                montoCapital=Decimal("100.00"), montoIntereses=Decimal("1.00"), totalAPagar=Decimal("101.00"),
+                estado="VIGENTE",
+            ))
+    sesion.commit()
+    yield sesion
+    sesion.close()
@@ -0,0 +1,43 @@
+# tests/test_cartera.py
+"""
+Resumen de cartera (`app.cartera`): los préstamos rechazados no entran, ni al
+aprobarse/rechazarse ni en la reconstrucción completa, y la reconstrucción
+elimina las filas que sobran sin vaciar antes la tabla.
+"""
+from datetime import date
+from decimal import Decimal
+
+from app import cartera, models
+from app.aprobaciones import procesar_aprobacion
+
+
+def _resumen(db) -> dict:
+    db.expire_all()
+    return {fila.idPrestamoEnc: fila for fila in db.query(models.CarteraResumen).all()}
+
+
+def test_rechazados_fuera_de_la_cartera(prestamos_vencidos):
+    db = prestamos_vencidos
+    procesar_aprobacion(db, "PRE000001", aprobar=True)
+    procesar_aprobacion(db, "PRE000002", aprobar=False)
+    db.commit()
+    aprobado, rechazado = (
+        db.query(models.PrestamoEncabezado.idPrestamoEnc).order_by(models.PrestamoEncabezado.numeroPrestamo).all()
+    )
+
+    assert set(_resumen(db)) == {aprobado.idPrestamoEnc}
+
+    # Fila sobrante de una versión anterior: la reconstrucción la quita y conserva la buena
+    db.add(models.CarteraResumen(idPrestamoEnc=rechazado.idPrestamoEnc, idInstitucion=1, idTipoPrestamo=1,
+                                 idMoneda=1, saldoPendiente=Decimal("300.00"), fechaCuotaVencida=date(2025, 2, 1)))
+    db.commit()
+    assert cartera.reconstruir(db, lote=1) == 1
+
+    resumen = _resumen(db)
+    assert set(resumen) == {aprobado.idPrestamoEnc}
+    assert resumen[aprobado.idPrestamoEnc].saldoPendiente == Decimal("300.00")
+    assert resumen[aprobado.idPrestamoEnc].fechaCuotaVencida == date(2025, 2, 1)
+
+    filas = cartera.reporte_cartera(db, date(2025, 6, 30))
+    assert sum(f["prestamos"] for f in filas) == 1
+    assert sum(f["saldoTotal"] for f in filas) == 300.0
@@ -0,0 +1,42 @@
+# tests/test_mora.py
+"""
+Proceso de mora (`app.mora.ejecutar`): sólo los préstamos aprobados acumulan
+mora, aunque los rechazados también tengan fechaAutorizacion y cuotas VIGENTES.
+"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from app import models, mora
+from app.aprobaciones import procesar_aprobacion
+
+CORTE = date(2025, 6, 30)
+
+
+def test_solo_los_prestamos_aprobados_generan_mora(prestamos_vencidos):
+    db = prestamos_vencidos
+    procesar_aprobacion(db, "PRE000001", aprobar=True)
+    procesar_aprobacion(db, "PRE000002", aprobar=False)
+    db.commit()
+
+    resumen = mora.ejecutar(db, CORTE, lote=2)
+
+    aprobado = db.query(models.PrestamoEncabezado).filter_by(numeroPrestamo="PRE000001").one()
+    rechazado = db.query(models.PrestamoEncabezado).filter_by(numeroPrestamo="PRE000002").one()
+    assert rechazado.fechaAutorizacion is not None and rechazado.aprobado is False
+    por_prestamo = dict(
+        db.query(models.MoraCuota.idPrestamoEnc, func.count()).group_by(models.MoraCuota.idPrestamoEnc).all()
+    )
+    assert por_prestamo == {aprobado.idPrestamoEnc: 3}
+    assert resumen["cuotasProcesadas"] == 3
+    # 36.5 % anual sobre 100 de capital: 0.10 por día de atraso
+    dias = (CORTE - date(2025, 2, 1)).days
+    mora_primera = (
+        db.query(models.MoraCuota.montoMora)
+          .join(models.PrestamoDetalle, models.PrestamoDetalle.idPrestamoDet == models.MoraCuota.idPrestamoDet)
+          .filter(models.PrestamoDetalle.idPrestamoEnc == aprobado.idPrestamoEnc,
+                  models.PrestamoDetalle.numeroCuota == 1)
+          .scalar()
+    )
+    assert mora_primera == Decimal(dias) / 10
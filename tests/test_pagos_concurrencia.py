@@ -0,0 +1,202 @@
+# tests/test_pagos_concurrencia.py
+"""
+Pagos simultáneos sobre un mismo préstamo (`app.pagos.aplicar_pago`).
+
+Varios hilos, cada uno con su propia sesión, pagan el mismo préstamo desde la
+misma cuenta contra una base en archivo. Al final el saldo de la cuenta y el
+del préstamo deben cuadrar con lo pagado, y ninguna cuota puede haberse
+cobrado más de una vez (ni su capital, ni sus intereses, ni su mora).
+
+La base se toma de TEST_DATABASE_URL (ver `conftest.py`); por defecto es un
+SQLite temporal. SQLite no tiene bloqueos por fila, así que ahí
+cada transacción empieza con BEGIN IMMEDIATE y los escritores se serializan
+igual que lo harían con FOR UPDATE; como eso oculta la falta de bloqueos,
+otra prueba revisa que `aplicar_pago` pida SELECT ... FOR UPDATE de la
+cuenta y del préstamo, en ese orden, compilando sus consultas para MySQL.
+
+    python -m pytest tests
+"""
+import os
+import threading
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event, func
+from sqlalchemy.dialects import mysql
+
+from app import models
+from app.database import Base, SessionLocal, engine
+from app.pagos import aplicar_pago
+
+HILOS = int(os.getenv("HILOS_PRUEBA", "8"))
+MONTO_PAGO = Decimal("75.00")
+SALDO_INICIAL = Decimal("10000.00")
+CUOTAS = 12
+
+def _sin_transaccion_implicita(conexion, _registro):
+    conexion.isolation_level = None
+
+
+def _begin_immediate(conexion):
+    conexion.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+@pytest.fixture(autouse=True)
+def serializar_sqlite():
+    """Sólo en este módulo: en SQLite cada transacción empieza con BEGIN IMMEDIATE."""
+    if engine.dialect.name != "sqlite":
+        yield
+        return
+    # Conexiones nuevas, para que todas pasen por el evento "connect"
+    engine.dispose()
+    event.listen(engine, "connect", _sin_transaccion_implicita)
+    event.listen(engine, "begin", _begin_immediate)
+    try:
+        yield
+    finally:
+        event.remove(engine, "begin", _begin_immediate)
+        event.remove(engine, "connect", _sin_transaccion_implicita)
+        engine.dispose()
+
+
+@pytest.fixture
+def prestamo():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        db.add(models.TipoTransaccion(idTipoTransaccion=2, nombre="Retiro"))
+        db.add(models.Moneda(idMoneda=1, codigo="GTQ", nombre="Quetzal"))
+        db.add(models.Institucion(idInstitucion=1, descripcion="Banco"))
+        db.add(models.TipoPrestamo(idTipoPrestamo=1, descripcion="Personal"))
+        db.add(models.Plazo(idPlazo=1, cantidadCuotas=CUOTAS, porcentajeAnualIntereses=Decimal("12"),
+                            porcentajeMora=Decimal("24"), descripcion="12 meses"))
+        db.add(models.TipoFormaPago(idFormaPago=1, descripcion="Débito"))
+        db.add(models.Cliente(idCliente=1, primerNombre="Ana", primerApellido="López",
+                              segundoApellido="Pérez", dpi="1", correo="ana@example.com"))
+        db.flush()
+        cuenta = models.Cuenta(idCliente=1, numeroCuenta="MTQ0001", idTipoCuenta=1, saldoInicial=SALDO_INICIAL,
+                               saldo=SALDO_INICIAL, idMoneda=1, idEstadoCuenta=1)
+        db.add(cuenta)
+        db.flush()
+        encabezado = models.PrestamoEncabezado(
+            idCliente=1, idInstitucion=1, idTipoPrestamo=1, idPlazo=1, idMoneda=1, numeroPrestamo="PRE000001",
+            fechaPrestamo=date(2025, 1, 1), montoPrestamo=Decimal("1320.00"), saldoPrestamo=Decimal("1320.00"),
+            fechaAutorizacion=date(2025, 1, 1), fechaVencimiento=date(2026, 1, 1), idCuentaDestino=cuenta.idCuenta,
+        )
+        db.add(encabezado)
+        db.flush()
+        for numero in range(1, CUOTAS + 1):
+            db.add(models.PrestamoDetalle(
+                idPrestamoEnc=encabezado.idPrestamoEnc, numeroCuota=numero, fechaPago=date(2025, numero, 1),
+                montoCapital=Decimal("100.00"), montoIntereses=Decimal("10.00"), totalAPagar=Decimal("110.00"),
+            ))
+        db.flush()
+        # Mora del último corte para las dos primeras cuotas
+        for numero, mora in ((1, Decimal("9.00")), (2, Decimal("4.50"))):
+            detalle = db.query(models.PrestamoDetalle).filter_by(numeroCuota=numero).one()
+            db.add(models.MoraCuota(idPrestamoDet=detalle.idPrestamoDet, idPrestamoEnc=encabezado.idPrestamoEnc,
+                                    fechaCorte=date(2025, 3, 1), diasAtraso=30, montoMora=mora))
+        id_prestamo = encabezado.idPrestamoEnc
+        db.commit()
+    finally:
+        db.close()
+    return id_prestamo
+
+
+def _pagar(errores: list, barrera: threading.Barrier):
+    db = SessionLocal()
+    try:
+        barrera.wait()
+        aplicar_pago(db, "PRE000001", "MTQ0001", 1, MONTO_PAGO)
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        errores.append(exc)
+    finally:
+        db.close()
+
+
+def test_pagos_simultaneos_no_cobran_dos_veces(prestamo):
+    errores = []
+    barrera = threading.Barrier(HILOS)
+    hilos = [threading.Thread(target=_pagar, args=(errores, barrera)) for _ in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert errores == []
+
+    db = SessionLocal()
+    try:
+        pagado = MONTO_PAGO * HILOS
+        cuenta = db.query(models.Cuenta).filter_by(numeroCuenta="MTQ0001").one()
+        assert cuenta.saldo == SALDO_INICIAL - pagado
+
+        mora, interes, capital = db.query(
+            func.sum(models.MovimientoPagoDetalle.pagoMoraCuota),
+            func.sum(models.MovimientoPagoDetalle.pagoMontoIntereses),
+            func.sum(models.MovimientoPagoDetalle.pagoMontoCapital),
+        ).one()
+        assert Decimal(str(mora)) + Decimal(str(interes)) + Decimal(str(capital)) == pagado
+
+        encabezado = db.get(models.PrestamoEncabezado, prestamo)
+        assert encabezado.saldoPrestamo == Decimal("1320.00") - Decimal(str(interes)) - Decimal(str(capital))
+
+        # Ninguna cuota recibió más de lo que debía
+        moras = dict(db.query(models.MoraCuota.idPrestamoDet, models.MoraCuota.montoMora).all())
+        por_cuota = (
+            db.query(
+                models.PrestamoDetalle.idPrestamoDet,
+                models.PrestamoDetalle.montoCapital,
+                models.PrestamoDetalle.montoIntereses,
+                models.PrestamoDetalle.estado,
+                func.coalesce(func.sum(models.MovimientoPagoDetalle.pagoMoraCuota), 0),
+                func.coalesce(func.sum(models.MovimientoPagoDetalle.pagoMontoIntereses), 0),
+                func.coalesce(func.sum(models.MovimientoPagoDetalle.pagoMontoCapital), 0),
+            )
+            .outerjoin(models.MovimientoPagoDetalle,
+                       models.MovimientoPagoDetalle.idPrestamoDet == models.PrestamoDetalle.idPrestamoDet)
+            .group_by(models.PrestamoDetalle.idPrestamoDet, models.PrestamoDetalle.montoCapital,
+                      models.PrestamoDetalle.montoIntereses, models.PrestamoDetalle.estado)
+            .all()
+        )
+        for id_det, capital_cuota, interes_cuota, estado, mora_pag, int_pag, cap_pag in por_cuota:
+            assert Decimal(str(mora_pag)) <= moras.get(id_det, Decimal("0"))
+            assert Decimal(str(int_pag)) <= interes_cuota
+            assert Decimal(str(cap_pag)) <= capital_cuota
+            completa = Decimal(str(int_pag)) == interes_cuota and Decimal(str(cap_pag)) == capital_cuota
+            assert (estado == "CANCELADO") == completa
+
+        # Cada cuota se cancela en un solo pago
+        canceladas = (
+            db.query(models.MovimientoPagoDetalle.idPrestamoDet, func.count())
+              .filter(models.MovimientoPagoDetalle.estado == "CANCELADO")
+              .group_by(models.MovimientoPagoDetalle.idPrestamoDet)
+              .all()
+        )
+        assert all(veces == 1 for _, veces in canceladas)
+        assert len(canceladas) == db.query(models.PrestamoDetalle).filter_by(estado="CANCELADO").count()
+    finally:
+        db.close()
+
+
+def test_aplicar_pago_bloquea_cuenta_y_prestamo(prestamo):
+    bloqueos = []
+
+    def registrar(estado):
+        if estado.is_select and estado.statement._for_update_arg is not None:
+            sql = str(estado.statement.compile(dialect=mysql.dialect()))
+            tabla = sql.split("FROM", 1)[1].split()[0]
+            bloqueos.append((tabla, sql.rstrip().endswith("FOR UPDATE")))
+
+    db = SessionLocal()
+    event.listen(db, "do_orm_execute", registrar)
+    try:
+        aplicar_pago(db, "PRE000001", "MTQ0001", 1, MONTO_PAGO)
+        db.rollback()
+    finally:
+        db.close()
+
+    assert bloqueos[:2] == [("bcoma_cuenta", True), ("pre_prestamoencabezado", True)]
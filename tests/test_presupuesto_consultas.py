@@ -0,0 +1,20 @@
+# tests/test_presupuesto_consultas.py
+"""
+Presupuesto de sentencias SQL por ruta (`benchmarks.presupuesto_consultas`).
+
+Siembra un conjunto pequeño de datos, recorre los escenarios de lectura y de
+escritura, y falla si alguna ruta supera su presupuesto: un N+1 en /mis,
+/prestamos/todos, /tarjetas/mis, /transacciones o /prestamos/pagar rompe la
+suite en lugar de descubrirse en producción.
+"""
+from benchmarks import entorno  # noqa: F401  (SMTP simulado para los correos de las escrituras)
+from benchmarks.presupuesto_consultas import PRESUPUESTOS, verificar
+
+
+def test_ninguna_ruta_supera_su_presupuesto():
+    resultado = verificar(escala=0.002, solicitudes=10)
+
+    assert resultado["excedidas"] == [], resultado["rutas"]
+    medidas = {tuple(nombre.split(" ", 1)) for nombre in resultado["rutas"]}
+    # Cada ruta con presupuesto se ejerció, incluidas las escrituras
+    assert set(PRESUPUESTOS) <= medidas, set(PRESUPUESTOS) - medidas
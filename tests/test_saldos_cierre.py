@@ -0,0 +1,54 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from app import models, saldos_cierre
+
+FIN_MAYO = date(2025, 5, 31)
+
+
+def _historial(db, cuenta, fecha, saldo):
+    db.add(models.Historial(idCuenta=cuenta.idCuenta, idTransaccion=1, fecha=fecha, monto=0, saldo=saldo))
+
+
+def test_cierre_y_saldo_a_fecha_coinciden_con_registros_retroactivos(prestamos_vencidos):
+    db = prestamos_vencidos
+    cuenta = db.query(models.Cuenta).one()
+    _historial(db, cuenta, datetime(2025, 5, 10), Decimal("100.00"))
+    _historial(db, cuenta, datetime(2025, 5, 20), Decimal("150.00"))
+    # Registrado después pero con fecha anterior: su saldo ya incluye los dos anteriores
+    _historial(db, cuenta, datetime(2025, 5, 5), Decimal("130.00"))
+    db.commit()
+
+    sin_cierre = saldos_cierre.saldo_a_fecha(db, cuenta, FIN_MAYO)
+    saldos_cierre.generar_cierre(db, FIN_MAYO)
+    cierre = db.query(models.SaldoCierre).filter_by(idCuenta=cuenta.idCuenta).one()
+    con_cierre = saldos_cierre.saldo_a_fecha(db, cuenta, FIN_MAYO)
+
+    assert cierre.saldo == Decimal("130.00")
+    assert sin_cierre["saldo"] == con_cierre["saldo"] == 130.0
+    assert con_cierre["fechaCierreBase"] == FIN_MAYO
+
+
+def test_cierre_fallido_conserva_el_anterior(prestamos_vencidos, monkeypatch):
+    db = prestamos_vencidos
+    db.add(models.Cuenta(idCliente=1, numeroCuenta="MTQ0002", idTipoCuenta=1, saldoInicial=0,
+                         saldo=0, idMoneda=1, idEstadoCuenta=1))
+    db.commit()
+    saldos_cierre.generar_cierre(db, FIN_MAYO, lote=1)
+
+    original = saldos_cierre.ultimos_registros
+    llamadas = []
+
+    def fallar_en_segundo_bloque(*args, **kwargs):
+        llamadas.append(args)
+        if len(llamadas) > 2:
+            raise RuntimeError("falla a mitad del cierre")
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(saldos_cierre, "ultimos_registros", fallar_en_segundo_bloque)
+    with pytest.raises(RuntimeError):
+        saldos_cierre.generar_cierre(db, FIN_MAYO, lote=1)
+
+    assert db.query(models.SaldoCierre).filter_by(fechaCorte=FIN_MAYO).count() == 2
@@ -0,0 +1,76 @@
+# tests/test_tipocambio.py
+"""
+Conversión de montos por lote (`MatrizTipoCambio.convertir_lote` y
+`app.utils.convert_currency_batch`) con tasas que cambian entre fechas.
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from app import models
+from app.catalogos import cache as catalogos
+from app.database import Base, SessionLocal, engine
+from app.tipocambio import MatrizTipoCambio
+from app.utils import convert_currency, convert_currency_batch
+
+GTQ, USD, EUR = 1, 2, 3
+TASAS = [
+    (USD, date(2025, 1, 1), "7.80"),
+    (EUR, date(2025, 1, 1), "8.40"),
+    (USD, date(2025, 6, 1), "7.70"),
+]
+
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    sesion = SessionLocal()
+    for id_moneda, fecha, tasa in TASAS:
+        sesion.add(models.TipoCambio(idMoneda=id_moneda, fechaVigencia=fecha, tasa=Decimal(tasa)))
+    sesion.add(models.CatalogoVersion(version=1))
+    sesion.commit()
+    catalogos.version = None  # fuerza la recarga con estas tasas
+    yield sesion
+    sesion.close()
+    catalogos.version = None
+
+
+def test_lote_con_una_fecha_por_monto():
+    matriz = MatrizTipoCambio(TASAS)
+    montos = [Decimal("100"), Decimal("100"), Decimal("50"), Decimal("10")]
+    fechas = [date(2024, 12, 31), date(2025, 3, 1), date(2025, 6, 1), date(2025, 7, 15)]
+
+    convertidos = matriz.convertir_lote(montos, USD, GTQ, fechas)
+
+    assert convertidos == [Decimal("770"), Decimal("780.00"), Decimal("385.00"), Decimal("77.00")]
+    assert convertidos == [matriz.convertir(m, USD, GTQ, f) for m, f in zip(montos, fechas)]
+
+
+def test_lote_cruzado_con_una_sola_fecha():
+    matriz = MatrizTipoCambio(TASAS)
+    montos = [Decimal("78"), Decimal("39")]
+
+    assert matriz.convertir_lote(montos, USD, EUR, date(2025, 2, 1)) == [
+        matriz.convertir(monto, USD, EUR, date(2025, 2, 1)) for monto in montos
+    ]
+
+
+def test_lote_valida_monedas_y_fechas():
+    matriz = MatrizTipoCambio(TASAS)
+    assert matriz.convertir_lote([Decimal("5")], GTQ, GTQ) == [Decimal("5")]
+    with pytest.raises(ValueError):
+        matriz.convertir_lote([Decimal("5")], 99, 99)
+    with pytest.raises(ValueError):
+        matriz.convertir_lote([Decimal("5"), Decimal("6")], USD, GTQ, [date(2025, 1, 1)])
+
+
+def test_convert_currency_batch_usa_las_tasas_de_la_base(db):
+    montos = [Decimal("10"), Decimal("10")]
+    fechas = [date(2025, 2, 1), date(2025, 8, 1)]
+
+    convertidos = convert_currency_batch(db, montos, USD, GTQ, fechas)
+
+    assert convertidos == [Decimal("78.00"), Decimal("77.00")]
+    assert convertidos == [convert_currency(db, m, USD, GTQ, f) for m, f in zip(montos, fechas)]
@@ -0,0 +1,66 @@
+# tests/test_trabajos.py
+"""
+Avance de los trabajos en segundo plano (`app.trabajos.avance`): mientras una
+tarea corre, GET /jobs/{id} debe mostrar cuánto lleva, no sólo EN_PROCESO.
+"""
+from decimal import Decimal
+
+import pytest
+
+from app import models, trabajos
+from app.database import Base, SessionLocal, engine
+from app.routers.trabajos import obtener_trabajo
+
+ADMIN = {"username": "admin", "rol": "admin", "idCliente": None}
+
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    sesion = SessionLocal()
+    sesion.add(models.Moneda(idMoneda=1, codigo="GTQ", nombre="Quetzal"))
+    for id_cliente in range(1, 6):
+        sesion.add(models.Cliente(idCliente=id_cliente, primerNombre="N", primerApellido="A",
+                                  segundoApellido="B", dpi=str(id_cliente), correo=f"c{id_cliente}@example.com"))
+        sesion.flush()
+        sesion.add(models.Usuario(username=f"usuario{id_cliente}", password="x", rol="cliente",
+                                  idCliente=id_cliente))
+        sesion.add(models.Cuenta(idCliente=id_cliente, numeroCuenta=f"MTQ000{id_cliente}", idTipoCuenta=1,
+                                 saldoInicial=0, saldo=Decimal("0"), idMoneda=1, idEstadoCuenta=1))
+    sesion.commit()
+    yield sesion
+    sesion.close()
+
+
+def test_el_avance_se_ve_mientras_el_trabajo_corre(db, monkeypatch):
+    monkeypatch.setattr(trabajos, "FILAS_POR_BLOQUE", 2)
+    ids = [id_usuario for (id_usuario,) in db.query(models.Usuario.idUsuario).order_by(models.Usuario.idUsuario)]
+    id_trabajo = trabajos.encolar(db, "desactivar_usuarios", {"idsUsuarios": ids}, "admin").idTrabajo
+
+    vistos = []
+    registrar = trabajos.avance
+
+    def observar(sesion, trabajo, procesados, total=None):
+        registrar(sesion, trabajo, procesados, total)
+        # Lo que ve otro proceso consultando el endpoint
+        lector = SessionLocal()
+        try:
+            salida = obtener_trabajo(id_trabajo, lector, ADMIN)
+            vistos.append((salida.estado, salida.procesados, salida.total))
+        finally:
+            lector.close()
+
+    monkeypatch.setattr(trabajos, "avance", observar)
+    trabajo = trabajos.reclamar(db, "pruebas-1")
+    trabajos.ejecutar(db, trabajo)
+
+    assert vistos == [
+        ("EN_PROCESO", 0, 5),
+        ("EN_PROCESO", 2, 5),
+        ("EN_PROCESO", 4, 5),
+        ("EN_PROCESO", 5, 5),
+    ]
+    final = obtener_trabajo(id_trabajo, db, ADMIN)
+    assert (final.estado, final.procesados, final.total) == ("COMPLETADO", 5, 5)
+    assert final.resultado == {"usuariosDesactivados": 5, "cuentasDesactivadas": 5}